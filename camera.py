@@ -2,9 +2,15 @@ import cv2
 import time
 import threading
 import random
+from cameraPipeline import FrameQueue, StageStats, FrameMetrics, format_stats
+from framePool import FramePool
+from middlewareChain import MiddlewareChain
+from cameraSinks import NullSink, WindowSink
 
 class CSICamera:
-    def __init__(self, sensor_id=0, capture_width=1640, capture_height=1232, display_width=1640, display_height=1232, framerate=30, flip_method=0, middleware=None):
+    def __init__(self, sensor_id=0, capture_width=1640, capture_height=1232, display_width=1640, display_height=1232, framerate=30, flip_method=0, middleware=None, capture_callback=None,
+                 workers=2, queue_size=2, source=None, show=True, frame_bus=None, sinks=None, pipeline=None,
+                 summary_interval=None):
         self.sensor_id = sensor_id
         self.capture_width = capture_width
         self.capture_height = capture_height
@@ -14,10 +20,46 @@ class CSICamera:
         self.flip_method = flip_method
         self.window_title = "CSI Camera"
         self.video_capture = None
+        # running: the pipeline is open and capturing. active: frames go on to the middleware and sinks;
+        # while paused they are read and released, which keeps the pipeline warm so resume() is instant.
         self.running = False
+        self.active = False
         self.middleware=middleware
+        self.capture_callback = capture_callback
+        self.frame_count = 0
+        # Capture, a pool of middleware workers and display run in their own threads, joined by
+        # bounded drop-oldest queues so a slow stage drops frames instead of stalling capture.
+        self.workers = workers
+        self.queue_size = queue_size
+        # A capture object to use instead of the GStreamer pipeline, or a function returning one
+        # (so it can be reopened after stop()).
+        self.source = source
+        # Where displayed frames go: a window by default, or cameraSinks for headless use.
+        if sinks is None:
+            sinks = [WindowSink(self.window_title)] if show else [NullSink()]
+        self.sinks = sinks
+        self.threads = []
+        self.capture_queue = None
+        self.display_queue = None
+        self.stage_stats = {}
+        # Frames are read into recycled buffers and released by whichever stage is done with them last.
+        self.frame_pool = FramePool()
+        # Optional frameBus.FrameBusWriter: raw frames go to other processes straight from capture.
+        self.frame_bus = frame_bus
+        # Optional gstPipeline.GstPipeline, e.g. BGRx or GRAY8 straight from nvvidconv instead of the
+        # default BGR, which costs a CPU videoconvert per frame.
+        self.pipeline = pipeline
+        # Every frame carries its capture sequence number and timestamp; `metrics` (a
+        # cameraPipeline.FrameMetrics) turns them into latency, drop and jitter figures, printed
+        # every `summary_interval` seconds if set.
+        self.metrics = FrameMetrics(framerate)
+        self.summary_interval = summary_interval
+        # Only every `stride`th captured frame goes on to the middleware and sinks.
+        self.stride = 1
 
     def gstreamer_pipeline(self):
+        if self.pipeline is not None:
+            return self.pipeline.build()
         return (
             "nvarguscamerasrc sensor-id=%d ! "
             "video/x-raw(memory:NVMM), width=(int)%d, height=(int)%d, framerate=(fraction)%d/1 ! "
@@ -36,39 +78,251 @@ class CSICamera:
             )
         )
 
+    def middleware_chain(self):
+        # Turns `middleware` into an ordered MiddlewareChain (see middlewareChain.Stage for options).
+        # Each worker may spend workers / framerate seconds on a frame without lowering the rate.
+        if not isinstance(self.middleware, MiddlewareChain):
+            chain = MiddlewareChain(budget=self.workers / self.framerate)
+            if self.middleware:
+                chain.add("middleware", self.middleware)
+            self.middleware = chain
+        return self.middleware
+
+    def add_middleware(self, name, function, **options):
+        return self.middleware_chain().add(name, function, **options)
+
+    def add_view(self, name, size=None, roi=None, **options):
+        # A resized and/or cropped view of every frame, computed once and shared by the stages that
+        # ask for it with add_middleware(..., view=name).
+        return self.middleware_chain().add_view(name, size, roi, **options)
+
+    def open_capture(self):
+        if callable(self.source):
+            return self.source()
+        if self.source is not None:
+            return self.source
+        return cv2.VideoCapture(self.gstreamer_pipeline(), cv2.CAP_GSTREAMER)
+
+    def open(self):
+        # Opens the pipeline and starts capturing, paused. Building the GStreamer pipeline takes
+        # seconds, so do it once and switch consumers with pause() / resume().
+        if self.running:
+            return True
+        if self.threads:
+            # The previous run ended on its own (a sink quit); finish tearing it down first.
+            self.stop()
+        self.video_capture = self.open_capture()
+        if not self.video_capture.isOpened():
+            print("Error: Unable to open camera")
+            return False
+        self.running = True
+        self.capture_queue = FrameQueue(self.queue_size)
+        self.display_queue = FrameQueue(self.queue_size)
+        self.stage_stats = {name: StageStats(name) for name in ("capture", "process", "display", "total")}
+        self.metrics = FrameMetrics(self.framerate)
+        self.metrics.stride = self.stride
+        self.threads = [threading.Thread(target=self._capture_video, name="camera-capture")]
+        self.threads += [threading.Thread(target=self._process_frames, name=f"camera-process-{n}")
+                         for n in range(self.workers)]
+        self.threads.append(threading.Thread(target=self._display_frames, name="camera-display"))
+        for thread in self.threads:
+            thread.start()
+        return True
+
     def start(self):
-        self.video_capture = cv2.VideoCapture(self.gstreamer_pipeline(), cv2.CAP_GSTREAMER)
-        if self.video_capture.isOpened():
-            self.running = True
-            threading.Thread(target=self._capture_video).start()
+        if self.open():
+            self.resume()
+
+    def set_stride(self, stride):
+        self.stride = stride
+        self.metrics.stride = stride
+
+    def reconfigure(self, **settings):
+        # Changes capture settings (framerate, capture_width / capture_height, display_width /
+        # display_height) by rebuilding the pipeline, which keeps running or paused as it was.
+        # Rebuilding takes seconds on the Jetson; a stride change is instant. If the pipeline does
+        # not reopen with the new settings, the old ones are restored and reopened, and
+        # RuntimeError is raised.
+        stride = settings.pop('stride', self.stride)
+        unknown = set(settings) - {'framerate', 'capture_width', 'capture_height', 'display_width', 'display_height'}
+        if unknown:
+            raise ValueError(f"cannot reconfigure {sorted(unknown)}")
+        changed = {name: value for name, value in settings.items() if getattr(self, name) != value}
+        if self.frame_bus and ({'display_width', 'display_height'} & set(changed)):
+            raise ValueError("the frame bus has a fixed frame size")
+        if changed:
+            running, active = self.running, self.active
+            previous = {name: getattr(self, name) for name in changed}
+            if running:
+                self.stop()
+            self._apply_settings(changed)
+            if running and not self.open():
+                self._apply_settings(previous)
+                if self.open() and active:
+                    self.resume()
+                raise RuntimeError(f"camera did not reopen with {changed}")
+            if running and active:
+                self.resume()
+        self.set_stride(stride)
+        return changed
+
+    def _apply_settings(self, settings):
+        for name, value in settings.items():
+            setattr(self, name, value)
+        if self.pipeline is not None:
+            self.pipeline.framerate = self.framerate
+            self.pipeline.width, self.pipeline.height = self.capture_width, self.capture_height
+            for branch in self.pipeline.branches:
+                if branch.appsink:
+                    branch.width, branch.height = self.display_width, self.display_height
+        if isinstance(self.middleware, MiddlewareChain):
+            self.middleware.budget = self.workers / self.framerate
+
+    def pause(self):
+        self.active = False
+
+    def resume(self):
+        if not self.active:
+            self.metrics.resume()
+            self.active = True
+
+    def toggle(self, active=None):
+        if active is None:
+            active = not self.active
+        if active:
+            self.resume()
         else:
-            print("Error: Unable to open camera")
+            self.pause()
+        return self.active
 
     def _capture_video(self):
-        cv2.namedWindow(self.window_title, cv2.WINDOW_AUTOSIZE)
+        stats = self.stage_stats["capture"]
         while self.running:
-            ret_val, frame = self.video_capture.read()
-            if not ret_val:
+            start = time.monotonic()
+            frame = self.frame_pool.acquire()
+            if not frame.read(self.video_capture):
+                frame.release()
                 break
+            frame.captured = time.monotonic()
+            frame.index = self.frame_count
+            if self.frame_bus:
+                self.frame_bus.publish(frame.image, frame.captured)
+            if not self.active:
+                frame.release()
+                self.frame_count += 1
+                continue
+            self.metrics.capture(frame)
+            if frame.index % self.stride:
+                frame.release()
+                self.frame_count += 1
+                continue
+            if self.capture_callback:
+                self.capture_callback(self.frame_count)
+            stats.record(start, frame.captured)
+            dropped = self.capture_queue.put(frame)
+            if dropped is not None:
+                dropped.release()
+                self.stage_stats["process"].drop()
+                self.metrics.drop('process')
+            self.frame_count += 1
+        self._close_queues()
 
-            if self.middleware:
-                            frame = self.middleware(frame)
+    def _process_frames(self):
+        stats = self.stage_stats["process"]
+        while (frame := self.capture_queue.get()) is not None:
+            start = time.monotonic()
+            self.metrics.process(frame, start)
+            if isinstance(self.middleware, MiddlewareChain):
+                frame.image = self.middleware(frame.image, frame)
+            elif self.middleware:
+                frame.image = self.middleware(frame.image)
+            stats.record(start, time.monotonic())
+            dropped = self.display_queue.put(frame)
+            if dropped is not None:
+                dropped.release()
+                self.stage_stats["display"].drop()
+                self.metrics.drop('display')
 
-            if cv2.getWindowProperty(self.window_title, cv2.WND_PROP_AUTOSIZE) >= 0:
-                cv2.imshow(self.window_title, frame)
-            else:
-                break
-            keyCode = cv2.waitKey(10) & 0xFF
-            if keyCode == 27 or keyCode == ord('q'):
-                self.stop()
+    def _display_frames(self):
+        # Workers may finish out of order; a frame older than the last one shown is dropped. Sinks
+        # are open while the camera is active (a window shows up on resume() and goes on pause()).
+        stats, total = self.stage_stats["display"], self.stage_stats["total"]
+        sinks_open = False
+        shown = -1
+        summary = time.monotonic()
+        while True:
+            frame = self.display_queue.get(timeout=0.05)
+            if self.active != sinks_open:
+                for sink in self.sinks:
+                    if self.active:
+                        sink.open()
+                    else:
+                        sink.close()
+                sinks_open = self.active
+            if frame is None:
+                if self.display_queue.closed:
+                    break
+                continue
+            if not sinks_open:
+                # Still in flight when the camera was paused.
+                frame.release()
+                continue
+            if frame.index < shown:
+                frame.release()
+                stats.drop()
+                self.metrics.drop('order')
+                continue
+            shown = frame.index
+            start = time.monotonic()
+            keep_running = [sink.write(frame, frame.index, frame.captured) for sink in self.sinks]
+            end = time.monotonic()
+            self.metrics.display(frame, end)
+            stats.record(start, end)
+            total.record(frame.captured, end)
+            frame.release()
+            if self.summary_interval and end - summary >= self.summary_interval:
+                summary = end
+                print(self.metrics.summary())
+            if not all(keep_running):
                 break
-        self.stop()
+        self.running = False
+        self.active = False
+        self._close_queues()
+        if sinks_open:
+            for sink in self.sinks:
+                sink.close()
+
+    def _close_queues(self):
+        for queue in (self.capture_queue, self.display_queue):
+            if queue is not None:
+                queue.close()
+
+    def _release_queued(self):
+        for queue in (self.capture_queue, self.display_queue):
+            if queue is not None:
+                for frame in queue.drain():
+                    frame.release()
+
+    def stats(self):
+        return {name: stage.snapshot() for name, stage in self.stage_stats.items()}
+
+    def print_stats(self):
+        print(format_stats(self.stats()))
 
     def stop(self):
+        # Stops and joins every thread. Safe to call more than once, and start() works again after it.
         self.running = False
+        self.active = False
+        self._close_queues()
+        current = threading.current_thread()
+        for thread in self.threads:
+            if thread is not current:
+                thread.join()
+        self.threads = [thread for thread in self.threads if thread is current]
+        self._release_queued()
         if self.video_capture:
             self.video_capture.release()
-            cv2.destroyAllWindows()
+            self.video_capture = None
 
 
 if __name__ == "__main__":
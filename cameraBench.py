@@ -0,0 +1,527 @@
+import gc
+import os
+import re
+import threading
+import http.client
+import sys
+import time
+import multiprocessing
+import cv2
+import numpy as np
+import resource
+import tracemalloc
+from camera import CSICamera
+from cameraPipeline import StageStats, format_stats
+from fakeCamera import SyntheticCapture
+from framePool import FramePool
+from frameBus import FrameBusWriter, FrameBusReader
+from middlewareChain import MiddlewareChain
+from cameraSinks import MjpegSink, NullSink
+from cameraGovernor import FrameGovernor
+from gstPipeline import GstPipeline, PipelineError, FLIP_METHODS, bgr_view
+
+
+def detector_middleware(frame):
+    # Stands in for a detector call that holds a frame for ~25 ms without holding the GIL.
+    time.sleep(0.025)
+    return frame
+
+
+def bench_legacy(middleware, seconds, fps=60):
+    # The original single-thread loop: read, middleware, then waitKey(10) before the next read.
+    source = SyntheticCapture(1280, 720, fps)
+    stats = {name: StageStats(name) for name in ("capture", "process", "display", "total")}
+    t0 = time.monotonic()
+    while time.monotonic() - t0 < seconds:
+        start = time.monotonic()
+        ret_val, frame = source.read()
+        captured = time.monotonic()
+        stats["capture"].record(start, captured)
+        frame = middleware(frame)
+        processed = time.monotonic()
+        stats["process"].record(captured, processed)
+        time.sleep(0.010)
+        end = time.monotonic()
+        stats["display"].record(processed, end)
+        stats["total"].record(captured, end)
+    stats["capture"].drop(source.dropped)
+    print(f"legacy    {format_stats({name: stage.snapshot() for name, stage in stats.items()})}")
+
+
+def bench_pipeline(middleware, seconds, workers, fps=60):
+    camera = CSICamera(source=SyntheticCapture(1280, 720, fps), middleware=middleware, workers=workers, show=False)
+    camera.start()
+    time.sleep(seconds)
+    camera.stop()
+    camera.stage_stats["capture"].drop(camera.source.dropped)
+    print(f"workers {workers} {format_stats(camera.stats())}")
+
+
+def bench_allocations(frames, pooled):
+    # Steady-state cost of the capture loop per frame: page faults (fresh pages the kernel has
+    # to zero), garbage collections and traced Python/NumPy allocation peak.
+    source = SyntheticCapture(1280, 720, 1e6)
+    pool = FramePool()
+    held = []
+    collections = [0]
+
+    def count_collections(phase, info):
+        if phase == "start":
+            collections[0] += 1
+
+    def step():
+        if pooled:
+            frame = pool.acquire()
+            frame.read(source)
+            held.append(frame)
+            if len(held) > 2:
+                held.pop(0).release()
+        else:
+            ret_val, image = source.read()
+            held.append(image)
+            if len(held) > 2:
+                held.pop(0)
+
+    for _ in range(10):
+        step()
+    gc.callbacks.append(count_collections)
+    tracemalloc.start()
+    faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+    t0 = time.perf_counter()
+    for _ in range(frames):
+        step()
+    elapsed = time.perf_counter() - t0
+    faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt - faults
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.callbacks.remove(count_collections)
+    buffers = pool.buffers if pooled else frames + 10
+    allocated = buffers * 1280 * 720 * 3 / (frames + 10)
+    print(f"{'pooled' if pooled else 'read()':7s} {frames} frames  {elapsed / frames * 1e3:5.2f} ms/frame  "
+          f"{faults / frames:7.1f} page faults/frame  {collections[0] / frames:.3f} gc/frame  "
+          f"traced peak {peak / 1e6:5.1f} MB  {buffers} frame buffers, {allocated / 1e6:.2f} MB allocated/frame")
+
+
+def bus_subscriber(name, frames, results):
+    reader = FrameBusReader(name)
+    latencies = []
+    torn = 0
+    while len(latencies) < frames:
+        frame = reader.wait(timeout=2)
+        if frame is None:
+            break
+        latencies.append(time.monotonic() - frame.timestamp)
+        # Touch the frame the way a consumer would, then check it was not overwritten meanwhile.
+        frame.image[::16, ::16].sum()
+        if not reader.valid(frame):
+            torn += 1
+    results.put((os.getpid(), latencies, reader.missed, torn))
+    reader.close()
+
+
+def bench_bus(subscribers, frames, fps=60):
+    name = f"bench{os.getpid()}"
+    source = SyntheticCapture(1280, 720, fps)
+    bus = FrameBusWriter(name, (720, 1280, 3), slots=4)
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [context.Process(target=bus_subscriber, args=(name, frames, results)) for _ in range(subscribers)]
+    for process in processes:
+        process.start()
+    while len(bus.subscribers) < subscribers:
+        bus.publish(source.read()[1])
+    publish = []
+    for _ in range(frames + fps):
+        ret_val, image = source.read()
+        t0 = time.perf_counter()
+        bus.publish(image)
+        publish.append(time.perf_counter() - t0)
+    reports = [results.get(timeout=10) for _ in processes]
+    for process in processes:
+        process.join()
+    bus.close()
+    latencies = np.sort(np.concatenate([np.asarray(latency) for _, latency, _, _ in reports]))
+    missed = sum(report[2] for report in reports)
+    torn = sum(report[3] for report in reports)
+    print(f"bus  {subscribers} subscribers  publish {np.mean(publish) * 1e3:.2f} ms  latency p50 {latencies[len(latencies) // 2] * 1e3:.3f} ms  "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.3f} ms  max {latencies[-1] * 1e3:.3f} ms  missed {missed}  torn {torn}")
+
+
+def busy(seconds):
+    # A stage body that holds the frame for `seconds` without holding the GIL.
+    def stage(frame):
+        time.sleep(seconds)
+    return stage
+
+
+def bench_chain(seconds, fps=60, workers=2):
+    stages = [("overlay", busy(0.001), {"concurrent": True}),
+              ("tracker", busy(0.008), {"mutates": False, "concurrent": True}),
+              ("detector", busy(0.025), {"mutates": False, "concurrent": True, "every": 2}),
+              ("analytics", busy(0.015), {"mutates": False, "budgeted": True, "overrun": "defer"})]
+
+    def monolithic(frame):
+        for name, function, options in stages:
+            function(frame)
+        return frame
+
+    camera = CSICamera(source=SyntheticCapture(1280, 720, fps), framerate=fps, middleware=monolithic,
+                       workers=workers, show=False)
+    camera.start()
+    time.sleep(seconds)
+    camera.stop()
+    print(f"chain  monolithic  {format_stats(camera.stats())}")
+    camera = CSICamera(source=SyntheticCapture(1280, 720, fps), framerate=fps, workers=workers, show=False)
+    for name, function, options in stages:
+        camera.add_middleware(name, function, **options)
+    camera.start()
+    time.sleep(seconds)
+    camera.stop()
+    print(f"chain  staged      {format_stats(camera.stats())}")
+    camera.middleware.print_stats()
+    camera.middleware.close()
+
+
+def mjpeg_client(port, seconds, delay, received):
+    # Reads the multipart stream; `delay` per frame makes a slow client.
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    connection.request("GET", "/stream")
+    response = connection.getresponse()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        length = None
+        while (line := response.fp.readline().strip()) != b"":
+            if line.lower().startswith(b"content-length"):
+                length = int(line.split(b":")[1])
+        jpeg = response.fp.read(length)
+        response.fp.readline()
+        if jpeg[:2] == b"\xff\xd8":
+            received.append(jpeg)
+        time.sleep(delay)
+    connection.close()
+
+
+def bench_sinks(seconds, fps=60):
+    sink = MjpegSink(host="127.0.0.1", port=0, encoders=2)
+    camera = CSICamera(source=SyntheticCapture(1280, 720, fps), framerate=fps, sinks=[sink])
+    camera.start()
+    while sink.server is None:
+        time.sleep(0.01)
+    clients = {"fast": [], "slow": []}
+    threads = [threading.Thread(target=mjpeg_client, args=(sink.port, seconds, delay, clients[name]))
+               for name, delay in (("fast", 0.0), ("slow", 0.2))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    connection = http.client.HTTPConnection("127.0.0.1", sink.port, timeout=5)
+    connection.request("GET", "/snapshot.jpg")
+    snapshot = connection.getresponse().read()
+    connection.close()
+    camera.stop()
+    encode = sink.stats()
+    print(f"mjpeg  {format_stats(camera.stats())}")
+    print(f"mjpeg  fast client {len(clients['fast']) / seconds:5.1f} fps  slow client {len(clients['slow']) / seconds:5.1f} fps  "
+          f"encode {encode['latency'] * 1e3:.1f} ms  encoder drops {encode['encoder_dropped']}  snapshot {len(snapshot)} bytes")
+
+
+def bench_pyramid(frames, width=1280, height=720):
+    # Four consumers wanting different sizes of the same frame: each resizing on its own, against
+    # sharing views from the chain.
+    consumers = (("detector", "square", (640, 640), None), ("classifier", "square", (640, 640), None),
+                 ("tracker", "small", (320, 240), None), ("center", "center", (160, 160), (480, 200, 320, 320)))
+
+    def consumer(size, roi):
+        def stage(image):
+            if size is not None:
+                image = cv2.resize(image if roi is None else image[roi[1]:roi[1] + roi[3], roi[0]:roi[0] + roi[2]],
+                                   size, interpolation=cv2.INTER_AREA)
+            return float(image[::8, ::8].mean())
+        return stage
+
+    capture = SyntheticCapture(width, height, fps=1000)
+    images = [capture.read()[1] for _ in range(8)]
+    own = MiddlewareChain()
+    shared = MiddlewareChain()
+    for name, view, size, roi in consumers:
+        own.add(name, consumer(size, roi), mutates=False)
+        shared.add_view(view, size, roi)
+        shared.add(name, consumer(None, None), mutates=False, view=view)
+    for label, chain in (("own resize", own), ("shared views", shared)):
+        for i in range(frames):
+            chain(images[i % len(images)])
+        s = chain.stats()['chain']
+        resizes = s.get('views_computed', frames * len(consumers)) / frames
+        print(f"pyramid  {label:12s} {len(consumers)} consumers  mean {s['mean'] * 1e3:6.2f} ms/frame  "
+              f"p95 {s['p95'] * 1e3:6.2f} ms  resizes {resizes:.1f}/frame")
+
+
+def bench_metrics(seconds, fps=60, workers=2):
+    # Glass-to-display latency, drops and jitter as the camera reports them, with a stage reading
+    # each frame's sequence number and timestamp.
+    for name, middleware in (("none", None), ("detector 25 ms", detector_middleware), ("detector 40 ms", busy(0.040))):
+        source = SyntheticCapture(1280, 720, fps)
+        camera = CSICamera(source=source, framerate=fps, workers=workers, show=False, summary_interval=seconds / 2)
+        ages = []
+        camera.add_middleware("age", lambda frame, meta: ages.append(time.monotonic() - meta.captured),
+                              mutates=False, meta=True)
+        if middleware:
+            camera.add_middleware("detector", middleware, mutates=False, concurrent=True)
+        camera.start()
+        time.sleep(seconds)
+        camera.stop()
+        metrics = camera.metrics.snapshot()
+        sequence = [index for index, captured, latency in camera.metrics.frames()]
+        print(f"metrics  {name:15s} {camera.metrics.summary()}")
+        print(f"metrics  {name:15s} source dropped {source.dropped} (reported {metrics['dropped']['source']})  "
+              f"middleware age mean {np.mean(ages) * 1e3:.2f} ms  sequence gaps {sum(b - a - 1 for a, b in zip(sequence, sequence[1:]))}")
+
+
+def first_frame(sink, timeout=10.0):
+    # Seconds until `sink` gets a new frame.
+    start, written = time.monotonic(), sink.written
+    while sink.written == written and time.monotonic() - start < timeout:
+        time.sleep(0.001)
+    return time.monotonic() - start
+
+
+def bench_lifecycle(cycles=5, open_delay=1.0, fps=60):
+    # R2 pressed and released `cycles` times: rebuilding the pipeline each time (start / stop)
+    # against pausing and resuming a warm one. The fake backend takes `open_delay` to open, like
+    # nvarguscamerasrc; threads left over after the final stop are leaks.
+    baseline = threading.active_count()
+    sink = NullSink()
+    camera = CSICamera(source=lambda: SyntheticCapture(1280, 720, fps, open_delay=open_delay), framerate=fps,
+                       sinks=[sink])
+    restart = []
+    for _ in range(cycles):
+        start = time.monotonic()
+        camera.start()
+        restart.append(time.monotonic() - start + first_frame(sink))
+        camera.stop()
+    peak = threading.active_count()
+    camera.open()
+    toggle = []
+    for _ in range(cycles):
+        start = time.monotonic()
+        camera.resume()
+        toggle.append(time.monotonic() - start + first_frame(sink))
+        time.sleep(0.1)
+        camera.pause()
+        time.sleep(0.1)
+    camera.stop()
+    camera.stop()
+    print(f"lifecycle  start/stop   first frame {np.mean(restart) * 1e3:7.1f} ms  (max {max(restart) * 1e3:7.1f})  "
+          f"threads after stop {peak - baseline:+d}")
+    left = threading.active_count() - baseline
+    print(f"lifecycle  resume/pause first frame {np.mean(toggle) * 1e3:7.1f} ms  (max {max(toggle) * 1e3:7.1f})  "
+          f"threads after stop {left:+d}  displayed {sink.written}")
+    assert peak == baseline and left == 0, f"camera threads left after stop(): {peak - baseline:+d} / {left:+d}"
+    assert not camera.running and not camera.threads and camera.video_capture is None, "camera still open after stop()"
+    assert max(toggle) < open_delay, f"resume() took {max(toggle):.2f} s, as long as reopening"
+    # A sink that quits ends the run on its own; the next start() tears it down and starts clean.
+    sink = QuittingSink()
+    camera.sinks = [sink]
+    camera.start()
+    deadline = time.monotonic() + 5
+    while camera.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    quit = not camera.running
+    sink.quit = False
+    camera.start()
+    restarted = first_frame(sink)
+    camera.stop()
+    left = threading.active_count() - baseline
+    print(f"lifecycle  sink quit: stopped {quit}, restarted in {restarted * 1e3:.0f} ms, threads after stop {left:+d}")
+    assert quit and restarted < open_delay + 2 and left == 0, \
+        f"restart after a sink quit: stopped {quit}, first frame {restarted:.2f} s, threads {left:+d}"
+
+
+class QuittingSink(NullSink):
+    # Stops the camera after its first frame while `quit` is set, as a closed window does.
+    def __init__(self):
+        super().__init__()
+        self.quit = True
+
+    def write(self, frame, index, captured):
+        super().write(frame, index, captured)
+        return not self.quit
+
+
+class LatencySink(NullSink):
+    # Glass-to-display latency of every frame, with the time it was shown.
+    def __init__(self):
+        super().__init__()
+        self.shown = []
+
+    def write(self, frame, index, captured):
+        now = time.monotonic()
+        self.shown.append((now, now - captured))
+        return super().write(frame, index, captured)
+
+
+def bench_governor(phases=((2, 0.005), (8, 0.080), (8, 0.005)), fps=60, workers=2):
+    # Middleware whose cost scales with the frame size goes from light to heavy and back. Without a
+    # governor latency grows and frames drop; with one the camera steps down and back up.
+    for governed in (False, True):
+        cost = [phases[0][1]]
+
+        def middleware(frame):
+            time.sleep(cost[0] * frame.shape[0] * frame.shape[1] / (1280 * 720))
+            return frame
+
+        sink = LatencySink()
+        camera = CSICamera(display_width=1280, display_height=720, framerate=fps, workers=workers, sinks=[sink],
+                           middleware=middleware)
+        camera.source = lambda: SyntheticCapture(camera.display_width, camera.display_height, camera.framerate,
+                                                 open_delay=0.2)
+        governor = FrameGovernor(camera, interval=0.5, hold=2.0, up_after=4,
+                                 log=lambda message: print(f"  {message}")) if governed else None
+        camera.start()
+        if governor:
+            governor.start()
+        start = time.monotonic()
+        bounds = []
+        for seconds, phase_cost in phases:
+            cost[0] = phase_cost
+            bounds.append((time.monotonic(), time.monotonic() + seconds, phase_cost))
+            time.sleep(seconds)
+        if governor:
+            governor.stop()
+        camera.stop()
+        label = "governor" if governed else "fixed   "
+        for begin, end, phase_cost in bounds:
+            latencies = sorted(latency for shown, latency in sink.shown if begin <= shown < end)
+            p50 = latencies[len(latencies) // 2] if latencies else 0.0
+            p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+            print(f"governor  {label} middleware {phase_cost * 1e3:4.0f} ms  shown {len(latencies) / (end - begin):5.1f} fps  "
+                  f"p50 {p50 * 1e3:6.1f} ms  p95 {p95 * 1e3:6.1f} ms  max {(latencies[-1] if latencies else 0.0) * 1e3:6.1f} ms")
+        if governor:
+            print(f"governor  final level {governor.describe(governor.level)}  "
+                  f"{sum(d[1] in ('up', 'down') for d in governor.decisions)} steps, {len(governor.decisions)} decisions "
+                  f"over {time.monotonic() - start:.0f} s")
+
+
+def bench_governor_limits(fps=60):
+    # With a frame bus attached the ladder keeps the frame size; a level the camera refuses leaves
+    # the governor where it was, still running.
+    bus = FrameBusWriter(f"governor-{os.getpid()}", (720, 1280, 3), slots=2)
+    camera = CSICamera(display_width=1280, display_height=720, framerate=fps, sinks=[NullSink()], frame_bus=bus)
+    governor = FrameGovernor(camera, log=lambda message: None)
+    print(f"governor  frame bus ladder: {', '.join(governor.describe(level) for level in range(len(governor.levels)))}")
+    governor = FrameGovernor(camera, levels=[{}, {'exposure': 10}], log=lambda message: None)
+    decision = governor.step(1, "forced")
+    print(f"governor  refused level: {decision[1]}, still at level {governor.level}, stride {camera.stride}")
+    assert all((level['display_width'], level['display_height']) == (1280, 720) for level in governor.levels)
+    assert decision[1] == "failed" and governor.level == 0
+    bus.close()
+    # A level whose pipeline does not open: the camera goes back to the settings it had and keeps
+    # capturing, and the governor records the step as failed.
+    sink = NullSink()
+    camera = CSICamera(display_width=1280, display_height=720, framerate=fps, sinks=[sink])
+
+    def source():
+        capture = SyntheticCapture(camera.display_width, camera.display_height, camera.framerate)
+        if camera.display_width < 1280:
+            capture.release()
+        return capture
+    camera.source = source
+    camera.start()
+    governor = FrameGovernor(camera, log=lambda message: None)
+    decision = governor.step(2, "forced")
+    shown = first_frame(sink, timeout=2.0)
+    print(f"governor  level that does not open: {decision[1]}, still at level {governor.level}, "
+          f"{camera.display_width}x{camera.display_height} running {camera.running}, next frame after {shown * 1e3:.0f} ms")
+    assert decision[1] == "failed" and governor.level == 0, decision
+    assert (camera.display_width, camera.display_height) == (1280, 720) and camera.running and camera.active
+    assert shown < 2.0, "camera stopped after a failed reconfigure"
+    camera.stop()
+
+
+def bench_pipeline_descriptions(width=1280, height=720, crop=(320, 180, 960, 540)):
+    # Every flip method, with a crop that is not centered: the crop is taken in sensor pixels before
+    # the flip on both paths, and rotations swap the output size.
+    for hardware in (False, True):
+        for flip_method in range(len(FLIP_METHODS)):
+            pipeline = GstPipeline("test" if not hardware else "argus", width=width, height=height,
+                                   flip_method=flip_method, hardware=hardware).appsink(format="BGRx", crop=crop)
+            pipeline.validate()
+            convert = pipeline.convert_description(pipeline.branches[0])
+            rotated = flip_method in (1, 3, 5, 7)
+            expected = (crop[2], crop[3], 4) if rotated else (crop[3], crop[2], 4)
+            assert pipeline.frame_shape() == expected, f"flip {flip_method}: shape {pipeline.frame_shape()}"
+            if hardware:
+                assert "left=320 top=180 right=1280 bottom=720" in convert, convert
+            else:
+                margins = [int(m) for m in re.findall(r"(?:left|top|right|bottom)=(-?\d+)", convert)]
+                assert margins == [320, 180, 0, 0], f"flip {flip_method}: crop margins {margins}"
+                if flip_method:
+                    assert convert.index("videocrop") < convert.index("videoflip"), convert
+    try:
+        GstPipeline("test", width=width, height=height, flip_method=3, hardware=False).appsink(
+            crop=(640, 0, 960, 540)).validate()
+        raise AssertionError("a crop past the sensor's right edge passed validation")
+    except PipelineError:
+        pass
+    print(f"pipelines  descriptions: {len(FLIP_METHODS)} flip methods x 2 paths, crop {crop} in sensor pixels")
+
+
+def bench_pipelines(seconds, hardware=False):
+    # Capture fps and process CPU (GStreamer threads included) per output variant, on videotestsrc
+    # running flat out. hardware=True converts in nvvidconv and only works on the Jetson.
+    if not re.search(r"GStreamer:\s+YES", cv2.getBuildInformation()):
+        print("pipelines  skipped: OpenCV was built without GStreamer")
+        return
+    variants = (("BGR videoconvert", dict(format="BGR")),
+                ("BGRx", dict(format="BGRx")),
+                ("GRAY8", dict(format="GRAY8")),
+                ("NV12", dict(format="NV12")),
+                ("BGRx 640x360", dict(format="BGRx", width=640, height=360)),
+                ("BGRx crop 640x360", dict(format="BGRx", crop=(320, 180, 640, 360))),
+                ("BGRx crop rotated", dict(format="BGRx", crop=(320, 180, 960, 540), flip_method=3)))
+    for name, options in variants:
+        flip_method = options.pop("flip_method", 0)
+        pipeline = GstPipeline("test", width=1280, height=720, framerate=60, flip_method=flip_method,
+                               hardware=hardware, live=False)
+        capture = cv2.VideoCapture(pipeline.appsink(**options).build(), cv2.CAP_GSTREAMER)
+        if not capture.isOpened():
+            print(f"pipelines  {name:18s} failed to open")
+            continue
+        frames, image = 0, None
+        cpu, start = time.process_time(), time.monotonic()
+        while time.monotonic() - start < seconds:
+            ok, image = capture.read(image=image)
+            if not ok:
+                break
+            if frames % 30 == 0:
+                # Touch the pixels through the strided view, as a NumPy consumer would.
+                bgr_view(image).sum(dtype=np.uint32)
+            frames += 1
+        elapsed = time.monotonic() - start
+        cpu = time.process_time() - cpu
+        capture.release()
+        shape = image.shape if image is not None else pipeline.frame_shape()
+        print(f"pipelines  {name:18s} {frames / elapsed:7.1f} fps  cpu {cpu / elapsed * 100:5.1f} %  "
+              f"{cpu / max(frames, 1) * 1e3:6.2f} ms/frame  shape {shape}")
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    for name, middleware in (("none", lambda frame: frame), ("detector 25 ms", detector_middleware)):
+        print(f"middleware: {name}")
+        bench_legacy(middleware, seconds)
+        for workers in (1, 2, 4):
+            bench_pipeline(middleware, seconds, workers)
+    for pooled in (False, True):
+        bench_allocations(500, pooled)
+    for subscribers in (1, 2, 4):
+        bench_bus(subscribers, 300)
+    bench_chain(seconds)
+    bench_sinks(seconds)
+    bench_pyramid(500)
+    bench_metrics(seconds)
+    bench_lifecycle()
+    bench_governor()
+    bench_governor_limits()
+    bench_pipeline_descriptions()
+    bench_pipelines(seconds)
@@ -0,0 +1,156 @@
+import time
+import threading
+from collections import deque
+
+
+class FrameGovernor:
+    # Keeps CSICamera latency predictable by stepping along a ladder of `levels`, from the best
+    # (levels[0]) to the lightest (levels[-1]); the ladder's ends are the bounds. A level is a dict of
+    # CSICamera.reconfigure() settings (stride, framerate, display_width, display_height, ...) on top
+    # of the camera's own settings.
+    #
+    # Every `interval` seconds the governor looks at processing load: middleware latency against
+    # the time the workers have per frame, plus queue depth and drops sampled in between.
+    #   overloaded   - load above `high`, frames dropped in front of the workers, or the capture
+    #                  queue mostly full. `down_after` overloaded intervals in a row step down, to
+    #                  the first level whose projected load is below `high`.
+    #   underloaded  - no drops and the load, scaled to the next level up, stays below `low`.
+    #                  `up_after` intervals in a row step up.
+    # After a step nothing moves for `hold` seconds, so the camera settles and the new level's
+    # statistics are filled. Every decision is passed to `log`.
+    def __init__(self, camera, levels=None, interval=1.0, high=0.9, low=0.6, down_after=2, up_after=5, hold=5.0,
+                 log=print):
+        self.camera = camera
+        base = {'stride': camera.stride, 'framerate': camera.framerate,
+                'display_width': camera.display_width, 'display_height': camera.display_height}
+        self.levels = []
+        for level in levels or self.default_levels(camera):
+            level = dict(base, **level)
+            if camera.frame_bus:
+                # The frame bus has a fixed frame size; only stride and frame rate can change.
+                level.update(display_width=camera.display_width, display_height=camera.display_height)
+            if level not in self.levels:
+                self.levels.append(level)
+        self.interval = interval
+        self.high = high
+        self.low = low
+        self.down_after = down_after
+        self.up_after = up_after
+        self.hold = hold
+        self.log = log
+        self.level = 0
+        self.overloaded = 0
+        self.underloaded = 0
+        self.changed = 0.0
+        # The most recent decisions; every interval adds one, so the history is bounded.
+        self.decisions = deque(maxlen=1000)
+        self.running = False
+        self.thread = None
+
+    @staticmethod
+    def default_levels(camera):
+        # Each level halves the processing cost. Stride first, as it needs no pipeline rebuild; the
+        # frame rate goes last, as it also costs capture smoothness.
+        half_rate = max(camera.framerate // 2, 15)
+        half_size = {'display_width': camera.display_width // 2, 'display_height': camera.display_height // 2}
+        return [{}, {'stride': 2}, half_size, dict(half_size, stride=2), dict(half_size, framerate=half_rate, stride=2)]
+
+    @staticmethod
+    def cost(level):
+        return level['display_width'] * level['display_height'] * level['framerate'] / level['stride']
+
+    def describe(self, level):
+        settings = self.levels[level]
+        return (f"{level} ({settings['display_width']}x{settings['display_height']} "
+                f"{settings['framerate']} fps stride {settings['stride']})")
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="camera-governor", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        self.changed = time.monotonic()
+        while self.running:
+            begin = time.monotonic()
+            depths, deadline = [], begin + self.interval
+            dropped = self._dropped()
+            while self.running and time.monotonic() < deadline:
+                queue = self.camera.capture_queue
+                depths.append(len(queue) if queue is not None else 0)
+                time.sleep(min(0.05, self.interval))
+            if self.running and self.camera.running and self.camera.active:
+                self.evaluate(self.load(begin), sum(depths) / max(len(depths), 1), self._dropped() - dropped)
+
+    def _dropped(self):
+        stats = self.camera.stage_stats.get("process")
+        return stats.snapshot()['dropped'] if stats else 0
+
+    def load(self, since=None):
+        # Fraction of the workers' time the middleware needs at the current level.
+        camera = self.camera
+        latency = camera.stage_stats["process"].snapshot(since)['latency']
+        return latency * camera.framerate / camera.stride / camera.workers
+
+    def projected(self, load, level):
+        return load * self.cost(self.levels[level]) / self.cost(self.levels[self.level])
+
+    def evaluate(self, load, depth, dropped, now=None):
+        now = time.monotonic() if now is None else now
+        maxsize = self.camera.queue_size
+        overloaded = load > self.high or dropped > 0 or depth > 0.75 * maxsize
+        reason = f"load {load:.2f}  queue {depth:.1f}/{maxsize}  dropped {dropped}"
+        upper = self.level - 1
+        if upper >= 0:
+            projected = self.projected(load, upper)
+            underloaded = not overloaded and projected < self.low
+            reason += f"  projected {projected:.2f} at level {upper}"
+        else:
+            underloaded = False
+        self.overloaded = self.overloaded + 1 if overloaded else 0
+        self.underloaded = self.underloaded + 1 if underloaded else 0
+        if not (overloaded or underloaded):
+            return None
+        if overloaded:
+            target = self.level + 1
+            while target < len(self.levels) - 1 and self.projected(load, target) >= self.high:
+                target += 1
+        else:
+            target = upper
+        if target >= len(self.levels):
+            return self._decide(now, "hold", f"overloaded at the lightest level: {reason}")
+        if now - self.changed < self.hold:
+            return self._decide(now, "hold", f"settling for {self.hold - (now - self.changed):.1f} s: {reason}")
+        needed = self.down_after if overloaded else self.up_after
+        streak = self.overloaded if overloaded else self.underloaded
+        if streak < needed:
+            return self._decide(now, "hold", f"{'overloaded' if overloaded else 'underloaded'} {streak}/{needed}: {reason}")
+        return self.step(target, reason, now)
+
+    def step(self, target, reason="", now=None):
+        now = time.monotonic() if now is None else now
+        action = "down" if target > self.level else "up"
+        message = f"{self.describe(self.level)} -> {self.describe(target)}: {reason}"
+        self.overloaded = self.underloaded = 0
+        try:
+            self.camera.reconfigure(**self.levels[target])
+        except Exception as error:
+            # Stay on the current level; hold before trying again.
+            self.changed = time.monotonic()
+            return self._decide(now, "failed", f"{message}: {error!r}")
+        self.changed = time.monotonic()
+        decision = self._decide(now, action, message)
+        self.level = target
+        return decision
+
+    def _decide(self, now, action, message):
+        decision = (now, action, self.level, message)
+        self.decisions.append(decision)
+        self.log(f"governor {action}: {message}")
+        return decision
@@ -0,0 +1,233 @@
+import math
+import threading
+from collections import deque
+
+
+class FrameQueue:
+    # Bounded queue between two pipeline stages. put() never blocks the producer: when the queue is
+    # full the oldest item is dropped and handed back, so a slow stage only ever sees fresh frames.
+    def __init__(self, maxsize=2):
+        self.maxsize = maxsize
+        self.items = deque()
+        self.dropped = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item):
+        dropped = None
+        with self.condition:
+            if len(self.items) >= self.maxsize:
+                dropped = self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify()
+        return dropped
+
+    def get(self, timeout=None):
+        # Returns None on timeout, or once the queue is closed and empty.
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.items or self.closed, timeout):
+                return None
+            return self.items.popleft() if self.items else None
+
+    def drain(self):
+        with self.condition:
+            items = list(self.items)
+            self.items.clear()
+        return items
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class StageStats:
+    # Throughput and latency of one pipeline stage over the last `window` frames.
+    def __init__(self, name, window=120):
+        self.name = name
+        self.count = 0
+        self.dropped = 0
+        self.finished = deque(maxlen=window)
+        self.latencies = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, start, end):
+        with self.lock:
+            self.count += 1
+            self.finished.append(end)
+            self.latencies.append(end - start)
+
+    def drop(self, count=1):
+        with self.lock:
+            self.dropped += count
+
+    def snapshot(self, since=None):
+        # `since`: only frames finished at or after this time.monotonic() value.
+        with self.lock:
+            finished = list(self.finished)
+            latencies = list(self.latencies)
+            count, dropped = self.count, self.dropped
+        if since is not None:
+            recent = [i for i, end in enumerate(finished) if end >= since]
+            finished = [finished[i] for i in recent]
+            latencies = [latencies[i] for i in recent]
+        latencies.sort()
+        span = finished[-1] - finished[0] if len(finished) > 1 else 0.0
+        return {
+            'frames': count,
+            'dropped': dropped,
+            'fps': (len(finished) - 1) / span if span > 0 else 0.0,
+            'latency': sum(latencies) / len(latencies) if latencies else 0.0,
+            'latency_max': latencies[-1] if latencies else 0.0,
+        }
+
+
+class LatencyHistogram:
+    # Log-spaced bins from `low` to `high` seconds (10 per decade); cheap enough to add to per frame.
+    def __init__(self, low=1e-5, high=10.0, per_decade=10):
+        self.low = low
+        self.per_decade = per_decade
+        self.bins = [0] * (int(math.log10(high / low) * per_decade) + 2)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        if seconds < self.low:
+            index = 0
+        else:
+            index = min(int(math.log10(seconds / self.low) * self.per_decade) + 1, len(self.bins) - 1)
+        self.bins[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def upper(self, index):
+        return self.low * 10 ** (index / self.per_decade)
+
+    def percentile(self, p):
+        # Upper edge of the bin holding the p-th percentile.
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.bins):
+            seen += count
+            if seen >= rank and count:
+                return min(self.upper(index), self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+class FrameMetrics:
+    # Per-frame timing across the camera pipeline, from the capture timestamp and sequence number
+    # every frame carries:
+    #   latency         - glass to display: capture (read() returning; sensor exposure and ISP time
+    #                     before that are not visible to us) until every sink has taken the frame.
+    #   age             - how old a frame is when the middleware starts on it.
+    #   dropped         - 'source': frames the capture backend skipped, judged from gaps of more than
+    #                     1.5 frame periods between captures; 'process' / 'display': dropped from a
+    #                     full queue; 'order': finished after a newer frame was already shown.
+    #   *_jitter        - smoothed deviation of the capture / display interval from the frame period
+    #                     (the RFC 3550 estimator); `stride` is how many frame periods apart the
+    #                     camera means to display frames.
+    def __init__(self, framerate, recent=300):
+        self.period = 1.0 / framerate
+        self.stride = 1
+        self.latency = LatencyHistogram()
+        self.age = LatencyHistogram()
+        self.recent = deque(maxlen=recent)
+        self.dropped = {'source': 0, 'process': 0, 'display': 0, 'order': 0}
+        self.captured = 0
+        self.displayed = 0
+        self.capture_jitter = 0.0
+        self.display_jitter = 0.0
+        self.last_captured = None
+        self.last_displayed = None
+        self.lock = threading.Lock()
+
+    def resume(self):
+        # After a pause the next intervals are not frame intervals.
+        with self.lock:
+            self.last_captured = None
+            self.last_displayed = None
+
+    def _jitter(self, jitter, interval, period):
+        return jitter + (abs(interval - period) - jitter) / 16
+
+    def capture(self, frame):
+        with self.lock:
+            self.captured += 1
+            if self.last_captured is not None:
+                interval = frame.captured - self.last_captured
+                self.capture_jitter = self._jitter(self.capture_jitter, interval, self.period)
+                if interval > 1.5 * self.period:
+                    self.dropped['source'] += round(interval / self.period) - 1
+            self.last_captured = frame.captured
+
+    def process(self, frame, start):
+        with self.lock:
+            self.age.add(start - frame.captured)
+
+    def drop(self, reason, count=1):
+        with self.lock:
+            self.dropped[reason] += count
+
+    def display(self, frame, displayed):
+        latency = displayed - frame.captured
+        with self.lock:
+            self.displayed += 1
+            self.latency.add(latency)
+            self.recent.append((frame.index, frame.captured, latency))
+            if self.last_displayed is not None:
+                self.display_jitter = self._jitter(self.display_jitter, displayed - self.last_displayed,
+                                                   self.period * self.stride)
+            self.last_displayed = displayed
+
+    def frames(self):
+        # (sequence number, capture timestamp, glass-to-display latency) of recently displayed frames.
+        with self.lock:
+            return list(self.recent)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'captured': self.captured,
+                'displayed': self.displayed,
+                'dropped': dict(self.dropped),
+                'latency': self.latency.snapshot(),
+                'age': self.age.snapshot(),
+                'capture_jitter': self.capture_jitter,
+                'display_jitter': self.display_jitter,
+            }
+
+    def summary(self):
+        s = self.snapshot()
+        latency, age = s['latency'], s['age']
+        dropped = " ".join(f"{reason} {count}" for reason, count in s['dropped'].items())
+        return (f"frames {s['captured']} captured {s['displayed']} displayed  "
+                f"glass-to-display p50 {latency['p50'] * 1e3:.1f} p95 {latency['p95'] * 1e3:.1f} "
+                f"max {latency['max'] * 1e3:.1f} ms  middleware age p50 {age['p50'] * 1e3:.1f} ms  "
+                f"jitter capture {s['capture_jitter'] * 1e3:.2f} display {s['display_jitter'] * 1e3:.2f} ms  "
+                f"dropped {dropped}")
+
+
+def format_stats(stats):
+    return "  ".join(
+        f"{name} {s['fps']:5.1f} fps {s['latency'] * 1e3:6.2f} ms (max {s['latency_max'] * 1e3:6.2f}) drop {s['dropped']}"
+        for name, s in stats.items()
+    )
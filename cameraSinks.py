@@ -0,0 +1,258 @@
+import time
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+from cameraPipeline import FrameQueue, StageStats
+
+# A sink gets every frame the display stage shows: write(frame, index, captured) with a pooled
+# framePool.Frame; `index` and `captured` are its sequence number and capture timestamp (also
+# frame.index and frame.captured). write() must not block capture for long; a sink that keeps
+# the frame past the call retains it. write() returning False stops the camera. open() and
+# close() run on the display thread, which matters for HighGUI windows.
+
+
+class NullSink:
+    # Headless: frames are counted and released.
+    def __init__(self):
+        self.written = 0
+
+    def open(self):
+        pass
+
+    def write(self, frame, index, captured):
+        self.written += 1
+        return True
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {'written': self.written}
+
+
+class WindowSink:
+    def __init__(self, title="CSI Camera"):
+        self.title = title
+        self.written = 0
+
+    def open(self):
+        cv2.namedWindow(self.title, cv2.WINDOW_AUTOSIZE)
+
+    def write(self, frame, index, captured):
+        if cv2.getWindowProperty(self.title, cv2.WND_PROP_AUTOSIZE) < 0:
+            return False
+        cv2.imshow(self.title, frame.image)
+        self.written += 1
+        keyCode = cv2.waitKey(1) & 0xFF
+        return keyCode != 27 and keyCode != ord('q')
+
+    def close(self):
+        cv2.destroyAllWindows()
+
+    def stats(self):
+        return {'written': self.written}
+
+
+class MjpegSink:
+    # MJPEG over HTTP: GET / (or /stream) is a multipart/x-mixed-replace stream, /snapshot.jpg a
+    # single frame. Frames are encoded by a small pool, only while someone is watching; when all
+    # encoders are busy the frame is dropped. Every client sends the newest JPEG whenever it is
+    # ready for one, so a slow client skips frames instead of holding anything up.
+    def __init__(self, host="0.0.0.0", port=8080, quality=80, encoders=2, client_timeout=5.0):
+        self.host = host
+        self.port = port
+        self.quality = quality
+        self.encoders = encoders
+        self.client_timeout = client_timeout
+        self.condition = threading.Condition()
+        self.jpeg = None
+        self.sequence = -1
+        self.in_flight = 0
+        self.clients = 0
+        self.dropped = 0
+        self.sent = 0
+        self.closed = False
+        self.encode_stats = StageStats("encode")
+        self.server = None
+        self.server_thread = None
+        self.executor = None
+
+    def open(self):
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            timeout = self.client_timeout
+
+            def do_GET(self):
+                sink._serve(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.closed = False
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+        self.executor = ThreadPoolExecutor(self.encoders, thread_name_prefix="jpeg")
+
+    def write(self, frame, index, captured):
+        if not self.clients:
+            return True
+        with self.condition:
+            if self.in_flight >= self.encoders:
+                self.dropped += 1
+                return True
+            self.in_flight += 1
+        self.executor.submit(self._encode, frame.retain(), index)
+        return True
+
+    def _encode(self, frame, index):
+        start = time.monotonic()
+        try:
+            ok, jpeg = cv2.imencode(".jpg", frame.image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        finally:
+            frame.release()
+        self.encode_stats.record(start, time.monotonic())
+        with self.condition:
+            self.in_flight -= 1
+            # Encoders can finish out of order; never replace a newer frame with an older one.
+            if ok and index > self.sequence:
+                self.jpeg, self.sequence = jpeg.tobytes(), index
+                self.condition.notify_all()
+
+    def _next_jpeg(self, after, timeout=1.0):
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence > after or self.closed, timeout)
+            return self.jpeg, self.sequence
+
+    def _serve(self, handler):
+        with self.condition:
+            self.clients += 1
+        try:
+            if handler.path.startswith("/snapshot"):
+                # Wait for a fresh frame: the last JPEG may be from before anyone was watching.
+                jpeg, _ = self._next_jpeg(self.sequence, self.client_timeout)
+                if jpeg is None:
+                    handler.send_error(503, "no frame yet")
+                    return
+                handler.send_response(200)
+                handler.send_header("Content-Type", "image/jpeg")
+                handler.send_header("Content-Length", str(len(jpeg)))
+                handler.end_headers()
+                handler.wfile.write(jpeg)
+                return
+            if handler.path not in ("/", "/stream"):
+                handler.send_error(404)
+                return
+            handler.send_response(200)
+            handler.send_header("Cache-Control", "no-cache")
+            handler.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+            handler.end_headers()
+            sent = -1
+            while not self.closed:
+                jpeg, sequence = self._next_jpeg(sent)
+                if jpeg is None or sequence == sent:
+                    continue
+                handler.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % len(jpeg))
+                handler.wfile.write(jpeg)
+                handler.wfile.write(b"\r\n")
+                sent = sequence
+                self.sent += 1
+        except (BrokenPipeError, ConnectionResetError, socket.timeout):
+            pass
+        finally:
+            with self.condition:
+                self.clients -= 1
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server_thread.join()
+            self.server = None
+        if self.executor:
+            self.executor.shutdown()
+            self.executor = None
+
+    def stats(self):
+        stats = self.encode_stats.snapshot()
+        stats.update({'clients': self.clients, 'sent': self.sent, 'encoder_dropped': self.dropped})
+        return stats
+
+
+class GStreamerSink:
+    # Pushes frames into a GStreamer pipeline through appsrc, by default H.264 over RTP/UDP with the
+    # Jetson hardware encoder. The writer runs on its own thread behind a one-frame drop-oldest
+    # queue, so a stalled encoder or network drops frames rather than capture.
+    JETSON_H264 = "nvvidconv ! video/x-raw(memory:NVMM), format=(string)NV12 ! nvv4l2h264enc insert-sps-pps=true maxperf-enable=1"
+    SOFTWARE_H264 = "videoconvert ! video/x-raw, format=(string)I420 ! x264enc tune=zerolatency speed-preset=ultrafast"
+
+    def __init__(self, host="127.0.0.1", port=5000, framerate=30, encoder=JETSON_H264, pipeline=None):
+        self.host = host
+        self.port = port
+        self.framerate = framerate
+        self.encoder = encoder
+        self.pipeline = pipeline
+        self.writer = None
+        self.queue = None
+        self.thread = None
+        self.written = 0
+        self.dropped = 0
+
+    def gstreamer_pipeline(self):
+        if self.pipeline:
+            return self.pipeline
+        return (
+            "appsrc is-live=true format=time ! "
+            "video/x-raw, format=(string)BGR ! "
+            "videoconvert ! video/x-raw, format=(string)BGRx ! "
+            "%s ! h264parse ! rtph264pay config-interval=1 pt=96 ! "
+            "udpsink host=%s port=%d sync=false async=false"
+            % (self.encoder, self.host, self.port)
+        )
+
+    def open(self):
+        self.queue = FrameQueue(1)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, frame, index, captured):
+        dropped = self.queue.put(frame.retain())
+        if dropped is not None:
+            dropped.release()
+            self.dropped += 1
+        return True
+
+    def _run(self):
+        while (frame := self.queue.get()) is not None:
+            try:
+                if self.writer is None:
+                    height, width = frame.image.shape[:2]
+                    self.writer = cv2.VideoWriter(self.gstreamer_pipeline(), cv2.CAP_GSTREAMER, 0,
+                                                  self.framerate, (width, height), True)
+                    if not self.writer.isOpened():
+                        print("Error: Unable to open GStreamer sink")
+                if self.writer.isOpened():
+                    self.writer.write(frame.image)
+                    self.written += 1
+            finally:
+                frame.release()
+
+    def close(self):
+        self.queue.close()
+        self.thread.join()
+        for frame in self.queue.drain():
+            frame.release()
+        if self.writer:
+            self.writer.release()
+            self.writer = None
+
+    def stats(self):
+        return {'written': self.written, 'dropped': self.dropped}
@@ -0,0 +1,162 @@
+import time
+import asyncio
+from collections import namedtuple
+import evdev
+from evdev import ecodes
+from dualSense import DualShockController
+
+# What the manager yields: `device` is the device node, `type` and `args` are what a
+# DualShockController callback gets, plus 'connected' / 'disconnected' (args: the device name).
+ControllerEvent = namedtuple('ControllerEvent', ['device', 'type', 'args', 'time'])
+
+
+def is_gamepad(device):
+    # A DualShock / DualSense shows up as several event devices (pad, motion sensors, touchpad);
+    # only the pad has face buttons and sticks.
+    capabilities = device.capabilities(absinfo=False)
+    return (ecodes.BTN_SOUTH in capabilities.get(ecodes.EV_KEY, ())
+            and {ecodes.ABS_X, ecodes.ABS_Y} <= set(capabilities.get(ecodes.EV_ABS, ())))
+
+
+class ControllerManager:
+    # Every game controller on one asyncio loop. Devices are found by capability (`match`) rather
+    # than by path; a controller that is unplugged is dropped and picked up again when it comes
+    # back, found by a rescan every `scan_interval` seconds. Each device is decoded by its own
+    # DualShockController (`controller_options` go to it), read through loop.add_reader on its fd
+    # like evdev's async reader, so anything with fileno() and read() will do.
+    #
+    #     async with ControllerManager() as manager:
+    #         async for event in manager:
+    #             ...
+    #
+    # Events wait in a queue of `queue_size`; when the consumer falls behind the oldest go.
+    # close() (or leaving the `async with`) cancels the scan and read tasks, closes the devices
+    # and ends the iteration.
+    def __init__(self, scan_interval=1.0, match=is_gamepad, list_devices=evdev.list_devices,
+                 open_device=evdev.InputDevice, queue_size=256, **controller_options):
+        self.scan_interval = scan_interval
+        self.match = match
+        self.list_devices = list_devices
+        self.open_device = open_device
+        self.queue_size = queue_size
+        self.controller_options = controller_options
+        self.controllers = {}
+        self.ignored = set()
+        self.tasks = {}
+        self.scanner = None
+        self.queue = None
+        self.closed = False
+        self.dropped = 0
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def start(self):
+        self.queue = asyncio.Queue(self.queue_size)
+        self.closed = False
+        self.scanner = asyncio.create_task(self._scan())
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed and self.queue.empty():
+            raise StopAsyncIteration
+        event = await self.queue.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    async def _scan(self):
+        while True:
+            self.scan()
+            await asyncio.sleep(self.scan_interval)
+
+    def scan(self):
+        paths = set(self.list_devices())
+        self.ignored &= paths
+        for path in paths - set(self.controllers) - self.ignored:
+            try:
+                device = self.open_device(path)
+            except OSError:
+                continue
+            if self.match(device):
+                self._attach(path, device)
+            else:
+                device.close()
+                self.ignored.add(path)
+
+    def _attach(self, path, device):
+        controller = DualShockController(device, **self.controller_options)
+        controller.register_callback(
+            lambda event_type, *args: self._put(ControllerEvent(path, event_type, args, time.monotonic())))
+        self.controllers[path] = controller
+        self.tasks[path] = asyncio.create_task(self._read(path, controller))
+        self._put(ControllerEvent(path, 'connected', (device.name,), time.monotonic()))
+
+    async def _read(self, path, controller):
+        loop = asyncio.get_running_loop()
+        device = controller.device
+        readable = asyncio.Event()
+        fd = device.fileno()
+        loop.add_reader(fd, readable.set)
+        try:
+            while True:
+                due = controller.due()
+                try:
+                    await asyncio.wait_for(readable.wait(), None if due is None else max(due - time.monotonic(), 0.0))
+                except asyncio.TimeoutError:
+                    pass
+                # A timeout only sends a held snapshot; the device is read when its fd is readable.
+                if readable.is_set():
+                    readable.clear()
+                    try:
+                        # evdev's read() is a generator: EAGAIN and ENODEV come while iterating it.
+                        events = list(device.read())
+                    except BlockingIOError:
+                        events = []
+                    except OSError:
+                        # ENODEV: unplugged. Any other read error is treated the same; a rescan reopens it.
+                        break
+                    controller.handle_events(events)
+                controller.flush(time.monotonic())
+        finally:
+            loop.remove_reader(fd)
+            device.close()
+            self.controllers.pop(path, None)
+            self.tasks.pop(path, None)
+            if not self.closed:
+                self._put(ControllerEvent(path, 'disconnected', (device.name,), time.monotonic()))
+
+    async def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        tasks = [task for task in [self.scanner, *self.tasks.values()] if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.scanner = None
+        self._put(None)
+
+
+if __name__ == "__main__":
+    async def main():
+        async with ControllerManager(max_rate=50) as manager:
+            async for event in manager:
+                print(event.device, event.type, event.args)
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,248 @@
+import os
+import sys
+import time
+import asyncio
+import tempfile
+from collections import Counter
+import numpy as np
+from dualSense import DualShockController
+from controllerAsync import ControllerManager
+from controllerLog import ControllerRecorder, ControllerLog, ControllerReplayer, CallbackProfiler
+from evdev import InputEvent, ecodes
+from fakeController import FakeInputDevice, FakeDeviceSet, stick_reports, session_reports, play
+
+
+def bench_coalescing(seconds, rate=250, callback_cost=0.001):
+    # A synthetic 250 Hz DualSense stream into a callback costing `callback_cost` (an I2C servo
+    # write and a print): callback rate and how old the stick state is when the callback gets it.
+    for label, options in (("every axis update", dict(coalesce=None)),
+                           ("per SYN_REPORT", dict(coalesce='report')),
+                           ("report, max 50/s", dict(coalesce='report', max_rate=50)),
+                           ("20 ms window", dict(coalesce='window', window=0.02))):
+        device = FakeInputDevice()
+        controller = DualShockController(device, **options)
+        latencies, last = [], [None]
+
+        def callback(event_type, *args):
+            if event_type == 'joystick':
+                latencies.append(time.time() - controller.joystick_time)
+                last[0] = args
+                time.sleep(callback_cost)
+
+        controller.register_callback(callback)
+        controller.start()
+        player = play(device, stick_reports(rate, seconds), rate)
+        player.join()
+        time.sleep(0.1)
+        controller.stop()
+        device.close()
+        latencies.sort()
+        print(f"coalesce  {label:18s} joystick callbacks {len(latencies) / seconds:6.1f}/s  "
+              f"axis updates {controller.axis_updates / seconds:6.0f}/s  "
+              f"latency p50 {latencies[len(latencies) // 2] * 1e3:7.2f} ms  p95 {latencies[int(len(latencies) * 0.95)] * 1e3:7.2f} ms  "
+              f"max {latencies[-1] * 1e3:7.2f} ms  final {last[0]}")
+
+
+async def hotplug_session(seconds, rate=250):
+    # Two pads and a motion-sensor node on one manager; one pad is unplugged and replugged halfway.
+    devices = FakeDeviceSet()
+    devices.plug("/dev/input/event9")
+    devices.plug("/dev/input/event10", "Fake DualSense Motion Sensors", FakeInputDevice.MOTION_SENSOR)
+    devices.plug("/dev/input/event12")
+    counts, log = Counter(), []
+
+    async def consume(manager):
+        async for event in manager:
+            counts[event.device, event.type] += 1
+            if event.type in ('connected', 'disconnected'):
+                log.append(f"{event.time - start:5.2f} s {event.type} {event.device}")
+
+    start = time.monotonic()
+    async with ControllerManager(scan_interval=0.1, list_devices=devices.list_devices, open_device=devices.open,
+                                 max_rate=50) as manager:
+        consumer = asyncio.create_task(consume(manager))
+        await asyncio.sleep(0.2)
+        play(devices.opened["/dev/input/event9"], stick_reports(rate, seconds), rate)
+        play(devices.opened["/dev/input/event12"], stick_reports(rate, seconds / 2), rate)
+        await asyncio.sleep(seconds / 2)
+        devices.unplug("/dev/input/event12")
+        await asyncio.sleep(0.2)
+        devices.plug("/dev/input/event12")
+        await asyncio.sleep(0.2)
+        play(devices.opened["/dev/input/event12"], stick_reports(rate, seconds / 2 - 0.4), rate)
+        await asyncio.sleep(seconds / 2)
+        closing = time.monotonic()
+    await consumer
+    closed = time.monotonic() - closing
+    for line in log:
+        print(f"hotplug  {line}")
+    for (device, event_type), count in sorted(counts.items()):
+        if event_type not in ('connected', 'disconnected'):
+            print(f"hotplug  {device} {event_type:9s} {count / seconds:6.1f}/s")
+    print(f"hotplug  close and drain {closed * 1e3:.1f} ms  tasks left {len(asyncio.all_tasks()) - 1}  "
+          f"open devices {sum(not device.closed for device in devices.opened.values())}  queue drops {manager.dropped}")
+
+
+def bench_hotplug(seconds):
+    asyncio.run(hotplug_session(seconds))
+
+
+def event_log(seconds, rate=250):
+    # A recorded-session stand-in: stick reports at `rate`, with R2 and triangle pressed now and then.
+    events = []
+    for n, report in enumerate(session_reports(rate, seconds)):
+        t = 1e9 + n / rate
+        sec, usec = int(t), int(t % 1 * 1e6)
+        events += [InputEvent(sec, usec, etype, code, value) for etype, code, value in report]
+        events.append(InputEvent(sec, usec, ecodes.EV_SYN, ecodes.SYN_REPORT, 0))
+    return events
+
+
+def bench_dispatch(seconds=20, repeats=3):
+    # Decode and dispatch throughput on a replayed log, with servoGampad's three handlers: callbacks
+    # that filter every event themselves, against subscriptions to one type or one button; one
+    # joystick event per axis update, against one per controller report.
+    events = event_log(seconds)
+    calls = Counter()
+
+    def joystick_callback(event_type, left, right=None):
+        if event_type == 'joystick':
+            calls['joystick'] += 1
+
+    def trigger_callback(event_type, name, value=None):
+        if event_type == 'button' and name == 'R2':
+            calls['R2'] += 1
+
+    def activate_callback(event_type, name, value=None):
+        if event_type == 'button' and name == 'triangle' and value == 'down':
+            calls['triangle'] += 1
+
+    def on_joystick(left, right):
+        calls['joystick'] += 1
+
+    def on_r2(button, direction):
+        calls['R2'] += 1
+
+    def on_triangle(button, direction):
+        if direction == 'down':
+            calls['triangle'] += 1
+
+    def callbacks(controller):
+        for callback in (joystick_callback, trigger_callback, activate_callback):
+            controller.register_callback(callback)
+        return controller
+
+    def subscriptions(controller):
+        controller.subscribe('joystick', on_joystick)
+        controller.subscribe('button', on_r2, 'R2')
+        controller.subscribe('button', on_triangle, 'triangle')
+        return controller
+
+    device = FakeInputDevice()
+    for label, make in (("callbacks, per axis update", lambda: callbacks(DualShockController(device, coalesce=None))),
+                        ("subscriptions, per axis update",
+                         lambda: subscriptions(DualShockController(device, coalesce=None))),
+                        ("callbacks, per report", lambda: callbacks(DualShockController(device, coalesce='report'))),
+                        ("subscriptions, per report",
+                         lambda: subscriptions(DualShockController(device, coalesce='report')))):
+        best = float('inf')
+        for _ in range(repeats):
+            controller = make()
+            calls.clear()
+            start = time.perf_counter()
+            controller.handle_events(events)
+            best = min(best, time.perf_counter() - start)
+        print(f"dispatch  {label:34s} {len(events) / best / 1e3:7.0f} k events/s  {best / len(events) * 1e6:5.2f} us/event  "
+              f"handler calls {dict(calls)}")
+    device.close()
+
+
+class GamepadLoad:
+    # servoGampad's three handlers, with a sleep standing in for the two I2C servo writes.
+    def __init__(self, controller, servo_cost=0.0015):
+        self.servo_cost = servo_cost
+        self.joystick_active = True
+        self.camera_active = False
+        controller.subscribe('joystick', self.joystick_callback)
+        controller.subscribe('button', self.trigger_callback, 'R2')
+        controller.subscribe('button', self.joystick_activate_callback, 'triangle')
+
+    def joystick_callback(self, left, right):
+        if self.joystick_active:
+            time.sleep(self.servo_cost)
+
+    def trigger_callback(self, button, direction):
+        self.camera_active = direction == 'down'
+
+    def joystick_activate_callback(self, button, direction):
+        if direction == 'down':
+            self.joystick_active = not self.joystick_active
+
+
+def bench_replay(seconds, rate=250):
+    # Records a synthetic session through a running controller, replays it twice as fast as
+    # possible into the dispatcher (the decoded events must match the live ones), then replays it
+    # through a controller's read loop at real and 4x speed with per-handler latency.
+    path = os.path.join(tempfile.mkdtemp(), "session.evlog")
+    device = FakeInputDevice()
+    controller = DualShockController(device)
+    recorder = ControllerRecorder(path)
+    controller.taps.append(recorder)
+    live = []
+    for event_type in ('button', 'joystick', 'trigger'):
+        controller.subscribe(event_type, lambda *args: live.append(args))
+    controller.start()
+    play(device, session_reports(rate, seconds), rate).join()
+    time.sleep(0.1)
+    controller.stop()
+    device.close()
+    recorder.close()
+    log = ControllerLog(path)
+    print(f"replay  recorded {len(log)} events, {len(log.reports())} reports in {log.duration():.2f} s  "
+          f"{os.path.getsize(path)} bytes, {(os.path.getsize(path)) / len(log):.1f} bytes/event")
+
+    replays = []
+    for _ in range(2):
+        controller = DualShockController(FakeInputDevice())
+        decoded = []
+        for event_type in ('button', 'joystick', 'trigger'):
+            controller.subscribe(event_type, lambda *args: decoded.append(args))
+        replayer = ControllerReplayer(log, controller, speed=0)
+        start = time.perf_counter()
+        replayer.run()
+        elapsed = time.perf_counter() - start
+        controller.device.close()
+        replays.append(decoded)
+    print(f"replay  speed 0 into the dispatcher: {replayer.reports_sent / elapsed / 1e3:.0f} k reports/s, "
+          f"{len(replays[0])} events, identical to each other {replays[0] == replays[1]}, to the live run {replays[0] == live}")
+
+    for speed in (1, 4):
+        device = FakeInputDevice()
+        controller = DualShockController(device, max_rate=50)
+        load = GamepadLoad(controller)
+        profiler = CallbackProfiler()
+        profiler.instrument(controller)
+        replayer = ControllerReplayer(log, device, speed=speed)
+        controller.start()
+        start = time.perf_counter()
+        replayer.start()
+        replayer.wait()
+        elapsed = time.perf_counter() - start
+        time.sleep(0.1)
+        controller.stop()
+        replayer.stop()
+        device.close()
+        print(f"replay  speed {speed} through the read loop, max_rate 50: {elapsed:.2f} s, "
+              f"max schedule lag {replayer.max_lag * 1e3:.2f} ms")
+        for line in profiler.report().splitlines():
+            print(f"replay    {line}")
+    log.close()
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    bench_coalescing(seconds)
+    bench_hotplug(seconds)
+    bench_dispatch()
+    bench_replay(seconds)
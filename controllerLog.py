@@ -0,0 +1,275 @@
+import os
+import sys
+import mmap
+import time
+import struct
+import threading
+from collections import defaultdict
+import numpy as np
+from evdev import InputEvent, UInput, AbsInfo, ecodes
+from dualSense import DualShockController
+
+# Layout: one file header, then one fixed-size record per raw evdev event, with the timestamp the
+# kernel gave it. Records are appended as they are read, so a crash can only tear the last one,
+# which the next recorder cuts off.
+MAGIC = b'DSEVLOG1'
+FILE_HEADER = struct.Struct('<8sHH12x')
+RECORD = struct.Struct('<qIHHi')
+RECORD_DTYPE = np.dtype([('sec', '<i8'), ('usec', '<u4'), ('type', '<u2'), ('code', '<u2'), ('value', '<i4')])
+VERSION = 1
+
+
+class ControllerRecorder:
+    # A DualShockController tap: controller.taps.append(recorder) logs every batch of raw events
+    # the controller reads, before decoding. Appends to an existing log.
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path) >= FILE_HEADER.size:
+            self.file = open(path, 'r+b')
+            magic, version, record_size = FILE_HEADER.unpack(self.file.read(FILE_HEADER.size))
+            if magic != MAGIC or record_size != RECORD.size:
+                raise ValueError(f"{path} is not a controller log")
+            self.count = (os.path.getsize(path) - FILE_HEADER.size) // RECORD.size
+            end = FILE_HEADER.size + self.count * RECORD.size
+            self.file.truncate(end)
+            self.file.seek(end)
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION, RECORD.size))
+            self.count = 0
+        self.lock = threading.Lock()
+
+    def write(self, events):
+        data = b''.join([RECORD.pack(event.sec, event.usec, event.type, event.code, event.value) for event in events])
+        with self.lock:
+            self.file.write(data)
+            self.count += len(events)
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class ControllerLog:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size = FILE_HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or record_size != RECORD.size:
+            raise ValueError(f"{path} is not a controller log")
+        self.count = (len(self.map) - FILE_HEADER.size) // RECORD.size
+        self.events = np.frombuffer(self.map, dtype=RECORD_DTYPE, count=self.count, offset=FILE_HEADER.size)
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.events = None
+        self.map.close()
+        self.file.close()
+
+    def timestamps(self):
+        return self.events['sec'] + self.events['usec'] * 1e-6
+
+    def duration(self):
+        return float(self.timestamps()[-1] - self.timestamps()[0]) if self.count else 0.0
+
+    def input_events(self, start=0, stop=None):
+        return [InputEvent(*row) for row in self.events[start:stop].tolist()]
+
+    def reports(self):
+        # The log split into controller reports: (timestamp, [(type, code, value), ...]) per
+        # SYN_REPORT, which ends its report. Events after the last SYN_REPORT are left out.
+        events = self.events
+        ends = np.flatnonzero((events['type'] == ecodes.EV_SYN) & (events['code'] == ecodes.SYN_REPORT)) + 1
+        timestamps = self.timestamps()
+        rows = events[['type', 'code', 'value']].tolist()
+        reports, start = [], 0
+        for end in ends.tolist():
+            reports.append((float(timestamps[end - 1]), rows[start:end]))
+            start = end
+        return reports
+
+
+def uinput_device(name="Replayed DualSense"):
+    # A virtual DualSense for replaying into a process that opens /dev/input itself (needs
+    # write access to /dev/uinput).
+    stick = AbsInfo(value=DualShockController.CENTER, min=0, max=255, fuzz=0, flat=0, resolution=0)
+    hat = AbsInfo(value=0, min=-1, max=1, fuzz=0, flat=0, resolution=0)
+    capabilities = {ecodes.EV_KEY: list(DualShockController.button_presses),
+                    ecodes.EV_ABS: [(code, stick) for code in range(6)] + [(16, hat), (17, hat)]}
+    return UInput(capabilities, name=name)
+
+
+class ControllerReplayer:
+    # Plays a ControllerLog back report by report. `target` is either a DualShockController, whose
+    # dispatcher gets the events directly, or a device taking write(type, code, value) and syn():
+    # a fakeController.FakeInputDevice handed to a DualShockController, or uinput_device().
+    # speed=1 is real time, N is N times faster and 0 sends as fast as the target takes it.
+    # Replayed events are stamped with the time they are sent, as the kernel stamps live ones, so
+    # latency measured downstream is the replay's and not the recording's.
+    def __init__(self, log, target, speed=1.0):
+        self.reports = log.reports()
+        self.target = target
+        self.speed = speed
+        self.running = False
+        self.thread = None
+        self.finished = threading.Event()
+        self.reports_sent = 0
+        self.events_sent = 0
+        self.max_lag = 0.0
+
+    def start(self):
+        self.running = True
+        self.finished.clear()
+        self.thread = threading.Thread(target=self.run, name="controller-replay", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+    def run(self):
+        self.running = True
+        dispatch = hasattr(self.target, 'handle_events')
+        start = time.perf_counter()
+        base = self.reports[0][0] if self.reports else 0.0
+        for timestamp, report in self.reports:
+            if not self.running:
+                break
+            if self.speed:
+                delay = start + (timestamp - base) / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    self.max_lag = max(self.max_lag, -delay)
+            if dispatch:
+                self._dispatch(report)
+            else:
+                self._write(report)
+            self.reports_sent += 1
+            self.events_sent += len(report)
+        self.running = False
+        self.finished.set()
+
+    def _dispatch(self, report):
+        now = time.time()
+        sec, usec = int(now), int(now % 1 * 1e6)
+        self.target.handle_events([InputEvent(sec, usec, etype, code, value) for etype, code, value in report])
+        self.target.flush()
+
+    def _write(self, report):
+        for etype, code, value in report:
+            if etype == ecodes.EV_SYN:
+                if code == ecodes.SYN_REPORT:
+                    self.target.syn()
+            else:
+                self.target.write(etype, code, value)
+
+
+class CallbackProfiler:
+    # Times the handlers of a DualShockController: latency from the newest input event's timestamp
+    # to the handler starting (decoding, coalescing and any max_rate hold included), and the
+    # handler's own run time. instrument() wraps the handlers subscribed or registered so far and
+    # adds the profiler as a tap; unsubscribe() does not know the wrapped handlers.
+    def __init__(self):
+        self.latest = 0.0
+        self.samples = defaultdict(list)
+
+    def write(self, events):
+        if events:
+            self.latest = events[-1].timestamp()
+
+    def wrap(self, name, handler):
+        samples = self.samples[name]
+
+        def timed(*args):
+            start = time.time()
+            try:
+                return handler(*args)
+            finally:
+                end = time.time()
+                samples.append((start - self.latest, end - start))
+        timed.__wrapped__ = handler
+        return timed
+
+    def instrument(self, controller):
+        for key, handlers in controller.subscribers.items():
+            label = key if isinstance(key, str) else " ".join(key)
+            handlers[:] = [self.wrap(f"{_handler_name(handler)} [{label}]", handler) for handler in handlers]
+        controller.callbacks[:] = [self.wrap(f"{_handler_name(callback)} [callback]", callback)
+                                   for callback in controller.callbacks]
+        controller.taps.append(self)
+        return controller
+
+    def summary(self):
+        summary = {}
+        for name, samples in self.samples.items():
+            if not samples:
+                continue
+            latency = np.array([sample[0] for sample in samples]) * 1e3
+            duration = np.array([sample[1] for sample in samples]) * 1e3
+            summary[name] = {'calls': len(samples),
+                             'latency_p50': float(np.percentile(latency, 50)),
+                             'latency_p95': float(np.percentile(latency, 95)),
+                             'latency_max': float(latency.max()),
+                             'duration_p50': float(np.percentile(duration, 50)),
+                             'duration_p95': float(np.percentile(duration, 95)),
+                             'busy': float(duration.sum())}
+        return summary
+
+    def report(self):
+        lines = [f"{'handler':58s} {'calls':>6s}  {'latency p50/p95/max ms':>24s}  {'run p50/p95 ms':>16s}"]
+        for name, stats in sorted(self.summary().items()):
+            lines.append(f"{name:58s} {stats['calls']:6d}  {stats['latency_p50']:7.2f} {stats['latency_p95']:7.2f} "
+                         f"{stats['latency_max']:8.2f}  {stats['duration_p50']:7.2f} {stats['duration_p95']:8.2f}")
+        return "\n".join(lines)
+
+
+def _handler_name(handler):
+    return getattr(handler, '__qualname__', None) or repr(handler)
+
+
+if __name__ == "__main__":
+    # controllerLog.py record /dev/input/event9 session.evlog
+    # controllerLog.py replay session.evlog [speed]    (into a uinput pad)
+    # controllerLog.py info session.evlog
+    command, arguments = sys.argv[1], sys.argv[2:]
+    if command == 'record':
+        device_path, path = arguments
+        recorder = ControllerRecorder(path)
+        controller = DualShockController(device_path)
+        controller.taps.append(recorder)
+        controller.start()
+        print(f"recording {device_path} to {path}, Ctrl-C to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            controller.stop()
+            recorder.close()
+            print(f"{recorder.count} events")
+    elif command == 'replay':
+        log = ControllerLog(arguments[0])
+        device = uinput_device()
+        print(f"replaying {len(log)} events as {device.device.path}")
+        replayer = ControllerReplayer(log, device, speed=float(arguments[1]) if len(arguments) > 1 else 1.0)
+        replayer.run()
+        device.close()
+        log.close()
+    else:
+        log = ControllerLog(arguments[0])
+        print(f"{len(log)} events, {len(log.reports())} reports in {log.duration():.1f} s, "
+              f"{RECORD.size} bytes per event")
+        for event in log.input_events(0, 10):
+            print(event)
+        log.close()
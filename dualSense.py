@@ -53,13 +53,42 @@ class DualShockController:
         1: 'down'
     }
 
-    def __init__(self, device_path):
-        self.device = InputDevice(device_path)
+    event_types = ('button', 'emergency', 'joystick', 'trigger', 'leftpad')
+
+    # Joystick and analog trigger updates are coalesced into state snapshots, latest value wins:
+    #   coalesce='report' - one 'joystick' event (and one 'trigger' event per moved trigger) per
+    #                       evdev SYN_REPORT, i.e. per controller report;
+    #   coalesce='window' - at most one per `window` seconds;
+    #   coalesce=None     - one event per axis update.
+    # `max_rate` additionally caps those events per second. A snapshot held back by the cap or the
+    # window is emitted once they allow, even if the sticks have stopped moving. Buttons and the
+    # leftpad are never delayed.
+    def __init__(self, device_path, coalesce='report', window=0.02, max_rate=None):
+        # device_path may also be an opened device: anything with fileno() and read().
+        self.device = InputDevice(device_path) if isinstance(device_path, str) else device_path
         self.callbacks = []
+        self.subscribers = {}
         self.running = False
+        self.thread = None
         self.emergency_tap_time = 0
         self.left_joystick = [self.CENTER, self.CENTER]
         self.right_joystick = [self.CENTER, self.CENTER]
+        if coalesce not in ('report', 'window', None):
+            raise ValueError("coalesce must be 'report', 'window' or None")
+        self.coalesce = coalesce
+        self.window = window
+        self.max_rate = max_rate
+        self.pending_joystick = False
+        self.pending_triggers = {}
+        self.pending_since = 0.0
+        self.synced = False
+        self.last_emit = float('-inf')
+        # Event time (evdev timestamp) of the newest axis update in the state.
+        self.joystick_time = 0.0
+        self.axis_updates = 0
+        self.axis_emits = 0
+        # Taps see every batch of raw events before decoding: tap.write(events). See controllerLog.
+        self.taps = []
 
     def start(self):
         self.running = True
@@ -68,20 +97,40 @@ class DualShockController:
 
     def stop(self):
         self.running = False
-        if self.thread.is_alive():
+        if self.thread and self.thread.is_alive():
             self.thread.join()
 
     def _run(self):
         while self.running:
-            r, w, x = select([self.device], [], [])
-            for event in self.device.read():
-                if event.type == ecodes.EV_KEY:
-                    self._handle_key_event(event)
-                elif event.type == ecodes.EV_ABS:
-                    self._handle_abs_event(event)
+            # The timeout lets stop() through, and sends snapshots held back by max_rate or the window.
+            due = self.due()
+            timeout = 0.1 if due is None else min(max(due - time.monotonic(), 0.0), 0.1)
+            r, w, x = select([self.device], [], [], timeout)
+            if r:
+                # evdev's read() is a generator; taps and the decoder share one list of the batch.
+                try:
+                    events = list(self.device.read())
+                except BlockingIOError:
+                    events = []
+                if events:
+                    self.handle_events(events)
+            self.flush(time.monotonic())
+
+    def handle_events(self, events):
+        # `events` is a list (taps see it before the decoder).
+        for tap in self.taps:
+            tap.write(events)
+        for event in events:
+            if event.type == ecodes.EV_KEY:
+                self._handle_key_event(event)
+            elif event.type == ecodes.EV_ABS:
+                self._handle_abs_event(event)
+            elif event.type == ecodes.EV_SYN and event.code == ecodes.SYN_REPORT:
+                self.synced = True
+                self.flush()
 
     def _handle_key_event(self, event):
-        if event.code in self.button_presses:
+        if event.code in self.button_presses and event.value in self.button_values:
             button = self.button_presses[event.code]
             direction = self.button_values[event.value]
             self._emit_event('button', button, direction)
@@ -96,13 +145,64 @@ class DualShockController:
                 self._update_joystick_position(event)
                 if value > (self.CENTER - self.BLIND) and value < (self.CENTER + self.BLIND):
                     return
-                self._emit_event('joystick', self.left_joystick, self.right_joystick)
+                self._axis_update(event)
+                self.pending_joystick = True
+                if self.coalesce is None:
+                    self.flush()
             elif event.code in [3, 4]:
-                self._emit_event('trigger', action, value)
+                self._axis_update(event)
+                self.pending_triggers[action] = value
+                if self.coalesce is None:
+                    self.flush()
             elif event.code in [16, 17]:
                 action = self._decode_leftpad(event)
                 self._emit_event('leftpad', action)
 
+    def _axis_update(self, event):
+        if self.coalesce == 'window' and not (self.pending_joystick or self.pending_triggers):
+            self.pending_since = time.monotonic()
+        self.synced = False
+        self.axis_updates += 1
+        self.joystick_time = event.timestamp()
+
+    # due() and flush() are for code that reads the device itself and feeds handle_events(), such
+    # as controllerAsync.ControllerManager or controllerLog.ControllerReplayer: call flush(now) after
+    # each batch and again at due() (monotonic time), so snapshots held back by max_rate or the
+    # window go out even when no more input arrives.
+    def due(self):
+        # When pending axis state may be emitted, or None if there is none (or its report is incomplete).
+        if not (self.pending_joystick or self.pending_triggers):
+            return None
+        if self.coalesce == 'report' and not self.synced:
+            return None
+        due = self.pending_since + self.window if self.coalesce == 'window' else 0.0
+        if self.max_rate:
+            due = max(due, self.last_emit + 1.0 / self.max_rate)
+        return due
+
+    def flush(self, now=None):
+        # Emits the pending axis state if it is due; True if it did.
+        if not (self.pending_joystick or self.pending_triggers):
+            return None
+        if self.coalesce == 'report' and not self.synced:
+            return None
+        # The clock is only read when a window or rate cap needs it.
+        if self.max_rate or self.coalesce == 'window':
+            now = time.monotonic() if now is None else now
+            if now < self.due():
+                return None
+            self.last_emit = now
+        self.axis_emits += 1
+        if self.pending_joystick:
+            self.pending_joystick = False
+            self._emit_event('joystick', tuple(self.left_joystick), tuple(self.right_joystick))
+        if self.pending_triggers:
+            triggers = self.pending_triggers
+            for action, value in triggers.items():
+                self._emit_event('trigger', action, value)
+            triggers.clear()
+        return True
+
     def _is_emergency(self, event, direction):
         if event.code == 317 and direction == 'down':
             previous_tap = self.emergency_tap_time
@@ -129,12 +229,30 @@ class DualShockController:
             action = self.leftpad_up_down_values[event.value]
         return f'leftpad: {action}'
 
+    def subscribe(self, event_type, handler, name=None):
+        # handler(*args) for every event of `event_type` ('button', 'emergency', 'joystick', 'trigger'
+        # or 'leftpad'), with the arguments register_callback() callbacks get after the type, or
+        # only for one button / trigger when `name` is given ('R2', 'R2 analog').
+        if event_type not in self.event_types:
+            raise ValueError(f"unknown event type {event_type!r}")
+        self.subscribers.setdefault(event_type if name is None else (event_type, name), []).append(handler)
+
+    def unsubscribe(self, event_type, handler, name=None):
+        self.subscribers.get(event_type if name is None else (event_type, name), []).remove(handler)
+
     def register_callback(self, callback):
+        # callback(event_type, *args) for every event.
         self.callbacks.append(callback)
 
     def _emit_event(self, event_type, *args):
         for callback in self.callbacks:
             callback(event_type, *args)
+        subscribers = self.subscribers
+        if subscribers:
+            for handler in subscribers.get(event_type, ()):
+                handler(*args)
+            for handler in subscribers.get((event_type, args[0]), ()):
+                handler(*args)
 
 if __name__ == '__main__':
     def print_event(event_type, *args):
@@ -0,0 +1,54 @@
+import time
+import cv2
+import numpy as np
+
+
+class SyntheticCapture:
+    # Stands in for cv2.VideoCapture on a CSI pipeline: frames arrive at `fps`, a reader that falls
+    # behind gets the newest frame (like appsink drop=True) and `frames` limits the stream length.
+    # `open_delay` is how long opening takes, like building the nvarguscamerasrc pipeline.
+    def __init__(self, width=1280, height=720, fps=60, frames=None, open_delay=0.0):
+        time.sleep(open_delay)
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frames = frames
+        self.index = -1
+        self.dropped = 0
+        self.opened = True
+        self.t0 = None
+        ramp = np.linspace(0, 255, width, dtype=np.uint8)
+        self.background = np.dstack([np.broadcast_to(ramp, (height, width))] * 3).copy()
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self, image=None):
+        if not self.opened or (self.frames is not None and self.index + 1 >= self.frames):
+            return False, None
+        now = time.monotonic()
+        if self.t0 is None:
+            self.t0 = now
+        index = self.index + 1
+        due = self.t0 + index / self.fps
+        if now < due:
+            time.sleep(due - now)
+        else:
+            index = max(index, int((now - self.t0) * self.fps))
+        if self.frames is not None:
+            index = min(index, self.frames - 1)
+        self.dropped += index - self.index - 1
+        self.index = index
+        if image is None or image.shape != self.background.shape:
+            image = np.empty_like(self.background)
+        self.draw(image, index)
+        return True, image
+
+    def draw(self, image, index):
+        np.copyto(image, self.background)
+        x = index * 8 % self.width
+        image[:, x:x + 16] = (0, 0, 255)
+        cv2.putText(image, str(index), (20, 60), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+
+    def release(self):
+        self.opened = False
@@ -0,0 +1,135 @@
+import os
+import errno
+import math
+import time
+import threading
+from collections import deque
+from evdev import InputEvent, ecodes
+
+
+class FakeInputDevice:
+    # Stands in for evdev.InputDevice: events written here come out of read(), and fileno() is the
+    # read end of a pipe that becomes readable whenever events are queued, so select() and
+    # loop.add_reader() work on it. unplug() makes read() fail the way a removed evdev device does.
+    GAMEPAD = {ecodes.EV_KEY: list(range(304, 318)), ecodes.EV_ABS: [0, 1, 2, 3, 4, 5, 16, 17]}
+    MOTION_SENSOR = {ecodes.EV_ABS: [0, 1, 2, 3, 4, 5]}
+
+    def __init__(self, name="Fake DualSense", path="/dev/input/fake0", capabilities=GAMEPAD):
+        self.name = name
+        self.path = path
+        self.caps = capabilities
+        self.unplugged = False
+        self.closed = False
+        self.events = deque()
+        self.read_fd, self.write_fd = os.pipe()
+        os.set_blocking(self.read_fd, False)
+        os.set_blocking(self.write_fd, False)
+
+    def fileno(self):
+        return self.read_fd
+
+    def capabilities(self, absinfo=True):
+        return {etype: list(codes) for etype, codes in self.caps.items()}
+
+    def unplug(self):
+        self.unplugged = True
+        self._ring()
+
+    def write(self, etype, code, value, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        self.events.append(InputEvent(int(timestamp), int(timestamp % 1 * 1e6), etype, code, value))
+
+    def syn(self, timestamp=None):
+        self.write(ecodes.EV_SYN, ecodes.SYN_REPORT, 0, timestamp)
+        self._ring()
+
+    def _ring(self):
+        if self.closed:
+            return
+        try:
+            os.write(self.write_fd, b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def read(self):
+        # A generator, like evdev's: nothing is read, and no error raised, until it is iterated.
+        if self.unplugged:
+            raise OSError(errno.ENODEV, "No such device")
+        try:
+            os.read(self.read_fd, 4096)
+        except BlockingIOError:
+            pass
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        if not events:
+            raise BlockingIOError(11, "Resource temporarily unavailable")
+        yield from events
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            os.close(self.read_fd)
+            os.close(self.write_fd)
+
+
+class FakeDeviceSet:
+    # Stands in for /dev/input: list_devices() and open() for ControllerManager, plug() and
+    # unplug() for hot-plug tests. Every open() returns a fresh device, as reopening a node does.
+    def __init__(self):
+        self.nodes = {}
+        self.opened = {}
+
+    def plug(self, path, name="Fake DualSense", capabilities=FakeInputDevice.GAMEPAD):
+        self.nodes[path] = (name, capabilities)
+
+    def unplug(self, path):
+        self.nodes.pop(path, None)
+        device = self.opened.pop(path, None)
+        if device:
+            device.unplug()
+
+    def list_devices(self):
+        return list(self.nodes)
+
+    def open(self, path):
+        if path not in self.nodes:
+            raise OSError(errno.ENOENT, "No such file or directory", path)
+        name, capabilities = self.nodes[path]
+        device = self.opened[path] = FakeInputDevice(name, path, capabilities)
+        return device
+
+
+def stick_reports(rate=250, seconds=1.0):
+    # Both sticks circling once a second and R2 pulled in and out: every report moves four stick
+    # axes and the R2 analog, like a DualSense being played with.
+    for n in range(int(rate * seconds)):
+        phase = 2 * math.pi * n / rate
+        x, y = int(127 + 120 * math.cos(phase)), int(127 + 120 * math.sin(phase))
+        yield [(ecodes.EV_ABS, 0, x), (ecodes.EV_ABS, 1, y), (ecodes.EV_ABS, 2, 254 - x), (ecodes.EV_ABS, 5, 254 - y),
+               (ecodes.EV_ABS, 4, int(127 + 127 * math.sin(phase / 2)))]
+
+
+def session_reports(rate=250, seconds=1.0):
+    # stick_reports() with R2 and triangle pressed and released now and then, like a driving session.
+    for n, report in enumerate(stick_reports(rate, seconds)):
+        if n % 50 == 0:
+            report.append((ecodes.EV_KEY, 311 if n % 100 else 307, n // 100 % 2))
+        yield report
+
+
+def play(device, reports, rate=250):
+    # Writes `reports` to `device` in real time, `rate` reports per second, on a background thread.
+    def run():
+        start = time.monotonic()
+        for n, report in enumerate(reports):
+            delay = start + n / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            now = time.time()
+            for etype, code, value in report:
+                device.write(etype, code, value, now)
+            device.syn(now)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
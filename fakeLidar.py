@@ -0,0 +1,91 @@
+import time
+import random
+import select
+from lidarPty import PtyTFMiniPlus, buildFrame, FRAME_SIZE
+
+
+def goldenCapture(frames, seed=0, noise=0.02):
+    # Deterministic byte stream with junk, torn frames and bad checksums mixed in.
+    rng = random.Random(seed)
+    data = bytearray()
+    for n in range(frames):
+        frame = bytearray(buildFrame(rng.randrange(0, 1200), rng.randrange(0, 65536), rng.randrange(-20, 80)))
+        roll = rng.random()
+        if roll < noise:
+            data += bytes(rng.randrange(256) for _ in range(rng.randrange(1, 12)))
+        elif roll < 2 * noise:
+            frame[rng.randrange(2, FRAME_SIZE)] ^= 1 << rng.randrange(8)
+        elif roll < 3 * noise:
+            frame = frame[:rng.randrange(1, FRAME_SIZE)]
+        elif roll < 3.5 * noise:
+            data += b'\x59\x59'
+        data += frame
+    return bytes(data)
+
+
+class CaptureStream:
+    # Serial-like stream over a recorded capture that hands out at most `step` bytes per poll.
+    def __init__(self, data, step=FRAME_SIZE):
+        self.data = data
+        self.step = step
+        self.pos = 0
+        self.timeout = None
+
+    @property
+    def in_waiting(self):
+        return min(self.step, len(self.data) - self.pos)
+
+    def inWaiting(self):
+        return self.in_waiting
+
+    def read(self, size=1):
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += len(chunk)
+        return chunk
+
+    def readinto(self, b):
+        chunk = self.read(len(b))
+        b[:len(chunk)] = chunk
+        return len(chunk)
+
+    def exhausted(self):
+        return self.pos >= len(self.data)
+
+
+class FakeTFMiniPlus(PtyTFMiniPlus):
+    # Synthetic frames: a free-running stream at `rate`, or one per trigger when rate is 0.
+    def _run(self):
+        t0 = time.perf_counter()
+        sent = 0
+        rate = self.rate
+        budget, last = 0.0, t0
+        while self.running:
+            select.select([self.master], [], [], 0.001)
+            self._receive()
+            if self.rate != rate:
+                t0, sent, rate = time.perf_counter(), 0, self.rate
+            now = time.perf_counter()
+            due = max(int((now - t0) * rate) - sent, 0) if rate else 0
+            sent += due
+            streamed = due if self.output else 0
+            if self.baud:
+                # 10 bits per byte on the wire, at most 10 ms of backlog.
+                budget = min(budget + (now - last) * self.baud / 10, self.baud / 1000)
+                carried = min(streamed, int(budget // FRAME_SIZE))
+                budget -= carried * FRAME_SIZE
+                self.framesDropped += streamed - carried
+                streamed = carried
+            last = now
+            data = bytearray(b''.join(self.frame(self.framesSent + i) for i in range(streamed)))
+            # Replies go out on a frame boundary, as the sensor does.
+            data += self.replies
+            self.replies.clear()
+            if data and not self.linked():
+                data = bytes(b ^ 0xA5 for b in data)
+            if data:
+                frames = min(self.write(data) // FRAME_SIZE, streamed)
+                self.framesSent += frames
+                self.framesDropped += streamed - frames
+            if self.pendingBaud:
+                # The echo went out at the old rate; everything after it uses the new one.
+                self.baud, self.pendingBaud = self.pendingBaud, None
@@ -0,0 +1,77 @@
+import time
+import threading
+from servoScheduler import LED0_ON_L, FULL_SCALE
+
+
+class FakePCA9685:
+    # Stands in for a PCA9685 behind adafruit_bus_device's I2CDevice: `with device:` holds the bus
+    # and write(buffer) stores buffer[1:] from register buffer[0] on, auto-incrementing, into a
+    # register file. Each write takes as long as it would on a `bus_speed` Hz bus (9 bits per byte,
+    # address byte included), holding the bus, and the OFF count every channel write leaves is
+    # logged with its time.
+    def __init__(self, bus_speed=100000, frequency=50):
+        self.bus_speed = bus_speed
+        self.frequency = frequency
+        self.registers = bytearray(256)
+        self.bus = threading.Lock()
+        self.transactions = 0
+        self.bytes = 0
+        self.busy = 0.0
+        self.history = {}
+        self.fail = 0
+
+    def __enter__(self):
+        self.bus.acquire()
+        return self
+
+    def __exit__(self, *exception):
+        self.bus.release()
+
+    def write(self, buffer, start=0, end=None):
+        data = bytes(buffer[start:end])
+        if self.fail:
+            self.fail -= 1
+            raise OSError(121, "Remote I/O error")
+        duration = (len(data) + 1) * 9 / self.bus_speed
+        time.sleep(duration)
+        register = data[0]
+        self.registers[register:register + len(data) - 1] = data[1:]
+        now = time.monotonic()
+        for offset in range(len(data) - 1):
+            if (register + offset - LED0_ON_L) % 4 == 3 and register + offset >= LED0_ON_L:
+                channel = (register + offset - LED0_ON_L) // 4
+                self.history.setdefault(channel, []).append((now, self.off(channel)))
+        self.transactions += 1
+        self.bytes += len(data) + 1
+        self.busy += duration
+
+    def on(self, channel):
+        base = LED0_ON_L + 4 * channel
+        return self.registers[base] | self.registers[base + 1] << 8
+
+    def off(self, channel):
+        base = LED0_ON_L + 4 * channel
+        return self.registers[base + 2] | self.registers[base + 3] << 8
+
+    def pulse(self, channel):
+        # Pulse width in microseconds, or 0 when the output is off.
+        if self.off(channel) & FULL_SCALE:
+            return 0.0
+        if self.on(channel) & FULL_SCALE:
+            return 1e6 / self.frequency
+        return (self.off(channel) - self.on(channel)) / FULL_SCALE * 1e6 / self.frequency
+
+
+class DirectServos:
+    # What PanTilt does without a scheduler: every angle is written at once, one I2C write per
+    # channel, whether or not it changed.
+    def __init__(self, device, registers):
+        # registers: angle -> (ON, OFF), e.g. ServoScheduler.registers.
+        self.device = device
+        self.registers = registers
+
+    def set(self, targets):
+        for channel, angle in targets.items():
+            on, off = self.registers(angle)
+            with self.device:
+                self.device.write(bytes((LED0_ON_L + 4 * channel, on & 0xFF, on >> 8, off & 0xFF, off >> 8)))
@@ -0,0 +1,197 @@
+import os
+import socket
+import struct
+import select
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+
+# Shared memory layout: a 64-byte header, then `slots` slots. Each slot is a 64-byte header
+# (sequence, frame index, timestamp) followed by the frame, padded to a multiple of 64 bytes.
+#
+# One writer, any number of readers, no locks. The writer makes a slot's sequence odd, writes the
+# frame, then makes it even again and bumps the published count. A reader takes a view of the
+# newest slot with an even sequence and, once done with it, checks that the sequence is unchanged;
+# if it moved, the writer lapped the reader and the result is discarded.
+#
+# Readers are woken by a datagram "doorbell" per frame. The writer never blocks on it: a reader
+# whose socket is full simply finds several new frames at once and takes the newest.
+MAGIC = b'FRMBUS01'
+HEADER = struct.Struct('<8s4I')
+HEADER_SIZE = 64
+COUNT_OFFSET = 32
+SLOT_HEADER_SIZE = 64
+DOORBELL = struct.Struct('<Q')
+
+BusFrame = namedtuple('BusFrame', ['index', 'timestamp', 'image', 'slot', 'seq'])
+
+
+def _address(name, suffix=''):
+    # Abstract unix socket names: nothing to clean up on disk.
+    return f'\0frameBus-{name}{suffix}'
+
+
+def _layout(shape):
+    height, width = shape[:2]
+    channels = shape[2] if len(shape) > 2 else 1
+    frame_bytes = height * width * channels
+    slot_size = -(-(SLOT_HEADER_SIZE + frame_bytes) // 64) * 64
+    return (height, width, channels), slot_size
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # Before Python 3.13 attaching registers the segment with the resource tracker, which unlinks
+    # it when the reader exits; only the writer owns it.
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class _Bus:
+    def _map(self, slots, shape, slot_size):
+        buf = self.shm.buf
+        self.slots = slots
+        self.shape = shape if shape[2] > 1 else shape[:2]
+        self.count = np.ndarray((1,), '<u8', buf, COUNT_OFFSET)
+        self.seqs, self.indices, self.stamps, self.images = [], [], [], []
+        for slot in range(slots):
+            offset = HEADER_SIZE + slot * slot_size
+            self.seqs.append(np.ndarray((1,), '<u8', buf, offset))
+            self.indices.append(np.ndarray((1,), '<u8', buf, offset + 8))
+            self.stamps.append(np.ndarray((1,), '<f8', buf, offset + 16))
+            self.images.append(np.ndarray(self.shape, np.uint8, buf, offset + SLOT_HEADER_SIZE))
+
+    def _unmap(self):
+        # Views into the segment have to go before it can be closed.
+        self.count = None
+        self.seqs = self.indices = self.stamps = self.images = []
+
+
+class FrameBusWriter(_Bus):
+    def __init__(self, name, shape, slots=4):
+        self.name = name
+        shape, slot_size = _layout(shape)
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + slots * slot_size)
+        HEADER.pack_into(self.shm.buf, 0, MAGIC, slots, *shape)
+        self._map(slots, shape, slot_size)
+        self.published = 0
+        self.subscribers = set()
+        self.doorbell = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.doorbell.bind(_address(name))
+        self.doorbell.setblocking(False)
+
+    def publish(self, image, timestamp=None):
+        if image.shape != self.shape:
+            raise ValueError(f"frame shape {image.shape} does not match bus shape {self.shape}")
+        n = self.published
+        slot = n % self.slots
+        seq = self.seqs[slot]
+        seq[0] += 1
+        np.copyto(self.images[slot], image)
+        self.indices[slot][0] = n
+        self.stamps[slot][0] = time.monotonic() if timestamp is None else timestamp
+        seq[0] += 1
+        self.published = self.count[0] = n + 1
+        self._ring(n)
+        return n
+
+    def _ring(self, n):
+        while True:
+            try:
+                message, address = self.doorbell.recvfrom(16)
+            except BlockingIOError:
+                break
+            if message == b'subscribe':
+                self.subscribers.add(address)
+            elif message == b'unsubscribe':
+                self.subscribers.discard(address)
+        message = DOORBELL.pack(n)
+        for address in list(self.subscribers):
+            try:
+                self.doorbell.sendto(message, address)
+            except BlockingIOError:
+                pass
+            except (ConnectionRefusedError, FileNotFoundError):
+                self.subscribers.discard(address)
+
+    def close(self):
+        self.doorbell.close()
+        self._unmap()
+        self.shm.close()
+        self.shm.unlink()
+
+
+class FrameBusReader(_Bus):
+    def __init__(self, name):
+        self.name = name
+        self.shm = _attach(name)
+        magic, slots, height, width, channels = HEADER.unpack_from(self.shm.buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{name} is not a frame bus")
+        shape, slot_size = _layout((height, width, channels))
+        self._map(slots, shape, slot_size)
+        self.last = -1
+        self.missed = 0
+        self.doorbell = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.doorbell.bind(_address(name, f'-{os.getpid()}-{id(self):x}'))
+        self.doorbell.setblocking(False)
+        self._subscribe(b'subscribe')
+
+    def _subscribe(self, message):
+        try:
+            self.doorbell.sendto(message, _address(self.name))
+        except (BlockingIOError, ConnectionRefusedError, FileNotFoundError):
+            pass
+
+    def latest(self):
+        # Newest completely written frame, as a view into shared memory.
+        count = int(self.count[0])
+        for n in range(count - 1, max(count - self.slots, 0) - 1, -1):
+            slot = n % self.slots
+            seq = int(self.seqs[slot][0])
+            if seq & 1 or int(self.indices[slot][0]) != n:
+                continue
+            frame = BusFrame(n, float(self.stamps[slot][0]), self.images[slot], slot, seq)
+            if self.valid(frame):
+                return frame
+        return None
+
+    def valid(self, frame):
+        # False once the writer has started reusing the frame's slot.
+        return int(self.seqs[frame.slot][0]) == frame.seq
+
+    def wait(self, timeout=None):
+        # Next frame newer than the last one returned, or None on timeout.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            frame = self.latest()
+            if frame is not None and frame.index > self.last:
+                if self.last >= 0:
+                    self.missed += frame.index - self.last - 1
+                self.last = frame.index
+                return frame
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                # The writer may have restarted and forgotten us.
+                self._subscribe(b'subscribe')
+                return None
+            if select.select([self.doorbell], [], [], remaining)[0]:
+                while True:
+                    try:
+                        self.doorbell.recv(16)
+                    except BlockingIOError:
+                        break
+
+    def close(self):
+        self._subscribe(b'unsubscribe')
+        self.doorbell.close()
+        self._unmap()
+        self.shm.close()
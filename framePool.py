@@ -0,0 +1,75 @@
+import threading
+from collections import deque
+
+
+class Frame:
+    # A pooled image buffer with a reference count. Whoever keeps a frame past the call that handed
+    # it over calls retain(); every holder calls release() once, and the last release recycles it.
+    # `index` is the capture sequence number and `captured` the time.monotonic() capture timestamp.
+    __slots__ = ('pool', 'buffer', 'image', 'refs', 'lock', 'index', 'captured')
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.buffer = None
+        self.image = None
+        self.refs = 0
+        self.lock = threading.Lock()
+        self.index = -1
+        self.captured = 0.0
+
+    def retain(self):
+        with self.lock:
+            self.refs += 1
+        return self
+
+    def release(self):
+        with self.lock:
+            self.refs -= 1
+            if self.refs:
+                return
+        self.image = None
+        self.pool.recycle(self)
+
+    def read(self, capture):
+        # Reads into this frame's buffer. A backend that cannot (first read, size change) returns
+        # a fresh array, which the frame adopts as its buffer from then on.
+        ret_val, image = capture.read(image=self.buffer)
+        if ret_val and image is not self.buffer:
+            self.buffer = image
+            self.pool.adopt(image)
+        self.image = image
+        return ret_val
+
+
+class FramePool:
+    def __init__(self):
+        self.free = deque()
+        self.shape = None
+        self.dtype = None
+        self.frames = 0
+        self.buffers = 0
+
+    def acquire(self):
+        try:
+            frame = self.free.pop()
+        except IndexError:
+            frame = Frame(self)
+            self.frames += 1
+        frame.refs = 1
+        return frame
+
+    def adopt(self, buffer):
+        self.buffers += 1
+        if buffer.shape != self.shape or buffer.dtype != self.dtype:
+            # New frame geometry: idle buffers of the old size are dropped, busy ones on recycle.
+            self.shape, self.dtype = buffer.shape, buffer.dtype
+            for frame in list(self.free):
+                frame.buffer = None
+
+    def recycle(self, frame):
+        if frame.buffer is not None and (frame.buffer.shape != self.shape or frame.buffer.dtype != self.dtype):
+            frame.buffer = None
+        self.free.append(frame)
+
+    def stats(self):
+        return {'frames': self.frames, 'buffers': self.buffers, 'free': len(self.free)}
@@ -0,0 +1,71 @@
+import threading
+import cv2
+
+
+class View:
+    # A named derivative of the camera frame: the region `roi` = (x, y, width, height) of the full
+    # frame (all of it by default), resized to `size` = (width, height) (left as is by default).
+    def __init__(self, name, size=None, roi=None, interpolation=cv2.INTER_AREA):
+        if size is None and roi is None:
+            raise ValueError(f"view {name}: needs a size, a roi or both")
+        self.name = name
+        self.size = tuple(size) if size else None
+        self.roi = tuple(roi) if roi else None
+        self.interpolation = interpolation
+
+    def output_size(self, width, height):
+        if self.size:
+            return self.size
+        return self.roi[2], self.roi[3]
+
+
+class FramePyramid:
+    # Views of one frame, computed on first use and shared by everyone who asks for the same name.
+    # A full-frame view is resized from the smallest already computed full-frame view that is at
+    # least as large, rather than from the full frame. Safe to use from several threads: each view
+    # is computed once. invalidate() drops everything once the frame changes.
+    def __init__(self, image, views):
+        self.views = views
+        self.image = image
+        self.cache = {}
+        self.locks = {name: threading.Lock() for name in views}
+        self.computed = 0
+        self.hits = 0
+
+    def invalidate(self, image):
+        self.image = image
+        self.cache = {}
+
+    def __getitem__(self, name):
+        cache = self.cache
+        image = cache.get(name)
+        if image is not None:
+            self.hits += 1
+            return image
+        with self.locks[name]:
+            image = cache.get(name)
+            if image is None:
+                image = cache[name] = self._compute(self.views[name], cache)
+                self.computed += 1
+            else:
+                self.hits += 1
+        return image
+
+    def _compute(self, view, cache):
+        image = self.image
+        height, width = image.shape[:2]
+        if view.roi:
+            x, y, roi_width, roi_height = view.roi
+            image = image[y:y + roi_height, x:x + roi_width]
+            if view.size is None or view.size == (roi_width, roi_height):
+                return image
+            return cv2.resize(image, view.size, interpolation=view.interpolation)
+        target_width, target_height = view.size
+        if (target_width, target_height) == (width, height):
+            return image
+        for name, level in sorted(list(cache.items()), key=lambda item: item[1].shape[0] * item[1].shape[1]):
+            if (self.views[name].roi is None and level.shape[1] >= target_width and level.shape[0] >= target_height
+                    and level.shape[:2] != (height, width)):
+                image = level
+                break
+        return cv2.resize(image, (target_width, target_height), interpolation=view.interpolation)
@@ -0,0 +1,210 @@
+import numpy as np
+
+# Bytes per pixel of each appsink format. BGR needs a CPU videoconvert after nvvidconv; the others
+# come straight out of nvvidconv. BGRx arrives as (h, w, 4) and bgr_view() hands NumPy consumers a
+# strided (h, w, 3) view without a copy; NV12 arrives as one (h * 3 / 2, w) plane.
+FORMATS = {'BGR': 3, 'BGRx': 4, 'GRAY8': 1, 'NV12': 1.5}
+
+# nvvidconv flip-method values and the equivalent videoflip methods.
+FLIP_METHODS = ['none', 'counterclockwise', 'rotate-180', 'clockwise',
+                'horizontal-flip', 'upper-right-diagonal', 'vertical-flip', 'upper-left-diagonal']
+
+
+class PipelineError(ValueError):
+    pass
+
+
+class Branch:
+    # One tee branch. An appsink branch delivers frames to OpenCV; any other branch ends in
+    # `tail`, a GStreamer fragment such as an encoder and network sink.
+    def __init__(self, name, format='BGRx', width=None, height=None, crop=None, tail=None, max_buffers=1):
+        self.name = name
+        self.format = format
+        self.width = width
+        self.height = height
+        self.crop = crop
+        self.tail = tail
+        self.max_buffers = max_buffers
+
+    @property
+    def appsink(self):
+        return self.tail is None
+
+
+class GstPipeline:
+    # Builds capture pipelines for CSICamera. source='argus' is the CSI sensor through
+    # nvarguscamerasrc; source='test' is videotestsrc, for running without the sensor.
+    # hardware=True converts, scales and crops in nvvidconv; hardware=False uses the portable
+    # CPU elements, so test pipelines also run off the Jetson.
+    def __init__(self, source='argus', sensor_id=0, width=1280, height=720, framerate=60, flip_method=0,
+                 hardware=True, live=True, pattern='ball'):
+        self.source = source
+        self.sensor_id = sensor_id
+        self.width = width
+        self.height = height
+        self.framerate = framerate
+        self.flip_method = flip_method
+        self.hardware = hardware
+        self.live = live
+        self.pattern = pattern
+        self.branches = []
+
+    def appsink(self, name='opencvsink', format='BGRx', width=None, height=None, crop=None, max_buffers=1):
+        # crop is (x, y, width, height) in sensor pixels, applied before scaling.
+        self.branches.append(Branch(name, format, width, height, crop, max_buffers=max_buffers))
+        return self
+
+    def branch(self, name, tail, format='NV12', width=None, height=None, crop=None):
+        self.branches.append(Branch(name, format, width, height, crop, tail))
+        return self
+
+    def output_size(self, branch):
+        width, height = (branch.crop[2], branch.crop[3]) if branch.crop else (self.width, self.height)
+        if self.flip_method in (1, 3, 5, 7):
+            width, height = height, width
+        return branch.width or width, branch.height or height
+
+    def frame_shape(self, name=None):
+        # Shape of the arrays OpenCV returns from the appsink branch.
+        branch = next(b for b in self.branches if b.appsink and (name is None or b.name == name))
+        width, height = self.output_size(branch)
+        if branch.format == 'NV12':
+            return (height * 3 // 2, width)
+        if branch.format == 'GRAY8':
+            return (height, width)
+        return (height, width, int(FORMATS[branch.format]))
+
+    def validate(self):
+        if self.source not in ('argus', 'test'):
+            raise PipelineError(f"unknown source {self.source!r}")
+        if self.source == 'argus' and not self.hardware:
+            raise PipelineError("nvarguscamerasrc outputs NVMM buffers and needs hardware=True")
+        if self.width <= 0 or self.height <= 0 or self.framerate <= 0:
+            raise PipelineError("width, height and framerate must be positive")
+        if self.flip_method not in range(len(FLIP_METHODS)):
+            raise PipelineError(f"flip_method must be 0..{len(FLIP_METHODS) - 1}")
+        if not self.branches:
+            raise PipelineError("pipeline has no branches")
+        names = [branch.name for branch in self.branches]
+        if len(set(names)) != len(names):
+            raise PipelineError(f"duplicate branch names in {names}")
+        if sum(branch.appsink for branch in self.branches) > 1:
+            raise PipelineError("OpenCV reads a single appsink; give the other branches a tail")
+        for branch in self.branches:
+            if branch.format not in FORMATS:
+                raise PipelineError(f"{branch.name}: format must be one of {list(FORMATS)}")
+            if branch.crop:
+                x, y, width, height = branch.crop
+                if x < 0 or y < 0 or width <= 0 or height <= 0 or x + width > self.width or y + height > self.height:
+                    raise PipelineError(f"{branch.name}: crop {branch.crop} outside {self.width}x{self.height}")
+            width, height = self.output_size(branch)
+            if width <= 0 or height <= 0:
+                raise PipelineError(f"{branch.name}: output size must be positive")
+            if branch.format == 'NV12' and (width % 2 or height % 2):
+                raise PipelineError(f"{branch.name}: NV12 needs an even width and height, not {width}x{height}")
+        self._check_elements()
+
+    def _check_elements(self):
+        # With PyGObject available, also make sure every element is installed.
+        try:
+            import gi
+            gi.require_version('Gst', '1.0')
+            from gi.repository import Gst
+        except (ImportError, ValueError):
+            return
+        Gst.init(None)
+        for description in self.build(validate=False).split('!'):
+            factory = description.split()[0] if description.split() else ''
+            if factory and '/' not in factory and not factory.startswith('t.') and not Gst.ElementFactory.find(factory):
+                raise PipelineError(f"GStreamer element {factory} is not installed")
+
+    def source_description(self):
+        if self.source == 'argus':
+            return ("nvarguscamerasrc sensor-id=%d ! "
+                    "video/x-raw(memory:NVMM), width=(int)%d, height=(int)%d, framerate=(fraction)%d/1, format=(string)NV12"
+                    % (self.sensor_id, self.width, self.height, self.framerate))
+        return ("videotestsrc is-live=%s pattern=%s ! "
+                "video/x-raw, width=(int)%d, height=(int)%d, framerate=(fraction)%d/1, format=(string)NV12"
+                % (str(self.live).lower(), self.pattern, self.width, self.height, self.framerate))
+
+    def convert_description(self, branch):
+        width, height = self.output_size(branch)
+        nvvidconv_format = 'BGRx' if branch.format == 'BGR' else branch.format
+        if self.hardware:
+            convert = "nvvidconv flip-method=%d" % self.flip_method
+            if branch.crop:
+                x, y, crop_width, crop_height = branch.crop
+                convert += " left=%d top=%d right=%d bottom=%d" % (x, y, x + crop_width, y + crop_height)
+            memory = "(memory:NVMM)" if not branch.appsink and branch.format == 'NV12' else ""
+            convert += " ! video/x-raw%s, width=(int)%d, height=(int)%d, format=(string)%s" % (
+                memory, width, height, nvvidconv_format)
+        else:
+            # Crop before flipping, as nvvidconv does: the crop is in sensor pixels either way.
+            convert = ""
+            if branch.crop:
+                x, y, crop_width, crop_height = branch.crop
+                convert = "videocrop left=%d top=%d right=%d bottom=%d" % (
+                    x, y, self.width - x - crop_width, self.height - y - crop_height)
+            if self.flip_method:
+                flip = "videoflip method=%s" % FLIP_METHODS[self.flip_method]
+                convert = f"{convert} ! {flip}" if convert else flip
+            scale = "videoscale ! videoconvert ! video/x-raw, width=(int)%d, height=(int)%d, format=(string)%s" % (
+                width, height, nvvidconv_format)
+            convert = f"{convert} ! {scale}" if convert else scale
+        if branch.format == 'BGR':
+            convert += " ! videoconvert ! video/x-raw, format=(string)BGR"
+        return convert
+
+    def sink_description(self, branch):
+        if branch.appsink:
+            return "appsink name=%s drop=true max-buffers=%d sync=false" % (branch.name, branch.max_buffers)
+        return branch.tail
+
+    def build(self, validate=True):
+        if validate:
+            self.validate()
+        source = self.source_description()
+        branches = ["%s ! %s" % (self.convert_description(branch), self.sink_description(branch))
+                    for branch in self.branches]
+        if len(branches) == 1:
+            return "%s ! %s" % (source, branches[0])
+        # Each tee branch gets a leaky queue, so a slow branch drops buffers instead of stalling the others.
+        return "%s ! tee name=t %s" % (source, " ".join(
+            "t. ! queue leaky=downstream max-size-buffers=2 ! %s" % branch for branch in branches))
+
+
+def bgr_view(image):
+    # BGRx (h, w, 4) -> (h, w, 3) view sharing the buffer; other layouts pass through.
+    if image.ndim == 3 and image.shape[2] == 4:
+        return image[:, :, :3]
+    return image
+
+
+def nv12_planes(image):
+    # One (h * 3 / 2, w) NV12 buffer -> Y plane (h, w) and interleaved UV plane (h / 2, w / 2, 2), both views.
+    height = image.shape[0] * 2 // 3
+    return image[:height], image[height:].reshape(height // 2, -1, 2)
+
+
+def legacy_pipeline(sensor_id=0, capture_width=1640, capture_height=1232, display_width=1640, display_height=1232,
+                    framerate=30, flip_method=0):
+    # The pipeline CSICamera has always used: BGRx from nvvidconv, then BGR from a CPU videoconvert.
+    return (GstPipeline('argus', sensor_id, capture_width, capture_height, framerate, flip_method)
+            .appsink(format='BGR', width=display_width, height=display_height))
+
+
+if __name__ == "__main__":
+    for pipeline in (
+        legacy_pipeline(flip_method=6),
+        GstPipeline(flip_method=6).appsink(format='BGRx'),
+        GstPipeline().appsink(format='GRAY8', width=640, height=360),
+        GstPipeline(width=1640, height=1232).appsink(format='NV12', crop=(180, 136, 1280, 960), width=640, height=480),
+        GstPipeline().appsink(format='BGRx').branch(
+            'rtp', 'nvv4l2h264enc insert-sps-pps=true ! h264parse ! rtph264pay pt=96 ! udpsink host=127.0.0.1 port=5000'),
+        GstPipeline('test', hardware=False, flip_method=2).appsink(format='BGRx', crop=(0, 0, 640, 360)),
+        GstPipeline('test', hardware=False, flip_method=3).appsink(format='BGRx', crop=(320, 180, 960, 540)),
+    ):
+        print(pipeline.build(), pipeline.frame_shape())
+        print()
+    print(np.zeros(GstPipeline().appsink().frame_shape(), np.uint8).strides,
+          bgr_view(np.zeros(GstPipeline().appsink().frame_shape(), np.uint8)).strides)
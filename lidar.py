@@ -1,5 +1,93 @@
 import time
+import struct
+import threading
+from collections import deque
 import serial
+import numpy as np
+from lidarRing import LidarRing, SAMPLE_DTYPE
+
+class FrameParser:
+    HEADER = b'\x59\x59'
+    FRAME_SIZE = 9
+    PAYLOAD = struct.Struct('<HHH')
+
+    def __init__(self, size=4096):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.checksumErrors = 0
+        self.droppedBytes = 0
+
+    def clear(self):
+        self.start = self.end = 0
+
+    def pending(self):
+        return self.end - self.start
+
+    def fill(self, stream, count):
+        size = len(self.buffer)
+        if count > size:
+            # More backlog than we can hold: throw the oldest part away in one read.
+            self.droppedBytes += len(stream.read(count - size))
+            count = size
+        if self.end + count > size:
+            self._compact(count)
+        n = stream.readinto(self.view[self.end:self.end + count])
+        self.end += n or 0
+        return n
+
+    def feed(self, data):
+        count = len(data)
+        if self.end + count > len(self.buffer):
+            self._compact(count)
+        self.buffer[self.end:self.end + count] = data
+        self.end += count
+
+    def _compact(self, need):
+        pending = self.end - self.start
+        room = len(self.buffer) - need
+        if pending > room:
+            self.droppedBytes += pending - room
+            self.start = self.end - room
+            pending = room
+        if pending <= self.start:
+            self.buffer[:pending] = self.view[self.start:self.end]
+        else:
+            self.buffer[:pending] = bytes(self.view[self.start:self.end])
+        self.start, self.end = 0, pending
+
+    def discardStale(self):
+        # Anything older than the last two frames' worth of bytes cannot hold the newest frame.
+        keep = 2 * self.FRAME_SIZE - 1
+        if self.end - self.start > keep:
+            self.droppedBytes += self.end - keep - self.start
+            self.start = self.end - keep
+
+    def nextFrame(self):
+        while True:
+            pos = self.buffer.find(self.HEADER, self.start, self.end)
+            if pos < 0:
+                keep = 1 if self.end > self.start and self.buffer[self.end - 1] == 0x59 else 0
+                self.droppedBytes += self.end - keep - self.start
+                self.start = self.end - keep
+                return -1
+            self.droppedBytes += pos - self.start
+            self.start = pos
+            if pos + self.FRAME_SIZE > self.end:
+                return -1
+            if sum(self.view[pos:pos + self.FRAME_SIZE - 1]) & 0xFF != self.buffer[pos + self.FRAME_SIZE - 1]:
+                self.checksumErrors += 1
+                self.droppedBytes += 1
+                self.start = pos + 1
+                continue
+            self.start = pos + self.FRAME_SIZE
+            return pos
+
+    def decode(self, pos):
+        dist, flux, temp = self.PAYLOAD.unpack_from(self.buffer, pos + 2)
+        return dist, flux, (temp >> 3) - 256
+
 
 class TFMiniPlus:
     TFMP_FRAME_SIZE = 9
@@ -66,6 +154,13 @@ class TFMiniPlus:
     FRAME_500 = 0x01F4
     FRAME_1000 = 0x03E8
 
+    BAUD_RATES = (BAUD_9600, BAUD_14400, BAUD_19200, BAUD_56000, BAUD_115200, BAUD_460800, BAUD_921600)
+    FRAME_RATES = (FRAME_1, FRAME_2, FRAME_5, FRAME_10, FRAME_20, FRAME_25, FRAME_50,
+                   FRAME_100, FRAME_125, FRAME_200, FRAME_250, FRAME_500, FRAME_1000)
+    # Factory link, and the headroom a link needs over frames alone (10 bits per byte on the wire).
+    DEFAULT_LINK = (FRAME_100, BAUD_115200)
+    LINK_MARGIN = 1.25
+
     def __init__(self):
         self.status = 0
         self.dist = 0
@@ -75,9 +170,30 @@ class TFMiniPlus:
         self.pStream = None
         self.frame = bytearray(self.TFMP_FRAME_SIZE)
         self.reply = bytearray(self.TFMP_REPLY_SIZE)
+        self.parser = FrameParser()
+        self.ring = None
+        self.acquiring = False
+        self.acquisitionThread = None
+        self.recorder = None
+        self.frameRate = self.FRAME_100
+        self.fallbackLink = None
+        self.stallTimeout = None
+        self.freeRate = self.FRAME_100
+        self.triggerCommand = None
+        self.triggerTimeout = 0.1
+        self.triggerLock = threading.Lock()
+        self.pendingTriggers = deque(maxlen=64)
+        self.triggerRoundTrip = 0.0
+        self.triggerLatency = deque(maxlen=1024)
+        self.triggersSent = 0
+        self.triggersAnswered = 0
+        self.triggersLost = 0
+        self.callbacks = []
+        self.acquisitionTimeout = 0.1
 
-    def begin(self, port, rate):
-        self.pStream = serial.Serial(port, rate)
+    def begin(self, port, rate, timeout=0.1):
+        # Reads block in the driver for up to `timeout` seconds instead of polling inWaiting().
+        self.pStream = serial.Serial(port, rate, timeout=timeout)
         time.sleep(0.2)
         if self.pStream.inWaiting() > 0:
             self.status = self.TFMP_READY
@@ -89,34 +205,103 @@ class TFMiniPlus:
     def getData(self):
         self.status, self.dist, self.flux, self.temp = 0, 0, 0, 0
         serialTimeout = time.time() + 1
-        while self.pStream.inWaiting() > self.TFMP_FRAME_SIZE:
-            self.pStream.read()
-        self.frame = bytearray(self.TFMP_FRAME_SIZE)
-        while self.frame[0] != 0x59 or self.frame[1] != 0x59:
-            if self.pStream.inWaiting():
-                self.frame.append(self.pStream.read()[0])
-                self.frame = self.frame[1:]
+        parser = self.parser
+        while True:
+            if parser.fill(self.pStream, max(1, self.pStream.in_waiting)):
+                parser.discardStale()
+                checksumErrors = parser.checksumErrors
+                pos = -1
+                while (nextPos := parser.nextFrame()) >= 0:
+                    pos = nextPos
+                if pos >= 0:
+                    break
+                if parser.checksumErrors != checksumErrors:
+                    self.status = self.TFMP_CHECKSUM
+                    return False
             if time.time() > serialTimeout:
                 self.status = self.TFMP_HEADER
                 return False
-        chkSum = sum(self.frame[:-1]) & 0xFF
-        if chkSum != self.frame[-1]:
-            self.status = self.TFMP_CHECKSUM
-            return False
-        self.dist = (self.frame[3] << 8) + self.frame[2]
-        self.flux = (self.frame[5] << 8) + self.frame[4]
-        self.temp = (((self.frame[7] << 8) + self.frame[6]) >> 3 )- 256
-        if self.dist == -1:
-            self.status = self.TFMP_WEAK
-        elif self.flux == -1:
-            self.status = self.TFMP_STRONG
-        elif self.dist == -4:
-            self.status = self.TFMP_FLOOD
-        else:
-            self.status = self.TFMP_READY
+        self.frame[:] = parser.view[pos:pos + self.TFMP_FRAME_SIZE]
+        if self.recorder:
+            self.recorder.write(time.monotonic(), self.frame)
+        self.dist, self.flux, self.temp = parser.decode(pos)
+        self.status = self.frameStatus(self.dist, self.flux)
         return self.status == self.TFMP_READY
 
-    def sendCommand(self, cmnd, param):
+    def frameStatus(self, dist, flux):
+        if dist == -1:
+            return self.TFMP_WEAK
+        elif flux == -1:
+            return self.TFMP_STRONG
+        elif dist == -4:
+            return self.TFMP_FLOOD
+        return self.TFMP_READY
+
+    def startAcquisition(self, capacity=4096, timeout=0.1):
+        if self.acquiring:
+            return
+        self.ring = LidarRing(capacity)
+        self.resumeAcquisition(timeout)
+
+    def resumeAcquisition(self, timeout=None):
+        # Restarts the reader after stopAcquisition() into the same ring, so since() and window()
+        # keep their history; timeout=None keeps the one acquisition last ran with.
+        if self.acquiring:
+            return
+        if timeout is not None:
+            self.acquisitionTimeout = timeout
+        self.acquiring = True
+        self.blockingTimeout = self.pStream.timeout
+        self.pStream.timeout = self.acquisitionTimeout
+        self.acquisitionThread = threading.Thread(target=self._acquire, daemon=True)
+        self.acquisitionThread.start()
+
+    def stopAcquisition(self):
+        self.acquiring = False
+        if self.acquisitionThread:
+            self.acquisitionThread.join()
+            self.acquisitionThread = None
+            self.pStream.timeout = self.blockingTimeout
+
+    def _acquire(self):
+        lastFrame = time.monotonic()
+        while self.acquiring:
+            if self.parser.fill(self.pStream, max(1, self.pStream.in_waiting)):
+                now = time.monotonic()
+                if self.decodeAvailable(now):
+                    lastFrame = now
+            if self.pendingTriggers:
+                with self.triggerLock:
+                    self.expireTriggers(time.monotonic())
+            if self.stallTimeout and self.frameRate and time.monotonic() - lastFrame > self.stallTimeout:
+                self.recoverLink()
+                lastFrame = time.monotonic()
+
+    def decodeAvailable(self, now):
+        parser = self.parser
+        frames = 0
+        while (pos := parser.nextFrame()) >= 0:
+            if self.recorder:
+                self.recorder.write(now, parser.view[pos:pos + self.TFMP_FRAME_SIZE])
+            dist, flux, temp = parser.decode(pos)
+            status = self.frameStatus(dist, flux)
+            self.ring.append(now, dist, flux, temp, status)
+            if self.pendingTriggers:
+                self.answerTrigger(now, dist, flux, status)
+            frames += 1
+        return frames
+
+    def latest(self):
+        return self.ring.latest() if self.ring else None
+
+    # Before startAcquisition() there is no ring; like latest(), these then return no samples.
+    def since(self, t):
+        return self.ring.since(t) if self.ring else np.empty(0, dtype=SAMPLE_DTYPE)
+
+    def window(self, n):
+        return self.ring.window(n) if self.ring else np.empty(0, dtype=SAMPLE_DTYPE)
+
+    def buildCommand(self, cmnd, param=0):
         cmndData = bytearray(cmnd.to_bytes(self.TFMP_COMMAND_MAX, byteorder='little'))
         replyLen, cmndLen = cmndData[0], cmndData[1]
         cmndData[0] = 0x5A
@@ -126,32 +311,213 @@ class TFMiniPlus:
             cmndData[3:6] = param.to_bytes(3, byteorder='little')
         cmndData = cmndData[:cmndLen]
         cmndData[-1] = sum(cmndData[:-1]) & 0xFF
+        return cmndData, replyLen
+
+    def checkReply(self, cmnd, reply):
+        if sum(reply[:-1]) & 0xFF != reply[-1]:
+            self.status = self.TFMP_CHECKSUM
+            return False
+        if cmnd == self.GET_FIRMWARE_VERSION:
+            self.version = reply[3:6]
+        elif cmnd in {self.SOFT_RESET, self.HARD_RESET, self.SAVE_SETTINGS} and reply[3] == 1:
+            self.status = self.TFMP_FAIL
+            return False
+        self.status = self.TFMP_READY
+        return True
+
+    def sendCommand(self, cmnd, param):
+        cmndData, replyLen = self.buildCommand(cmnd, param)
         self.pStream.reset_input_buffer()
         self.pStream.reset_output_buffer()
+        self.parser.clear()
         self.pStream.write(cmndData)
         if replyLen == 0:
             return True
         serialTimeout = time.time() + 1
-        self.reply = bytearray(replyLen)
-        while self.reply[0] != 0x5A or self.reply[1] != replyLen:
-            if self.pStream.inWaiting():
-                self.reply.append(self.pStream.read()[0])
-                self.reply = self.reply[1:]
+        header = bytes((0x5A, replyLen, cmndData[2]))
+        received = bytearray()
+        while True:
+            received += self.pStream.read(max(1, self.pStream.in_waiting))
+            pos = received.find(header)
+            if pos >= 0 and len(received) >= pos + replyLen:
+                break
             if time.time() > serialTimeout:
                 self.status = self.TFMP_HEADER
                 return False
-        chkSum = sum(self.reply[:-1]) & 0xFF
-        if chkSum != self.reply[-1]:
-            self.status = self.TFMP_CHECKSUM
+        self.reply = received[pos:pos + replyLen]
+        return self.checkReply(cmnd, self.reply)
+
+    def linkSettings(self, target_hz):
+        # Lowest frame rate at or above the target, and the lowest baud that carries it.
+        frameRate = next((rate for rate in self.FRAME_RATES if rate >= target_hz), self.FRAME_RATES[-1])
+        bitsPerSecond = frameRate * self.TFMP_FRAME_SIZE * 10 * self.LINK_MARGIN
+        baud = next((baud for baud in self.BAUD_RATES if baud >= bitsPerSecond), self.BAUD_RATES[-1])
+        return frameRate, baud
+
+    def setBaudRate(self, baud):
+        # The sensor echoes at the old rate and switches after it; the host follows, then checks
+        # that the sensor answers. If it does not, the host goes back to where the sensor still is.
+        oldBaud = self.pStream.baudrate
+        self.sendCommand(self.SET_BAUD_RATE, baud)
+        self.pStream.baudrate = baud
+        if self.sendCommand(self.GET_FIRMWARE_VERSION, 0):
+            return True
+        self.pStream.baudrate = oldBaud
+        self.sendCommand(self.GET_FIRMWARE_VERSION, 0)
+        return False
+
+    def framesArriving(self, frameRate, window=0.5):
+        # True if at least half the expected frames arrive within the window.
+        window = max(window, 3 / frameRate)
+        self.pStream.reset_input_buffer()
+        self.parser.clear()
+        frames = 0
+        deadline = time.monotonic() + window
+        while time.monotonic() < deadline:
+            if self.parser.fill(self.pStream, max(1, self.pStream.in_waiting)):
+                while self.parser.nextFrame() >= 0:
+                    frames += 1
+        self.parser.clear()
+        return frames >= max(1, frameRate * window / 2)
+
+    def applyLink(self, frameRate, baud, window=0.5):
+        if baud != self.pStream.baudrate and not self.setBaudRate(baud):
             return False
-        if cmnd == self.GET_FIRMWARE_VERSION:
-            self.version = self.reply[3:6]
-        elif cmnd in {self.SOFT_RESET, self.HARD_RESET, self.SAVE_SETTINGS} and self.reply[3] == 1:
+        if not self.sendCommand(self.SET_FRAME_RATE, frameRate):
+            return False
+        self.frameRate = frameRate
+        return self.framesArriving(frameRate, window)
+
+    def configure(self, target_hz, window=0.5):
+        # Moves sensor and host to the lowest baud that carries target_hz, checks that frames flow
+        # and saves the settings. On failure the previous link, then the factory link, is restored.
+        # Once configured, acquisition falls back to the previous link if frames stop arriving.
+        # A running acquisition pauses meanwhile and resumes into the same ring.
+        acquiring = self.acquiring
+        self.stopAcquisition()
+        previous = (self.frameRate, self.pStream.baudrate)
+        frameRate, baud = self.linkSettings(target_hz)
+        configured = self.applyLink(frameRate, baud, window) and self.sendCommand(self.SAVE_SETTINGS, 0)
+        if configured:
+            self.fallbackLink = previous
+            self.stallTimeout = max(1.0, 10 / frameRate)
+        else:
+            for link in (previous, self.DEFAULT_LINK):
+                if self.applyLink(*link, window):
+                    break
             self.status = self.TFMP_FAIL
+        if acquiring:
+            self.resumeAcquisition()
+        return configured
+
+    def recoverLink(self):
+        # Called from the acquisition thread when frames stop: go back to the link that worked before.
+        link, self.fallbackLink, self.stallTimeout = self.fallbackLink, None, None
+        if link:
+            self.parser.clear()
+            self.applyLink(*link)
+            self.parser.clear()
+
+    def register_callback(self, callback):
+        # Triggered mode: callback(tag, latency, dist, flux, status) runs on the acquisition thread.
+        self.callbacks.append(callback)
+
+    def startTriggered(self, capacity=4096, timeout=0.1):
+        # FRAME_0 stops free-running output; every trigger() then yields exactly one frame,
+        # which the acquisition thread decodes into the ring and hands to the callbacks.
+        self.stopAcquisition()
+        if not self.sendCommand(self.SET_FRAME_RATE, self.FRAME_0):
             return False
-        self.status = self.TFMP_READY
+        if self.frameRate:
+            self.freeRate = self.frameRate
+        self.frameRate = self.FRAME_0
+        self.triggerCommand, _ = self.buildCommand(self.TRIGGER_DETECTION)
+        self.dropTriggers()
+        self.pStream.reset_input_buffer()
+        self.parser.clear()
+        self.startAcquisition(capacity, timeout)
+        return True
+
+    def stopTriggered(self):
+        self.stopAcquisition()
+        self.triggerCommand = None
+        self.dropTriggers()
+        if not self.sendCommand(self.SET_FRAME_RATE, self.freeRate):
+            return False
+        self.frameRate = self.freeRate
+        return True
+
+    def trigger(self, tag=None):
+        # Safe to call from another thread, e.g. once per camera frame; returns without waiting.
+        if self.triggerCommand is None:
+            return False
+        now = time.monotonic()
+        with self.triggerLock:
+            pending = self.pendingTriggers
+            self.expireTriggers(now)
+            if len(pending) == pending.maxlen:
+                pending.popleft()
+                self.triggersLost += 1
+            pending.append((now, tag))
+            self.triggersSent += 1
+        self.pStream.write(self.triggerCommand)
         return True
 
+    def expireTriggers(self, now):
+        # Triggers older than triggerTimeout will not be answered any more. Call with triggerLock held.
+        pending = self.pendingTriggers
+        while pending and now - pending[0][0] > self.triggerTimeout:
+            pending.popleft()
+            self.triggersLost += 1
+
+    def dropTriggers(self):
+        with self.triggerLock:
+            self.triggersLost += len(self.pendingTriggers)
+            self.pendingTriggers.clear()
+
+    def answerTrigger(self, now, dist, flux, status):
+        # Frames carry no tag, so a frame answers the oldest trigger still waiting. A trigger whose
+        # frame was lost would take the next one and shift every later pairing; so while a newer
+        # trigger is waiting, triggers sent longer ago than a reply plausibly takes (a few round
+        # trips as measured so far, at least what the line itself needs) count as lost instead.
+        # A reply delayed beyond that window is paired with the newer trigger.
+        line = 2 * (len(self.triggerCommand or b'') + self.TFMP_FRAME_SIZE) * 10 / self.pStream.baudrate
+        window = min(self.triggerTimeout, max(0.002 + line, 3 * self.triggerRoundTrip))
+        with self.triggerLock:
+            pending = self.pendingTriggers
+            self.expireTriggers(now)
+            while len(pending) > 1 and now - pending[0][0] > window:
+                pending.popleft()
+                self.triggersLost += 1
+            if not pending:
+                return
+            sent, tag = pending.popleft()
+            latency = now - sent
+            self.triggersAnswered += 1
+        self.triggerLatency.append(latency)
+        self.triggerRoundTrip = latency if not self.triggerRoundTrip else 0.9 * self.triggerRoundTrip + 0.1 * latency
+        for callback in self.callbacks:
+            callback(tag, latency, dist, flux, status)
+
+    def triggerStats(self):
+        latency = sorted(self.triggerLatency)
+        with self.triggerLock:
+            stats = {
+                'sent': self.triggersSent,
+                'answered': self.triggersAnswered,
+                'lost': self.triggersLost,
+                'pending': len(self.pendingTriggers),
+                'roundTrip': self.triggerRoundTrip,
+            }
+        if latency:
+            stats.update({
+                'mean': sum(latency) / len(latency),
+                'p50': latency[len(latency) // 2],
+                'p95': latency[int(len(latency) * 0.95)],
+                'max': latency[-1],
+            })
+        return stats
+
     def printStatus(self):
         status_dict = {
             self.TFMP_READY: "READY",
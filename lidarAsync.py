@@ -0,0 +1,184 @@
+import os
+import time
+import asyncio
+import serial
+from lidar import TFMiniPlus, FrameParser
+from lidarRing import LidarRing
+
+REPLY_HEADER = 0x5A
+
+
+class MuxParser(FrameParser):
+    # Splits one byte stream into 0x59 data frames and the 0x5A reply to the command in flight.
+    WAIT = 0
+    SKIP = 1
+    REPLY = 2
+
+    def __init__(self, size=4096):
+        super().__init__(size)
+        self.expected = None
+        self.replyErrors = 0
+
+    def _reply(self, pos):
+        if pos + 3 > self.end:
+            return self.WAIT
+        length, cmdId = self.buffer[pos + 1], self.buffer[pos + 2]
+        if (length, cmdId) != self.expected:
+            return self.SKIP
+        if pos + length > self.end:
+            return self.WAIT
+        if sum(self.view[pos:pos + length - 1]) & 0xFF != self.buffer[pos + length - 1]:
+            self.replyErrors += 1
+            return self.SKIP
+        return self.REPLY
+
+    def nextPacket(self):
+        # Returns (pos, length) of the next data frame or expected reply, or None when more bytes are needed.
+        if not self.expected:
+            pos = self.nextFrame()
+            return (pos, self.FRAME_SIZE) if pos >= 0 else None
+        while True:
+            frame = self.buffer.find(self.HEADER, self.start, self.end)
+            pos = self.buffer.find(REPLY_HEADER, self.start, self.end if frame < 0 else frame)
+            if pos >= 0:
+                kind = self._reply(pos)
+                if kind == self.WAIT:
+                    return None
+                self.droppedBytes += pos - self.start
+                if kind == self.REPLY:
+                    self.start = pos + self.expected[0]
+                    return pos, self.expected[0]
+                self.droppedBytes += 1
+                self.start = pos + 1
+                continue
+            if frame < 0:
+                keep = 1 if self.end > self.start and self.buffer[self.end - 1] == 0x59 else 0
+                self.droppedBytes += self.end - keep - self.start
+                self.start = self.end - keep
+                return None
+            if frame + self.FRAME_SIZE > self.end:
+                return None
+            self.droppedBytes += frame - self.start
+            if sum(self.view[frame:frame + self.FRAME_SIZE - 1]) & 0xFF != self.buffer[frame + self.FRAME_SIZE - 1]:
+                self.checksumErrors += 1
+                self.droppedBytes += 1
+                self.start = frame + 1
+                continue
+            self.start = frame + self.FRAME_SIZE
+            return frame, self.FRAME_SIZE
+
+
+class AsyncTFMiniPlus(TFMiniPlus):
+    # TFMiniPlus on an asyncio loop: the serial fd is watched with loop.add_reader, data frames keep
+    # flowing into the ring while `await command(...)` waits for its reply.
+    def __init__(self, capacity=4096):
+        super().__init__()
+        self.parser = MuxParser()
+        self.ring = LidarRing(capacity)
+        self.loop = None
+        self.fd = None
+        self.commandLock = None
+        self.pendingReply = None
+
+    async def open(self, port, rate):
+        self.loop = asyncio.get_running_loop()
+        self.commandLock = asyncio.Lock()
+        self.pStream = serial.Serial(port, rate, timeout=0)
+        self.fd = self.pStream.fileno()
+        self.loop.add_reader(self.fd, self._onReadable)
+        await asyncio.sleep(0.2)
+        self.status = self.TFMP_READY if self.ring.count else self.TFMP_SERIAL
+        return self.status == self.TFMP_READY
+
+    def close(self):
+        if self.fd is not None:
+            self.loop.remove_reader(self.fd)
+            self.fd = None
+        if self.pendingReply and not self.pendingReply.done():
+            self.pendingReply.cancel()
+        if self.pStream:
+            self.pStream.close()
+
+    def _onReadable(self):
+        try:
+            data = os.read(self.fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError as error:
+            self._lost(error)
+            return
+        if not data:
+            self._lost(ConnectionError("end of file"))
+            return
+        now = time.monotonic()
+        parser = self.parser
+        parser.feed(data)
+        while (packet := parser.nextPacket()) is not None:
+            pos, length = packet
+            if length == self.TFMP_FRAME_SIZE and parser.buffer[pos] == 0x59:
+                if self.recorder:
+                    self.recorder.write(now, parser.view[pos:pos + length])
+                dist, flux, temp = parser.decode(pos)
+                self.dist, self.flux, self.temp = dist, flux, temp
+                self.ring.append(now, dist, flux, temp, self.frameStatus(dist, flux))
+            elif self.pendingReply and not self.pendingReply.done():
+                parser.expected = None
+                self.pendingReply.set_result(bytes(parser.view[pos:pos + length]))
+
+    def _lost(self, error):
+        # An unplugged USB-serial adapter reads as EOF or fails with EIO: stop watching the fd
+        # (it would wake the loop on every pass), close the port and fail a command in flight.
+        print(f"lidar lost: {error}")
+        self.loop.remove_reader(self.fd)
+        self.fd = None
+        self.status = self.TFMP_SERIAL
+        if self.pendingReply and not self.pendingReply.done():
+            self.pendingReply.set_exception(error)
+        try:
+            self.pStream.close()
+        except OSError:
+            pass
+
+    async def command(self, cmnd, param=0, timeout=1.0):
+        cmndData, replyLen = self.buildCommand(cmnd, param)
+        async with self.commandLock:
+            if self.fd is None:
+                self.status = self.TFMP_SERIAL
+                return False
+            if replyLen == 0:
+                self.pStream.write(cmndData)
+                return True
+            self.pendingReply = self.loop.create_future()
+            self.parser.expected = (replyLen, cmndData[2])
+            self.pStream.write(cmndData)
+            try:
+                self.reply = await asyncio.wait_for(self.pendingReply, timeout)
+            except asyncio.TimeoutError:
+                self.status = self.TFMP_HEADER
+                return False
+            except OSError:
+                return False
+            finally:
+                self.parser.expected = None
+                self.pendingReply = None
+            return self.checkReply(cmnd, self.reply)
+
+
+if __name__ == "__main__":
+    async def main():
+        tfm = AsyncTFMiniPlus()
+        await tfm.open("/dev/ttyUSB0", 115200)
+        tfm.printStatus()
+        if await tfm.command(tfm.GET_FIRMWARE_VERSION):
+            print("Firmware", ".".join(str(b) for b in reversed(tfm.version)))
+        try:
+            while True:
+                await asyncio.sleep(0.5)
+                print(tfm.latest())
+        finally:
+            tfm.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,478 @@
+import os
+import sys
+import time
+import tempfile
+import asyncio
+import psutil
+import numpy as np
+from lidar import TFMiniPlus
+from lidarDecode import decodeFrames
+from lidarAsync import AsyncTFMiniPlus
+from lidarHub import LidarHub
+from lidarLog import LidarRecorder, LidarLog, LogReplayer
+from lidarFilter import RollingMedian, FluxGate, KalmanFilter, defaultFilter
+from lidarRing import SAMPLE_DTYPE
+from fakeLidar import FakeTFMiniPlus, CaptureStream, goldenCapture, buildFrame
+
+
+class LegacyTFMiniPlus(TFMiniPlus):
+    # The original byte-at-a-time parser, kept as the baseline.
+    def getData(self):
+        self.status, self.dist, self.flux, self.temp = 0, 0, 0, 0
+        serialTimeout = time.time() + 1
+        while self.pStream.inWaiting() > self.TFMP_FRAME_SIZE:
+            self.pStream.read()
+        self.frame = bytearray(self.TFMP_FRAME_SIZE)
+        while self.frame[0] != 0x59 or self.frame[1] != 0x59:
+            if self.pStream.inWaiting():
+                self.frame.append(self.pStream.read()[0])
+                self.frame = self.frame[1:]
+            if time.time() > serialTimeout:
+                self.status = self.TFMP_HEADER
+                return False
+        chkSum = sum(self.frame[:-1]) & 0xFF
+        if chkSum != self.frame[-1]:
+            self.status = self.TFMP_CHECKSUM
+            return False
+        self.dist = (self.frame[3] << 8) + self.frame[2]
+        self.flux = (self.frame[5] << 8) + self.frame[4]
+        self.temp = (((self.frame[7] << 8) + self.frame[6]) >> 3) - 256
+        self.status = self.frameStatus(self.dist, self.flux)
+        return self.status == self.TFMP_READY
+
+
+def benchGetData(name, cls, rate, callRate, seconds):
+    # callRate=None calls getData back to back; otherwise once per consumer tick (e.g. a video frame).
+    fake = FakeTFMiniPlus(rate)
+    fake.start()
+    tfm = cls()
+    tfm.begin(fake.port, 921600)
+    frames = errors = calls = 0
+    cpu0 = time.thread_time()
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        if tfm.getData():
+            frames += 1
+        else:
+            errors += 1
+        calls += 1
+        if callRate:
+            time.sleep(max(0.0, t0 + calls / callRate - time.perf_counter()))
+    wall = time.perf_counter() - t0
+    cpu = time.thread_time() - cpu0
+    tfm.pStream.close()
+    fake.close()
+    consumer = f"{callRate} Hz" if callRate else "poll"
+    print(f"getData {name:7s} sensor {rate:5d} Hz  consumer {consumer:>6s}  {frames / wall:8.1f} frames/s  "
+          f"{cpu / max(frames, 1) * 1e6:8.1f} us CPU/frame  {cpu / wall * 100:5.1f}% CPU  {errors} errors")
+
+
+def benchAcquisition(rate, seconds):
+    fake = FakeTFMiniPlus(rate)
+    fake.start()
+    tfm = TFMiniPlus()
+    tfm.begin(fake.port, 921600)
+    tfm.startAcquisition()
+    time.sleep(0.1)
+    frames0 = tfm.ring.count
+    reads = 0
+    readTime = 0.0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        r0 = time.perf_counter()
+        tfm.latest()
+        readTime += time.perf_counter() - r0
+        reads += 1
+        time.sleep(1 / 60)
+    wall = time.perf_counter() - t0
+    tfm.stopAcquisition()
+    frames = tfm.ring.count - frames0
+    tfm.pStream.close()
+    fake.close()
+    print(f"acquire         sensor {rate:5d} Hz  {frames / wall:8.1f} frames/s  "
+          f"latest() {readTime / reads * 1e6:6.1f} us  dropped {tfm.parser.droppedBytes} bytes")
+
+
+def benchDecode(frames, repeat):
+    golden = goldenCapture(frames, seed=1)
+    tfm = TFMiniPlus()
+    tfm.pStream = CaptureStream(golden)
+    expected = []
+    while not tfm.pStream.exhausted():
+        if tfm.getData():
+            expected.append((tfm.dist, tfm.flux, tfm.temp))
+    decoded, stats = decodeFrames(golden)
+    match = np.array_equal(np.array(expected), np.stack([decoded['dist'], decoded['flux'], decoded['temp']], axis=1))
+    print(f"decode golden   {len(golden)} bytes  {stats}  matches getData: {match}")
+    big = np.tile(np.frombuffer(golden, dtype=np.uint8), repeat)
+    t0 = time.perf_counter()
+    decoded, stats = decodeFrames(big)
+    wall = time.perf_counter() - t0
+    print(f"decode batch    {len(big) / 1e6:.0f} MB  {len(big) / wall / 1e6:8.1f} MB/s  {stats['frames'] / wall / 1e6:5.2f} M frames/s")
+
+
+def threadCpu(nativeId):
+    for thread in psutil.Process().threads():
+        if thread.id == nativeId:
+            return thread.user_time + thread.system_time
+    return 0.0
+
+
+def benchCpu(name, cls, rate, seconds):
+    # rate=0 leaves the sensor silent, which is where busy-waiting hurts most.
+    fake = FakeTFMiniPlus(rate)
+    fake.start()
+    tfm = cls()
+    tfm.begin(fake.port, 921600)
+    cpu0 = time.thread_time()
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        tfm.getData()
+    getDataCpu = (time.thread_time() - cpu0) / (time.perf_counter() - t0)
+    tfm.startAcquisition()
+    native = tfm.acquisitionThread.native_id
+    cpu0 = threadCpu(native)
+    t0 = time.perf_counter()
+    time.sleep(seconds)
+    acquireCpu = (threadCpu(native) - cpu0) / (time.perf_counter() - t0)
+    tfm.stopAcquisition()
+    tfm.pStream.close()
+    fake.close()
+    state = f"streaming {rate} Hz" if rate else "idle"
+    print(f"cpu     {name:7s} {state:>18s}  getData loop {getDataCpu * 100:5.1f}% CPU  "
+          f"acquisition thread {acquireCpu * 100:5.1f}% CPU")
+
+
+async def benchAsync(rate, commands):
+    fake = FakeTFMiniPlus(rate)
+    fake.start()
+    tfm = AsyncTFMiniPlus()
+    await tfm.open(fake.port, 921600)
+    sent0, frames0 = fake.framesSent, tfm.ring.count
+    rtt = []
+    for i in range(commands):
+        t0 = time.perf_counter()
+        ok = await tfm.command(tfm.GET_FIRMWARE_VERSION)
+        rtt.append(time.perf_counter() - t0)
+        if not ok:
+            tfm.printStatus()
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.05)
+    received = tfm.ring.count - frames0
+    sent = fake.framesSent - sent0
+    fake.ignoreCommands = True
+    t0 = time.perf_counter()
+    timedOut = not await tfm.command(tfm.SAVE_SETTINGS, timeout=0.2)
+    waited = time.perf_counter() - t0
+    # Unplug while a command waits for its reply: the command fails at once instead of timing out,
+    # and the loop stops watching the dead fd.
+    asyncio.get_running_loop().call_later(0.1, fake.close)
+    t0 = time.perf_counter()
+    unplugged = await tfm.command(tfm.SAVE_SETTINGS, timeout=5)
+    failedAfter = time.perf_counter() - t0
+    cpu0 = time.thread_time()
+    await asyncio.sleep(0.5)
+    idleCpu = (time.thread_time() - cpu0) / 0.5
+    tfm.close()
+    rtt.sort()
+    print(f"async           sensor {rate:5d} Hz  {commands} commands  rtt p50 {rtt[len(rtt) // 2] * 1e3:.2f} ms  "
+          f"max {rtt[-1] * 1e3:.2f} ms  frames {received}/{sent} while commanding  "
+          f"timeout {'ok' if timedOut else 'MISSED'} after {waited * 1e3:.0f} ms")
+    print(f"async           unplugged: command failed after {failedAfter * 1e3:.0f} ms, "
+          f"{idleCpu * 100:.1f}% CPU afterwards")
+    assert received >= sent * 0.99, f"async lost frames while commanding: {received}/{sent}"
+    assert timedOut, "async command without a reply did not time out"
+    assert not unplugged and failedAfter < 1, f"async command on an unplugged port took {failedAfter:.2f} s"
+    assert tfm.fd is None and tfm.status == tfm.TFMP_SERIAL, "async unplugged port still watched"
+    assert idleCpu < 0.2, f"async loop busy after unplug: {idleCpu:.0%} CPU"
+
+
+def benchHub(sensors, rate, seconds):
+    fakes = [FakeTFMiniPlus(rate) for _ in range(sensors)]
+    hub = LidarHub()
+    for i, fake in enumerate(fakes):
+        fake.start()
+        hub.add(f"lidar{i}", fake.port, 921600)
+    hub.stats()
+    cpu0 = time.thread_time()
+    t0 = time.perf_counter()
+    wakeups = 0
+    while time.perf_counter() - t0 < seconds:
+        hub.poll(0.1)
+        wakeups += 1
+    wall = time.perf_counter() - t0
+    cpu = time.thread_time() - cpu0
+    stats = hub.stats()
+    aligned = hub.aligned()
+    skew = aligned['timestamp'].max() - aligned['timestamp'].min()
+    # Unplug the first sensor: the hub drops its port and keeps serving the others.
+    fakes[0].close()
+    before = {name: tfm.ring.count for name, tfm in hub.sensors.items()}
+    cpu1 = time.thread_time()
+    t1 = time.perf_counter()
+    while time.perf_counter() - t1 < 0.5:
+        hub.poll(0.1)
+    unpluggedCpu = (time.thread_time() - cpu1) / (time.perf_counter() - t1)
+    survivors = sum(tfm.ring.count > before[name] for name, tfm in hub.sensors.items())
+    lost = [name for _, name, _ in hub.lost]
+    # Unplug another one while the hub runs its own thread and this one keeps reading stats().
+    reads = 0
+    if sensors > 1:
+        hub.start()
+        fakes[1].close()
+        t1 = time.perf_counter()
+        while time.perf_counter() - t1 < 0.5:
+            hub.stats()
+            hub.aligned()
+            reads += 1
+        hub.stop()
+    hubLost = [name for _, name, _ in hub.lost]
+    left = len(hub.sensors)
+    hub.close()
+    for fake in fakes[2:]:
+        fake.close()
+    rates = [s['rate'] for s in stats.values()]
+    errors = sum(s['checksumErrors'] for s in stats.values())
+    dropped = sum(s['droppedBytes'] for s in stats.values())
+    total = sum(rates)
+    print(f"hub             {sensors:2d} x {rate} Hz  {total:8.1f} frames/s total  per port {min(rates):.0f}-{max(rates):.0f}  "
+          f"{cpu / wall * 100:5.1f}% CPU  {cpu / max(total * wall, 1) * 1e6:5.1f} us/frame  "
+          f"{wakeups / wall:.0f} wakeups/s  skew {skew * 1e3:.2f} ms  {errors} checksum  {dropped} dropped")
+    print(f"hub             unplugged {lost}: {survivors}/{sensors - 1} others still reading, "
+          f"{unpluggedCpu * 100:.1f}% CPU afterwards; {hubLost} while {reads} stats() calls ran")
+    assert errors == 0 and min(rates) > rate * 0.9, f"hub ports short of {rate} Hz: {min(rates):.0f}, {errors} checksum errors"
+    assert lost == ["lidar0"] and survivors == sensors - 1, f"hub unplug: lost {lost}, {survivors}/{sensors - 1} still reading"
+    assert unpluggedCpu < 0.5, f"hub spinning after unplug: {unpluggedCpu:.0%} CPU"
+    if sensors > 1:
+        assert hubLost == ["lidar0", "lidar1"] and left == sensors - 2, f"hub threaded unplug: lost {hubLost}, {left} left"
+
+
+def benchLog(records, seeks):
+    tmp = tempfile.TemporaryDirectory()
+    path = os.path.join(tmp.name, "bench.tfl")
+    frames = [buildFrame(100 + n, 1000, 40) for n in range(1000)]
+    recorder = LidarRecorder(path)
+    t0 = time.perf_counter()
+    for n in range(records):
+        recorder.write(n * 0.001, frames[n % 1000])
+    recorder.close()
+    writeRate = records / (time.perf_counter() - t0)
+    log = LidarLog(path)
+    targets = np.random.default_rng(0).uniform(0, records * 0.001, seeks)
+    t0 = time.perf_counter()
+    for t in targets:
+        log.seek(t)
+    seekTime = (time.perf_counter() - t0) / seeks
+    t0 = time.perf_counter()
+    samples = log.samples()
+    decodeRate = len(samples) / (time.perf_counter() - t0)
+    size = os.path.getsize(path)
+    replayer = LogReplayer(log, speed=0)
+    replayer.start()
+    tfm = TFMiniPlus()
+    tfm.begin(replayer.port, 921600)
+    tfm.startAcquisition(capacity=1 << 16)
+    t0 = time.perf_counter()
+    while not replayer.finished:
+        time.sleep(0.01)
+    replayRate = replayer.framesSent / (time.perf_counter() - t0)
+    tfm.stopAcquisition()
+    tfm.pStream.close()
+    replayer.close()
+    log.close()
+    tmp.cleanup()
+    print(f"log             {records} records  {size / 1e6:.1f} MB  write {writeRate / 1e3:.0f} k rec/s  "
+          f"seek {seekTime * 1e6:.1f} us  samples() {decodeRate / 1e6:.1f} M rec/s  replay max {replayRate / 1e3:.0f} k frames/s")
+
+
+def noisySamples(n, seed=0):
+    rng = np.random.default_rng(seed)
+    samples = np.zeros(n, dtype=SAMPLE_DTYPE)
+    samples['timestamp'] = np.arange(n) * 0.001
+    truth = 200 + 50 * np.sin(np.arange(n) / 500)
+    samples['dist'] = truth + rng.normal(0, 3, n)
+    samples['flux'] = rng.integers(50, 5000, n)
+    spikes = rng.random(n) < 0.02
+    samples['dist'][spikes] = rng.integers(0, 1200, spikes.sum())
+    samples['status'][rng.random(n) < 0.01] = TFMiniPlus.TFMP_WEAK
+    return samples, truth
+
+
+def benchFilter(n):
+    samples, truth = noisySamples(n)
+    rows = list(zip(samples['timestamp'].tolist(), samples['dist'].tolist(),
+                    samples['flux'].tolist(), samples['status'].tolist()))
+    for name, make in (("median", lambda: RollingMedian(5)), ("gate", FluxGate),
+                       ("kalman", KalmanFilter), ("chain", defaultFilter)):
+        stage = make()
+        update = stage.update
+        t0 = time.perf_counter()
+        streamed = [update(*row) for row in rows]
+        streamTime = (time.perf_counter() - t0) / n
+        if name == "chain":
+            t0 = time.perf_counter()
+            batched = stage.batch(samples)
+        else:
+            t0 = time.perf_counter()
+            batched = make().batch(samples['timestamp'], samples['dist'], samples['flux'], samples['status'])
+        batchTime = (time.perf_counter() - t0) / n
+        streamed = np.array([np.nan if v is None else v for v in streamed])
+        kept = ~np.isnan(batched)
+        print(f"filter {name:8s} update {streamTime * 1e6:5.2f} us/sample  batch {batchTime * 1e6:5.2f} us/sample  "
+              f"match {np.allclose(streamed, batched, equal_nan=True)}  kept {kept.mean():.1%}  "
+              f"error {np.abs(samples['dist'] - truth).mean():.1f} -> {np.abs(batched[kept] - truth[kept]).mean():.1f} cm")
+
+
+def benchConfigure(targets):
+    fake = FakeTFMiniPlus(100, baud=115200)
+    fake.start()
+    tfm = TFMiniPlus()
+    tfm.begin(fake.port, 115200)
+    # Acquisition keeps running across configure(): same ring, same read timeout.
+    tfm.startAcquisition(timeout=0.05)
+    ring = tfm.ring
+    for target in targets:
+        before = tfm.ring.count
+        t0 = time.perf_counter()
+        ok = tfm.configure(target)
+        elapsed = time.perf_counter() - t0
+        time.sleep(0.5)
+        count = tfm.ring.count
+        time.sleep(1)
+        rate = tfm.ring.count - count
+        print(f"configure {target:5d} Hz  {'ok' if ok else 'FAILED':6s} {tfm.frameRate:4d} Hz @ {tfm.pStream.baudrate:6d} baud  "
+              f"measured {rate} Hz  took {elapsed:.2f} s")
+        assert ok and (tfm.frameRate, tfm.pStream.baudrate) == tfm.linkSettings(target), \
+            f"configure {target} Hz landed on {tfm.frameRate} Hz @ {tfm.pStream.baudrate} baud"
+        assert abs(rate - tfm.frameRate) <= tfm.frameRate * 0.1 + 2, f"configure {target} Hz: measured {rate} Hz"
+        assert tfm.ring is ring and tfm.ring.count >= before, "configure dropped the acquisition history"
+        assert tfm.acquiring and tfm.pStream.timeout == 0.05, "configure did not resume acquisition as it was"
+    previous = (tfm.frameRate, tfm.pStream.baudrate)
+    fake.acceptBaud = False
+    t0 = time.perf_counter()
+    ok = tfm.configure(targets[0])
+    count = tfm.ring.count
+    time.sleep(0.5)
+    flowing = tfm.ring.count > count
+    print(f"configure refused   {'ok' if ok else 'fell back'} to {tfm.frameRate} Hz @ {tfm.pStream.baudrate} baud  "
+          f"took {time.perf_counter() - t0:.2f} s")
+    assert not ok and tfm.status == tfm.TFMP_FAIL, "configure reported a refused baud as configured"
+    assert (tfm.frameRate, tfm.pStream.baudrate) == previous and flowing, \
+        f"configure refused: {tfm.frameRate} Hz @ {tfm.pStream.baudrate} baud instead of {previous}, frames {flowing}"
+    tfm.stopAcquisition()
+    tfm.pStream.close()
+    fake.close()
+
+
+def benchTriggered(frameRate, seconds):
+    # Free-running at 1 kHz and keeping the newest frame, versus one trigger per camera frame.
+    for mode in ("free-running", "triggered"):
+        fake = FakeTFMiniPlus(1000)
+        fake.start()
+        tfm = TFMiniPlus()
+        tfm.begin(fake.port, 921600)
+        if mode == "triggered":
+            tfm.startTriggered()
+        else:
+            tfm.startAcquisition()
+        native = tfm.acquisitionThread.native_id
+        frames0 = tfm.ring.count
+        cpu0 = threadCpu(native)
+        t0 = time.perf_counter()
+        n = 0
+        while time.perf_counter() - t0 < seconds:
+            n += 1
+            tfm.trigger(n)
+            time.sleep(max(0.0, t0 + n / frameRate - time.perf_counter()))
+        time.sleep(0.05)
+        wall = time.perf_counter() - t0
+        cpu = (threadCpu(native) - cpu0) / wall
+        frames = tfm.ring.count - frames0
+        stats = tfm.triggerStats()
+        tfm.stopAcquisition()
+        tfm.pStream.close()
+        fake.close()
+        line = (f"trigger {mode:12s} {frameRate} fps camera  {frames / wall:7.1f} frames/s  "
+                f"{frames * tfm.TFMP_FRAME_SIZE / wall:7.0f} B/s  thread {cpu * 100:5.2f}% CPU")
+        if "p50" in stats:
+            line += (f"  latency p50 {stats['p50'] * 1e3:.2f} ms  p95 {stats['p95'] * 1e3:.2f} ms  "
+                     f"max {stats['max'] * 1e3:.2f} ms  answered {stats['answered']}/{stats['sent']}")
+        print(line)
+        if mode == "triggered":
+            assert stats['answered'] == stats['sent'] == n and stats['lost'] == 0, f"trigger accounting {stats}"
+
+
+def benchTriggerLoss(frameRate, seconds):
+    # Replies lost on the line, a sensor that stops answering, and triggers faster than it answers.
+    # Every trigger ends up answered, lost or pending, and a lost reply does not shift the pairing
+    # of later ones: the fake's frame n carries dist 100 + n % 500, and the tags count triggers.
+    fake = FakeTFMiniPlus(1000)
+    fake.start()
+    tfm = TFMiniPlus()
+    tfm.begin(fake.port, 921600)
+    pairs = []
+    tfm.register_callback(lambda tag, latency, dist, flux, status: pairs.append((tag, dist)))
+    tfm.startTriggered()
+    dropped = fake.framesDropped
+    fake.loseTriggers = 7
+    n = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        n += 1
+        tfm.trigger(n)
+        time.sleep(max(0.0, t0 + n / frameRate - time.perf_counter()))
+    time.sleep(0.05)
+    lossy = tfm.triggerStats()
+    dropped = fake.framesDropped - dropped
+    offsets = [(dist - tag) % 500 for tag, dist in pairs]
+    mispaired = sum(offset != offsets[0] for offset in offsets)
+    print(f"trigger lossy        every 7th reply lost  answered {lossy['answered']}/{lossy['sent']}  "
+          f"lost {lossy['lost']}  pending {lossy['pending']}  mispaired {mispaired}")
+    assert lossy['sent'] == lossy['answered'] + lossy['lost'] + lossy['pending'], f"trigger accounting {lossy}"
+    # The last trigger's reply may be the lost one; with no newer trigger it waits for the timeout.
+    assert lossy['answered'] == n - dropped and lossy['lost'] + lossy['pending'] == dropped and mispaired == 0, \
+        f"trigger lossy: {lossy}, {dropped} replies lost by the sensor, {mispaired} mispaired"
+    # A silent sensor: triggers expire without any frame arriving.
+    fake.ignoreCommands = True
+    lost = lossy['lost'] + lossy['pending']
+    for i in range(int(frameRate * 0.5)):
+        n += 1
+        tfm.trigger(n)
+        time.sleep(1 / frameRate)
+    time.sleep(tfm.triggerTimeout + 0.15)
+    silent = tfm.triggerStats()
+    print(f"trigger silent       {silent['lost'] - lost} lost  pending {silent['pending']}")
+    assert silent['lost'] - lost == int(frameRate * 0.5) and silent['pending'] == 0, f"trigger silent: {silent}"
+    # A burst past the pending limit: the overflow counts as lost.
+    for i in range(200):
+        n += 1
+        tfm.trigger(n)
+    burst = tfm.triggerStats()
+    print(f"trigger burst        200 triggers  pending {burst['pending']}  lost {burst['lost'] - silent['lost']}")
+    assert burst['pending'] == tfm.pendingTriggers.maxlen and burst['lost'] - silent['lost'] == 200 - burst['pending']
+    tfm.stopAcquisition()
+    tfm.dropTriggers()
+    final = tfm.triggerStats()
+    assert final['sent'] == n == final['answered'] + final['lost'] and final['pending'] == 0, f"trigger accounting {final}"
+    tfm.pStream.close()
+    fake.close()
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    for callRate in (None, 60):
+        benchGetData("before", LegacyTFMiniPlus, 1000, callRate, seconds)
+        benchGetData("after", TFMiniPlus, 1000, callRate, seconds)
+    benchAcquisition(1000, seconds)
+    for rate in (0, 1000):
+        benchCpu("before", LegacyTFMiniPlus, rate, seconds)
+        benchCpu("after", TFMiniPlus, rate, seconds)
+    benchDecode(20000, 500)
+    asyncio.run(benchAsync(1000, 100))
+    for sensors in (1, 8, 16):
+        benchHub(sensors, 1000, seconds)
+    benchLog(200000, 1000)
+    benchFilter(100000)
+    benchConfigure([10, 100, 250, 1000])
+    benchTriggered(60, seconds)
+    benchTriggerLoss(60, seconds)
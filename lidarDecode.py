@@ -0,0 +1,101 @@
+import numpy as np
+from lidar import TFMiniPlus
+
+FRAME_SIZE = TFMiniPlus.TFMP_FRAME_SIZE
+HEADER = 0x59
+
+FRAME_DTYPE = np.dtype([
+    ('offset', 'i8'),
+    ('dist', 'i4'),
+    ('flux', 'i4'),
+    ('temp', 'i2'),
+    ('status', 'u1'),
+])
+
+
+LANES = np.uint64(0x00FF00FF00FF00FF)
+FOLD = np.uint64(0x0001000100010001)
+
+
+def _fields(word, shift):
+    return ((word >> np.uint64(shift)) & np.uint64(0xFFFF)).astype(np.int32)
+
+
+def _resolveOverlaps(pos, idx):
+    # Same choice as the streaming parser: take the first good frame, skip anything that starts inside it.
+    # An element whose predecessor does not overlap *its* predecessor is overlapping a kept frame.
+    while len(idx) > 1:
+        conflict = np.diff(pos[idx]) < FRAME_SIZE
+        if not conflict.any():
+            break
+        drop = np.zeros(len(idx), dtype=bool)
+        drop[1:] = conflict & ~np.concatenate(([False], conflict[:-1]))
+        idx = idx[~drop]
+    return idx
+
+
+def decodeFrames(data, chunkSize=256 << 10):
+    buf = data if isinstance(data, np.ndarray) else np.frombuffer(data, dtype=np.uint8)
+    n = len(buf)
+    chunks = []
+    stats = {'frames': 0, 'resyncs': 0, 'checksumErrors': 0, 'droppedBytes': 0}
+    nextAllowed = 0
+    lo = 0
+    while lo + FRAME_SIZE <= n:
+        hi = min(lo + chunkSize, n - FRAME_SIZE + 1)
+        seg = buf[lo:hi + FRAME_SIZE - 1]
+        count = hi - lo
+        cand = np.flatnonzero((seg[:count] == HEADER) & (seg[1:count + 1] == HEADER))
+        # Bytes 0..7 of every candidate as one unaligned little-endian word: header, dist, flux, temp.
+        words = np.ndarray((count,), dtype='<u8', buffer=seg, strides=(1,))[cand]
+        # Sum the eight bytes: fold pairs into 16-bit lanes, then add the lanes with one multiply.
+        pairs = (words & LANES) + ((words >> np.uint64(8)) & LANES)
+        chk = ((pairs * FOLD) >> np.uint64(48)).astype(np.uint8)
+        good = chk == seg[cand + FRAME_SIZE - 1]
+        start = nextAllowed - lo
+        usable = cand >= start
+        keptIdx = _resolveOverlaps(cand, np.flatnonzero(good & usable))
+        kept = cand[keptIdx]
+        # Bad headers inside a kept frame are never looked at by the streaming parser.
+        isKept = np.zeros(len(cand), dtype=bool)
+        isKept[keptIdx] = True
+        lastKept = np.maximum.accumulate(np.where(isKept, cand, -FRAME_SIZE))
+        stats['checksumErrors'] += int(np.count_nonzero(~good & usable & (cand >= lastKept + FRAME_SIZE)))
+        if len(kept):
+            gaps = np.diff(kept) != FRAME_SIZE
+            stats['resyncs'] += int(np.count_nonzero(gaps)) + int(kept[0] != start)
+            keptWords = words[keptIdx]
+            frames = np.empty(len(kept), dtype=FRAME_DTYPE)
+            frames['offset'] = kept + lo
+            frames['dist'] = _fields(keptWords, 16)
+            frames['flux'] = _fields(keptWords, 32)
+            frames['temp'] = (_fields(keptWords, 48) >> 3) - 256
+            frames['status'] = frameStatus(frames['dist'], frames['flux'])
+            chunks.append(frames)
+            nextAllowed = int(kept[-1]) + lo + FRAME_SIZE
+        lo = hi
+    frames = np.concatenate(chunks) if chunks else np.empty(0, dtype=FRAME_DTYPE)
+    stats['frames'] = len(frames)
+    stats['droppedBytes'] = n - FRAME_SIZE * len(frames)
+    return frames, stats
+
+
+def frameStatus(dist, flux):
+    # Vectorized TFMiniPlus.frameStatus; later assignments take priority.
+    status = np.full(len(dist), TFMiniPlus.TFMP_READY, dtype=np.uint8)
+    status[dist == -4] = TFMiniPlus.TFMP_FLOOD
+    status[flux == -1] = TFMiniPlus.TFMP_STRONG
+    status[dist == -1] = TFMiniPlus.TFMP_WEAK
+    return status
+
+
+def decodeFile(path, chunkSize=256 << 10):
+    return decodeFrames(np.memmap(path, dtype=np.uint8, mode='r'), chunkSize)
+
+
+if __name__ == "__main__":
+    import sys
+    frames, stats = decodeFile(sys.argv[1])
+    print(stats)
+    for frame in frames[:10]:
+        print(frame['offset'], frame['dist'], frame['flux'], frame['temp'])
@@ -0,0 +1,161 @@
+import math
+from bisect import bisect_left, insort
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from lidar import TFMiniPlus
+
+# Every stage has the same two faces:
+#   update(t, dist, flux, status) -> filtered dist, or None when the sample is dropped
+#   batch(t, dist, flux, status)  -> float array, NaN where update() would have returned None
+# Streaming stages keep fixed-size state only, so steady-state updates allocate no containers.
+
+
+def _rollingMedian(values, window):
+    out = np.empty(len(values))
+    head = min(window - 1, len(values))
+    for i in range(head):
+        out[i] = np.median(values[:i + 1])
+    if len(values) >= window:
+        out[head:] = np.median(sliding_window_view(values, window), axis=1)
+    return out
+
+
+class RollingMedian:
+    # A sorted copy of the window next to the ring of raw values: each sample is one bisect to find
+    # the oldest value, a delete and an insort, so O(window) element moves per sample (constant for
+    # a fixed window, not O(1) in it). No comparison-based sliding median beats O(log window); for
+    # the windows used here (5) the list moves are cheaper than a heap pair with lazy deletion, and
+    # the list is updated in place, so nothing is allocated.
+    def __init__(self, window=5):
+        self.window = window
+        self.values = [0.0] * window
+        self.ordered = []
+        self.index = 0
+
+    def reset(self):
+        self.ordered.clear()
+        self.index = 0
+
+    def median(self, value):
+        ordered = self.ordered
+        if len(ordered) == self.window:
+            del ordered[bisect_left(ordered, self.values[self.index])]
+        self.values[self.index] = value
+        self.index = (self.index + 1) % self.window
+        insort(ordered, value)
+        n = len(ordered)
+        return ordered[n // 2] if n % 2 else (ordered[n // 2 - 1] + ordered[n // 2]) / 2
+
+    def update(self, t, dist, flux, status):
+        return self.median(dist)
+
+    def batch(self, t, dist, flux, status):
+        return _rollingMedian(np.asarray(dist, dtype=float), self.window)
+
+
+class FluxGate:
+    # Drops WEAK/FLOOD/zero frames outright, then rejects samples that stray from the median of
+    # recent valid samples. The allowed distance scales with sqrt(flux / fluxRef): a strong return
+    # is trusted to jump further than a weak one.
+    def __init__(self, minFlux=100, tolerance=30, fluxRef=1000, window=5):
+        self.minFlux = minFlux
+        self.tolerance = tolerance
+        self.fluxRef = fluxRef
+        self.reference = RollingMedian(window)
+
+    def reset(self):
+        self.reference.reset()
+
+    def update(self, t, dist, flux, status):
+        if status != TFMiniPlus.TFMP_READY or flux < self.minFlux or dist <= 0:
+            return None
+        reference = self.reference.median(dist)
+        if abs(dist - reference) > self.tolerance * math.sqrt(flux / self.fluxRef):
+            return None
+        return dist
+
+    def batch(self, t, dist, flux, status):
+        dist = np.asarray(dist, dtype=float)
+        flux = np.asarray(flux, dtype=float)
+        out = np.full(len(dist), np.nan)
+        valid = np.flatnonzero((status == TFMiniPlus.TFMP_READY) & (flux >= self.minFlux) & (dist > 0))
+        reference = _rollingMedian(dist[valid], self.reference.window)
+        limit = self.tolerance * np.sqrt(flux[valid] / self.fluxRef)
+        keep = np.abs(dist[valid] - reference) <= limit
+        out[valid[keep]] = dist[valid[keep]]
+        return out
+
+
+class KalmanFilter:
+    # 1-D constant-velocity Kalman filter; q is the white-noise acceleration density (cm^2/s^3),
+    # r the measurement variance (cm^2).
+    def __init__(self, q=500.0, r=4.0):
+        self.q = q
+        self.r = r
+        self.reset()
+
+    def reset(self):
+        self.t = None
+        self.x = self.v = 0.0
+        self.p00 = self.p01 = self.p11 = 0.0
+
+    def update(self, t, dist, flux=None, status=None):
+        if self.t is None:
+            self.t, self.x, self.v = t, float(dist), 0.0
+            self.p00, self.p01, self.p11 = self.r, 0.0, 1e4
+            return self.x
+        dt = t - self.t
+        self.t = t
+        q = self.q
+        dt2 = dt * dt
+        p00 = self.p00 + dt * (2 * self.p01 + dt * self.p11) + q * dt2 * dt / 3
+        p01 = self.p01 + dt * self.p11 + q * dt2 / 2
+        p11 = self.p11 + q * dt
+        x = self.x + self.v * dt
+        s = p00 + self.r
+        k0, k1 = p00 / s, p01 / s
+        y = dist - x
+        self.x = x + k0 * y
+        self.v += k1 * y
+        self.p00 = (1 - k0) * p00
+        self.p01 = (1 - k0) * p01
+        self.p11 = p11 - k1 * p01
+        return self.x
+
+    def batch(self, t, dist, flux=None, status=None):
+        # The recursion is inherently sequential; this runs the scalar update over plain lists, on a
+        # fresh filter so the streaming state is left alone.
+        update = KalmanFilter(self.q, self.r).update
+        return np.fromiter((update(ti, di) for ti, di in zip(np.asarray(t).tolist(), np.asarray(dist).tolist())),
+                           dtype=float, count=len(dist))
+
+
+class FilterChain:
+    def __init__(self, *stages):
+        self.stages = stages
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def update(self, t, dist, flux, status):
+        for stage in self.stages:
+            dist = stage.update(t, dist, flux, status)
+            if dist is None:
+                return None
+        return dist
+
+    def batch(self, samples):
+        # samples is a SAMPLE_DTYPE array, e.g. LidarRing.window(n) or LidarLog.samples().
+        t, flux, status = samples['timestamp'], samples['flux'], samples['status']
+        values = samples['dist'].astype(float)
+        alive = np.arange(len(values))
+        for stage in self.stages:
+            out = stage.batch(t[alive], values[alive], flux[alive], status[alive])
+            values[alive] = out
+            alive = alive[~np.isnan(out)]
+        return values
+
+
+def defaultFilter():
+    return FilterChain(FluxGate(), RollingMedian(5), KalmanFilter())
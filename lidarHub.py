@@ -0,0 +1,155 @@
+import os
+import time
+import selectors
+import threading
+import numpy as np
+import serial
+from lidar import TFMiniPlus
+from lidarRing import LidarRing, SAMPLE_DTYPE
+
+
+class LidarHub:
+    # Reads many TFMini-Plus ports from one selector loop; every sensor gets its own parser and ring.
+    def __init__(self, capacity=4096, publishRate=100):
+        self.capacity = capacity
+        self.publishRate = publishRate
+        self.selector = selectors.DefaultSelector()
+        self.sensors = {}
+        self.callbacks = []
+        self.lastStats = {}
+        self.lost = []
+        # poll() drops lost ports from the selector thread while stats() and aligned() read the
+        # sensor map from others.
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def add(self, name, port, rate=115200):
+        tfm = TFMiniPlus()
+        tfm.pStream = serial.Serial(port, rate, timeout=0)
+        tfm.ring = LidarRing(self.capacity)
+        with self.lock:
+            self.sensors[name] = tfm
+            self.lastStats[name] = (0, time.monotonic())
+        self.selector.register(tfm.pStream.fileno(), selectors.EVENT_READ, (name, tfm))
+        return tfm
+
+    def remove(self, name):
+        with self.lock:
+            tfm = self.sensors.pop(name)
+            self.lastStats.pop(name)
+        self.selector.unregister(tfm.pStream.fileno())
+        try:
+            tfm.pStream.close()
+        except OSError:
+            pass
+
+    def register_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def poll(self, timeout=None):
+        events = self.selector.select(timeout)
+        now = time.monotonic()
+        for key, _ in events:
+            name, tfm = key.data
+            try:
+                data = os.read(key.fd, 4096)
+            except BlockingIOError:
+                continue
+            except OSError as error:
+                data, reason = b'', error
+            else:
+                reason = "end of file"
+            if not data:
+                # An unplugged USB-serial adapter reads as EOF or fails with EIO; drop that port
+                # and keep serving the others.
+                print(f"lidar {name} lost: {reason}")
+                self.lost.append((now, name, str(reason)))
+                self.remove(name)
+                continue
+            tfm.parser.feed(data)
+            tfm.decodeAvailable(now)
+        return len(events)
+
+    def aligned(self, t=None):
+        # One row per sensor (in self.sensors order): each sensor's newest sample at or before t.
+        # By default t is the newest instant every sensor has reported past.
+        with self.lock:
+            sensors = list(self.sensors.values())
+        if not sensors:
+            return None
+        if t is None:
+            latest = [tfm.ring.latest() for tfm in sensors]
+            if any(sample is None for sample in latest):
+                return None
+            t = min(sample['timestamp'] for sample in latest)
+        samples = np.zeros(len(sensors), dtype=SAMPLE_DTYPE)
+        for i, tfm in enumerate(sensors):
+            sample = tfm.ring.at(t)
+            if sample is not None:
+                samples[i] = sample
+        return samples
+
+    def stats(self):
+        now = time.monotonic()
+        report = {}
+        with self.lock:
+            for name, tfm in self.sensors.items():
+                count, then = self.lastStats[name]
+                frames = tfm.ring.count
+                self.lastStats[name] = (frames, now)
+                report[name] = {
+                    'rate': (frames - count) / (now - then) if now > then else 0.0,
+                    'frames': frames,
+                    'checksumErrors': tfm.parser.checksumErrors,
+                    'droppedBytes': tfm.parser.droppedBytes,
+                }
+        return report
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def close(self):
+        self.stop()
+        for name in list(self.sensors):
+            self.remove(name)
+        self.selector.close()
+
+    def _run(self):
+        period = 1 / self.publishRate if self.publishRate else None
+        nextPublish = time.monotonic()
+        while self.running:
+            if period is None:
+                self.poll(0.1)
+                continue
+            self.poll(max(0.0, nextPublish - time.monotonic()))
+            now = time.monotonic()
+            if now >= nextPublish:
+                nextPublish = max(nextPublish + period, now)
+                samples = self.aligned()
+                if samples is not None:
+                    for callback in self.callbacks:
+                        callback(now, samples)
+
+
+if __name__ == "__main__":
+    import sys
+    hub = LidarHub(publishRate=10)
+    for i, port in enumerate(sys.argv[1:] or ["/dev/ttyUSB0"]):
+        hub.add(f"lidar{i}", port)
+    hub.register_callback(lambda t, samples: print(t, samples['dist']))
+    hub.start()
+    try:
+        while True:
+            time.sleep(1)
+            print(hub.stats())
+    except KeyboardInterrupt:
+        hub.close()
@@ -0,0 +1,193 @@
+import os
+import mmap
+import time
+import select
+import struct
+import numpy as np
+from lidarDecode import frameStatus
+from lidarRing import SAMPLE_DTYPE
+from lidarPty import PtyTFMiniPlus
+
+# Layout: one file header, then fixed-size chunks. Every chunk starts with an index block holding
+# the chunk's first timestamp and is followed by up to `chunkRecords` fixed-size records, so the
+# offset of any chunk or record is arithmetic and a timestamp seek is two binary searches.
+MAGIC = b'TFMPLOG1'
+FILE_HEADER = struct.Struct('<8sHHI16x')
+INDEX_MAGIC = b'TFIX'
+INDEX_BLOCK = struct.Struct('<4sId')
+RECORD = struct.Struct('<d9s')
+RECORD_DTYPE = np.dtype([('timestamp', '<f8'), ('frame', 'u1', (9,))])
+VERSION = 1
+
+
+class LidarRecorder:
+    def __init__(self, path, chunkRecords=4096):
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path) >= FILE_HEADER.size:
+            self.file = open(path, 'r+b')
+            magic, version, recordSize, self.chunkRecords = FILE_HEADER.unpack(self.file.read(FILE_HEADER.size))
+            if magic != MAGIC or recordSize != RECORD.size:
+                raise ValueError(f"{path} is not a lidar log")
+            self.count = self._recover()
+        else:
+            self.file = open(path, 'wb')
+            self.chunkRecords = chunkRecords
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION, RECORD.size, chunkRecords))
+            self.count = 0
+
+    def _recover(self):
+        # Continue after the last whole record; a torn record or index block from a crash is cut off.
+        chunkSize = INDEX_BLOCK.size + self.chunkRecords * RECORD.size
+        body = os.path.getsize(self.path) - FILE_HEADER.size
+        chunks, rest = divmod(body, chunkSize)
+        records = max(rest - INDEX_BLOCK.size, 0) // RECORD.size
+        end = FILE_HEADER.size + chunks * chunkSize
+        if records:
+            end += INDEX_BLOCK.size + records * RECORD.size
+        self.file.truncate(end)
+        self.file.seek(end)
+        return chunks * self.chunkRecords + records
+
+    def write(self, timestamp, frame):
+        chunk, index = divmod(self.count, self.chunkRecords)
+        if index == 0:
+            self.file.write(INDEX_BLOCK.pack(INDEX_MAGIC, chunk, timestamp))
+        self.file.write(RECORD.pack(timestamp, bytes(frame)))
+        self.count += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class LidarLog:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, recordSize, self.chunkRecords = FILE_HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or recordSize != RECORD.size:
+            raise ValueError(f"{path} is not a lidar log")
+        self.chunkSize = INDEX_BLOCK.size + self.chunkRecords * RECORD.size
+        chunks, rest = divmod(len(self.map) - FILE_HEADER.size, self.chunkSize)
+        self.count = chunks * self.chunkRecords + max(rest - INDEX_BLOCK.size, 0) // RECORD.size
+        self.chunks = -(-self.count // self.chunkRecords)
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def _chunkOffset(self, chunk):
+        return FILE_HEADER.size + chunk * self.chunkSize
+
+    def chunkStart(self, chunk):
+        magic, number, timestamp = INDEX_BLOCK.unpack_from(self.map, self._chunkOffset(chunk))
+        if magic != INDEX_MAGIC or number != chunk:
+            raise ValueError(f"corrupt index block {chunk}")
+        return timestamp
+
+    def chunk(self, chunk):
+        count = min(self.chunkRecords, self.count - chunk * self.chunkRecords)
+        offset = self._chunkOffset(chunk) + INDEX_BLOCK.size
+        return np.frombuffer(self.map, dtype=RECORD_DTYPE, count=count, offset=offset)
+
+    def seek(self, t):
+        # Index of the first record with timestamp >= t.
+        lo, hi = 0, self.chunks
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.chunkStart(mid) < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return 0
+        chunk = lo - 1
+        return chunk * self.chunkRecords + int(np.searchsorted(self.chunk(chunk)['timestamp'], t))
+
+    def records(self, start=0, stop=None):
+        # Yields record views chunk by chunk; nothing is copied out of the map.
+        stop = self.count if stop is None else min(stop, self.count)
+        while start < stop:
+            chunk, index = divmod(start, self.chunkRecords)
+            records = self.chunk(chunk)[index:index + stop - start]
+            yield records
+            start += len(records)
+
+    def samples(self, start=0, stop=None):
+        parts = []
+        for records in self.records(start, stop):
+            frame = records['frame'].astype(np.int32)
+            part = np.empty(len(records), dtype=SAMPLE_DTYPE)
+            part['timestamp'] = records['timestamp']
+            part['dist'] = frame[:, 2] | frame[:, 3] << 8
+            part['flux'] = frame[:, 4] | frame[:, 5] << 8
+            part['temp'] = ((frame[:, 6] | frame[:, 7] << 8) >> 3) - 256
+            part['status'] = frameStatus(part['dist'], part['flux'])
+            parts.append(part)
+        return np.concatenate(parts) if parts else np.empty(0, dtype=SAMPLE_DTYPE)
+
+
+class LogReplayer(PtyTFMiniPlus):
+    # Plays a log back through a pty, like a sensor would. speed=1 is real time, N is N times
+    # faster and 0 sends as fast as the reader takes it.
+    def __init__(self, log, speed=1.0, start=None):
+        super().__init__(rate=0)
+        self.log = log
+        self.speed = speed
+        self.startIndex = log.seek(start) if start is not None else 0
+        self.finished = False
+
+    def _send(self, data):
+        view = memoryview(data)
+        while view and self.running:
+            written = self.write(view)
+            view = view[written:]
+            if view:
+                select.select([], [self.master], [], 0.01)
+
+    def _run(self):
+        t0 = time.perf_counter()
+        base = None
+        for records in self.log.records(self.startIndex):
+            stamps = records['timestamp']
+            if base is None:
+                base = stamps[0]
+            i = 0
+            while i < len(records) and self.running:
+                self._receive()
+                j = len(records)
+                if self.speed:
+                    now = base + (time.perf_counter() - t0) * self.speed
+                    j = int(np.searchsorted(stamps, now, side='right'))
+                    if j == i:
+                        select.select([self.master], [], [], min((stamps[i] - now) / self.speed, 0.01))
+                        continue
+                self._send(records['frame'][i:j].tobytes() + self.replies)
+                self.replies.clear()
+                self.framesSent += j - i
+                i = j
+            if not self.running:
+                return
+        self.finished = True
+        while self.running:
+            select.select([self.master], [], [], 0.01)
+            self._receive()
+            if self.replies:
+                self._send(bytes(self.replies))
+                self.replies.clear()
+
+
+if __name__ == "__main__":
+    import sys
+    log = LidarLog(sys.argv[1])
+    print(f"{len(log)} records in {log.chunks} chunks")
+    if len(log):
+        samples = log.samples()
+        print(f"{samples['timestamp'][0]:.3f} .. {samples['timestamp'][-1]:.3f}")
+        print(samples[:10])
+    log.close()
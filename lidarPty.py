@@ -0,0 +1,139 @@
+import os
+import tty
+import fcntl
+import struct
+import threading
+
+FRAME_SIZE = 9
+TCGETS2 = 0x802C542A
+TERMIOS2 = struct.Struct('<4I20x2I')
+
+
+def buildFrame(dist, flux, temp):
+    frame = bytearray(b'\x59\x59')
+    frame += struct.pack('<HHH', dist, flux, (temp + 256) << 3)
+    frame.append(sum(frame) & 0xFF)
+    return bytes(frame)
+
+
+class PtyTFMiniPlus:
+    # A TFMini-Plus on a pseudo terminal: open `port` with serial.Serial like the real device. It
+    # answers commands as the sensor does; subclasses provide _run(), which decides what frames go
+    # out (fakeLidar.FakeTFMiniPlus synthesizes them, lidarLog.LogReplayer plays a log).
+    # rate is the free-running frame rate in Hz; 0 means triggered mode, as on the device.
+    # baud=None follows whatever rate the host opens the port at; with a baud set, the sensor only
+    # talks at that rate, honors SET_BAUD_RATE and cannot stream more than the line carries.
+    def __init__(self, rate=100, baud=None):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+        self.rate = rate
+        self.baud = baud
+        self.acceptBaud = True
+        self.pendingBaud = None
+        self.temp = 40
+        self.version = bytes((7, 0, 2))
+        self.output = True
+        self.ignoreCommands = False
+        # Every loseTriggers-th triggered frame is lost on the line; 0 loses none.
+        self.loseTriggers = 0
+        self.framesSent = 0
+        self.framesDropped = 0
+        self.commands = []
+        self.rxBuffer = bytearray()
+        self.replies = bytearray()
+        self.running = False
+        self.thread = None
+
+    def measure(self, n):
+        return 100 + n % 500, 1000 + n % 97
+
+    def frame(self, n):
+        dist, flux = self.measure(n)
+        return buildFrame(dist, flux, self.temp)
+
+    def hostBaud(self):
+        return TERMIOS2.unpack(fcntl.ioctl(self.slave, TCGETS2, bytes(TERMIOS2.size)))[-1]
+
+    def linked(self):
+        return self.baud is None or self.hostBaud() == self.baud
+
+    def write(self, data):
+        try:
+            return os.write(self.master, data)
+        except BlockingIOError:
+            return 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def close(self):
+        self.stop()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def reply(self, data):
+        data = bytearray(data)
+        data.append(sum(data) & 0xFF)
+        self.replies += data
+
+    def handleCommand(self, cmnd):
+        cmdId = cmnd[2]
+        self.commands.append(bytes(cmnd))
+        if self.ignoreCommands:
+            return
+        if cmdId == 0x01:
+            self.reply(b'\x5A\x07\x01' + self.version)
+        elif cmdId in (0x02, 0x10, 0x11):
+            self.reply(bytes((0x5A, 0x05, cmdId, 0)))
+        elif cmdId == 0x03:
+            self.replies += cmnd
+            self.rate = int.from_bytes(cmnd[3:5], 'little')
+        elif cmdId == 0x06:
+            self.replies += cmnd
+            if self.acceptBaud:
+                self.pendingBaud = int.from_bytes(cmnd[3:6], 'little')
+        elif cmdId == 0x04:
+            frame = self.frame(self.framesSent)
+            self.framesSent += 1
+            if self.loseTriggers and self.framesSent % self.loseTriggers == 0:
+                self.framesDropped += 1
+            else:
+                self.replies += frame
+        elif cmdId == 0x07:
+            self.replies += cmnd
+            self.output = bool(cmnd[3])
+        else:
+            self.replies += cmnd
+
+    def _receive(self):
+        try:
+            self.rxBuffer += os.read(self.master, 256)
+        except (BlockingIOError, OSError):
+            return
+        if not self.linked():
+            # Bytes sent at the wrong baud arrive as garbage.
+            self.rxBuffer.clear()
+            return
+        while True:
+            start = self.rxBuffer.find(0x5A)
+            if start < 0:
+                self.rxBuffer.clear()
+                return
+            del self.rxBuffer[:start]
+            if len(self.rxBuffer) < 2 or len(self.rxBuffer) < self.rxBuffer[1]:
+                return
+            length = self.rxBuffer[1]
+            cmnd = self.rxBuffer[:length]
+            del self.rxBuffer[:length]
+            if length >= 4 and sum(cmnd[:-1]) & 0xFF == cmnd[-1]:
+                self.handleCommand(cmnd)
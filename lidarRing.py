@@ -0,0 +1,67 @@
+import threading
+import numpy as np
+
+SAMPLE_DTYPE = np.dtype([
+    ('timestamp', 'f8'),
+    ('dist', 'i4'),
+    ('flux', 'i4'),
+    ('temp', 'i2'),
+    ('status', 'u1'),
+])
+
+
+class LidarRing:
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=SAMPLE_DTYPE)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, timestamp, dist, flux, temp, status):
+        with self.lock:
+            self.data[self.count % self.capacity] = (timestamp, dist, flux, temp, status)
+            self.count += 1
+
+    def clear(self):
+        with self.lock:
+            self.count = 0
+
+    def _segments(self, n):
+        end = self.count % self.capacity
+        start = (self.count - n) % self.capacity
+        if n == 0:
+            return [self.data[:0]]
+        if start < end:
+            return [self.data[start:end]]
+        return [self.data[start:], self.data[:end]]
+
+    def latest(self):
+        with self.lock:
+            if self.count == 0:
+                return None
+            return self.data[(self.count - 1) % self.capacity].copy()
+
+    def window(self, n):
+        with self.lock:
+            n = min(n, self.count, self.capacity)
+            return np.concatenate(self._segments(n))
+
+    def at(self, t):
+        # Newest sample taken at or before t.
+        with self.lock:
+            for segment in reversed(self._segments(min(self.count, self.capacity))):
+                i = np.searchsorted(segment['timestamp'], t, side='right')
+                if i:
+                    return segment[i - 1].copy()
+            return None
+
+    def since(self, t):
+        with self.lock:
+            segments = self._segments(min(self.count, self.capacity))
+            return np.concatenate([
+                segment[np.searchsorted(segment['timestamp'], t, side='right'):]
+                for segment in segments
+            ])
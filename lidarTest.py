@@ -88,7 +88,9 @@ TFMP_MEASURE      = 13
 def begin( port, rate):
     ''' Set serial port and test for data'''
     global pStream
-    pStream = serial.Serial( port, rate)
+    #  Reads block in the driver for up to 100ms
+    #  instead of spinning on inWaiting().
+    pStream = serial.Serial( port, rate, timeout = 0.1)
     time.sleep(0.2)             #  Give port 200ms to initalize
     if pStream.inWaiting() > 0:    #  If data present...
         status = TFMP_READY     #  return status as READY
@@ -121,7 +123,7 @@ def getData():
     #  - - - - - - - - - - - - - - - - - - - - - - - - - - - -
     #  Set 1 second timeout if HEADER code never appears
     #  or serial data never becomes available.
-    serialTimeout = time.time() + 1000
+    serialTimeout = time.time() + 1
     #  Flush all but last frame of data from the serial buffer.
     while( pStream.inWaiting() > TFMP_FRAME_SIZE):
         pStream.read()
@@ -131,9 +133,11 @@ def getData():
     #  two bytes in the array.
     frame = bytearray( TFMP_FRAME_SIZE)   #  'frame' data buffer
     while( frame[ 0] != 0x59) or ( frame[ 1] != 0x59):
-        if pStream.inWaiting():
+        #  Wait (without using CPU) for up to the port timeout for 1 byte.
+        byte = pStream.read()
+        if byte:
             #  Read 1 byte into the 'frame' plus one position.
-            frame.append( pStream.read()[0])
+            frame.append( byte[0])
             #  Shift entire length of 'frame' one byte left.
             frame = frame[ 1:]
         #  If no HEADER or serial data not available
@@ -290,7 +294,7 @@ def sendCommand( cmnd, param):
     #  - - - - - - - - - - - - - - - - - - - - - - - - - - - -
     #  Set a one second timer to timeout if HEADER never appears
     #  or serial data never becomes available
-    serialTimeout = time.time() + 1000
+    serialTimeout = time.time() + 1
     #  Establish 'reply' bytearray and fill with zeros
     reply = bytearray( replyLen)
     
@@ -300,9 +304,11 @@ def sendCommand( cmnd, param):
     #  4) Repeat until 'HEADER' and 'replyLen'
     #     appear as first two bytes in array.
     while( reply[ 0] != 0x5A) or (reply[ 1] != replyLen):
-        if( pStream.inWaiting()):
+        #  Wait (without using CPU) for up to the port timeout for 1 byte.
+        byte = pStream.read()
+        if( byte):
             #  Read 1 byte into the 'frame' plus one position.
-            reply.append( pStream.read()[0])
+            reply.append( byte[0])
             #  Shift entire length of 'frame' one byte left.
             reply = reply[ 1:]
         #  If HEADER/replyLen combo does do not
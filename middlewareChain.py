@@ -0,0 +1,188 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cameraPipeline import LatencyHistogram
+from framePyramid import View, FramePyramid
+
+
+class Stage:
+    # One middleware step.
+    #   mutates    - the function draws on the frame or returns a replacement. A stage that does not
+    #                mutate only reads the frame; whatever it returns is kept in `result`.
+    #   every      - run on every Nth frame.
+    #   budgeted   - optional: only run when the frame budget has room for it (judged by its recent
+    #                latency). On overrun it is skipped, or deferred to the next frame.
+    #   concurrent - the function is thread safe: it may run on several frames at once (one per
+    #                processing worker) and, if it does not mutate, in parallel with neighbouring
+    #                concurrent read-only stages. Other stages run on one frame at a time.
+    #   view       - read-only stages can be handed a named view of the frame (see MiddlewareChain.add_view)
+    #                instead of the full frame.
+    #   meta       - call function(frame, meta), where meta is the pooled framePool.Frame with the frame's
+    #                capture sequence number (meta.index) and timestamp (meta.captured).
+    def __init__(self, name, function, mutates=True, every=1, budgeted=False, concurrent=False, overrun='skip',
+                 view=None, meta=False):
+        if overrun not in ('skip', 'defer'):
+            raise ValueError(f"stage {name}: overrun must be 'skip' or 'defer'")
+        if view is not None and mutates:
+            raise ValueError(f"stage {name}: only stages that do not mutate can use a view")
+        self.name = name
+        self.function = function
+        self.mutates = mutates
+        self.every = every
+        self.budgeted = budgeted
+        self.concurrent = concurrent
+        self.overrun = overrun
+        self.view = view
+        self.meta = meta
+        self.histogram = LatencyHistogram()
+        self.expected = 0.0
+        self.result = None
+        self.pending = False
+        self.skipped = 0
+        self.deferred = 0
+        self.lock = threading.Lock()
+        self.running = None if concurrent else threading.Lock()
+
+    def due(self, index):
+        return self.pending or index % self.every == 0
+
+    def fits(self, elapsed, budget):
+        with self.lock:
+            if not self.budgeted or budget is None or elapsed + self.expected <= budget:
+                self.pending = False
+                return True
+            if self.overrun == 'defer':
+                self.pending = True
+                self.deferred += 1
+            else:
+                self.skipped += 1
+            return False
+
+    def run(self, frame, meta=None):
+        args = (frame, meta) if self.meta else (frame,)
+        if self.running:
+            with self.running:
+                start = time.perf_counter()
+                result = self.function(*args)
+                elapsed = time.perf_counter() - start
+        else:
+            start = time.perf_counter()
+            result = self.function(*args)
+            elapsed = time.perf_counter() - start
+        with self.lock:
+            self.histogram.add(elapsed)
+            self.expected += 0.2 * (elapsed - self.expected) if self.histogram.count > 1 else elapsed
+        if not self.mutates:
+            self.result = result
+            return frame
+        return frame if result is None else result
+
+    def stats(self):
+        with self.lock:
+            stats = self.histogram.snapshot()
+        stats.update({'skipped': self.skipped, 'deferred': self.deferred, 'expected': self.expected})
+        return stats
+
+
+class MiddlewareChain:
+    # Ordered stages, callable like a single middleware. `budget` is the time one frame may spend
+    # in the chain; budgeted stages give way when the stages before them used it up. Safe to call
+    # from several processing workers at once.
+    #
+    # Views are resized and/or cropped copies of the frame that stages ask for by name. They are
+    # computed once per frame, on first use, shared by all stages, and recomputed after a stage
+    # that mutates the frame.
+    def __init__(self, *stages, budget=None):
+        self.stages = list(stages)
+        self.budget = budget
+        self.views = {}
+        self.index = 0
+        self.views_computed = 0
+        self.views_shared = 0
+        self.histogram = LatencyHistogram()
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def add_view(self, name, size=None, roi=None, **options):
+        self.views[name] = View(name, size, roi, **options)
+        return self.views[name]
+
+    def add(self, name, function, **options):
+        stage = Stage(name, function, **options)
+        if stage.view is not None and stage.view not in self.views:
+            raise ValueError(f"stage {name}: unknown view {stage.view!r}")
+        self.stages.append(stage)
+        return stage
+
+    def __getitem__(self, name):
+        return next(stage for stage in self.stages if stage.name == name)
+
+    def __call__(self, frame, meta=None):
+        start = time.perf_counter()
+        with self.lock:
+            index = self.index
+            self.index += 1
+        pyramid = FramePyramid(frame, self.views) if self.views else None
+        group = []
+        for stage in self.stages:
+            if not stage.due(index):
+                continue
+            if stage.concurrent and not stage.mutates:
+                if stage.fits(time.perf_counter() - start, self.budget):
+                    group.append(stage)
+                continue
+            frame = self._run_group(group, frame, pyramid, meta)
+            group = []
+            if stage.fits(time.perf_counter() - start, self.budget):
+                if stage.mutates:
+                    frame = stage.run(frame, meta)
+                    if pyramid:
+                        pyramid.invalidate(frame)
+                else:
+                    self._run_stage(stage, frame, pyramid, meta)
+        frame = self._run_group(group, frame, pyramid, meta)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.histogram.add(elapsed)
+            if pyramid:
+                self.views_computed += pyramid.computed
+                self.views_shared += pyramid.hits
+        return frame
+
+    def _run_stage(self, stage, frame, pyramid, meta):
+        return stage.run(frame if stage.view is None else pyramid[stage.view], meta)
+
+    def _run_group(self, group, frame, pyramid, meta):
+        # Concurrent stages only read the frame, so they can share it without copies.
+        if len(group) > 1:
+            with self.lock:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(thread_name_prefix="middleware")
+            futures = [self.executor.submit(self._run_stage, stage, frame, pyramid, meta) for stage in group[1:]]
+            self._run_stage(group[0], frame, pyramid, meta)
+            for future in futures:
+                future.result()
+        elif group:
+            self._run_stage(group[0], frame, pyramid, meta)
+        return frame
+
+    def stats(self):
+        stats = {stage.name: stage.stats() for stage in self.stages}
+        with self.lock:
+            stats['chain'] = self.histogram.snapshot()
+            if self.views:
+                stats['chain'].update({'views_computed': self.views_computed, 'views_shared': self.views_shared})
+        return stats
+
+    def print_stats(self):
+        for name, s in self.stats().items():
+            line = (f"{name:12s} runs {s['count']:6d}  p50 {s['p50'] * 1e3:7.2f} ms  p95 {s['p95'] * 1e3:7.2f} ms  "
+                    f"max {s['max'] * 1e3:7.2f} ms")
+            if 'skipped' in s:
+                line += f"  skipped {s['skipped']}  deferred {s['deferred']}"
+            print(line)
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown()
+            self.executor = None
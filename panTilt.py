@@ -1,19 +1,38 @@
 import board
 from adafruit_motor import servo as AdafruitServo
 from adafruit_pca9685 import PCA9685
+from servoScheduler import ServoScheduler
 i2c = board.I2C()
 
 class PanTilt:
-    def __init__(self, channel_x, channel_y, i2c=i2c):
+    def __init__(self, channel_x, channel_y, i2c=i2c, scheduled=False):
         self.pca = PCA9685(i2c)
         self.pca.frequency = 50
+        self.channel_x = channel_x
+        self.channel_y = channel_y
 
         self.servo_X = AdafruitServo.Servo(self.pca.channels[channel_x], min_pulse=500, max_pulse=2600, actuation_range=180)
         self.servo_Y = AdafruitServo.Servo(self.pca.channels[channel_y], min_pulse=500, max_pulse=2600, actuation_range=180)
 
+        # scheduled: set_pan_tilt() returns at once and a ServoScheduler thread writes the latest
+        # angles, only when they change, at most once per PWM period, both channels in one write.
+        self.scheduler = None
+        if scheduled:
+            self.scheduler = ServoScheduler(self.pca.i2c_device, frequency=self.pca.frequency,
+                                            min_pulse=500, max_pulse=2600, actuation_range=180)
+            self.scheduler.start()
+
     def set_pan_tilt(self, pan, tilt):
+        if self.scheduler:
+            self.scheduler.set({self.channel_x: pan, self.channel_y: tilt})
+            return
         self.servo_X.angle = pan
         self.servo_Y.angle = tilt
 
     def center(self):
-        self.set_pan_tilt(90, 90)
\ No newline at end of file
+        self.set_pan_tilt(90, 90)
+
+    def close(self):
+        if self.scheduler:
+            self.scheduler.stop()
+            print(self.scheduler.summary())
@@ -0,0 +1,129 @@
+import sys
+import math
+import time
+import threading
+import numpy as np
+from servoScheduler import ServoScheduler
+from fakeServo import FakePCA9685, DirectServos
+
+
+def gamepad_workload(servos, seconds, framerate=60, stick_rate=50, toggle=1.0):
+    # servoGampad's servo traffic: the sticks (both circling) set the angles 50 times a second
+    # while the joystick is active, and every camera frame centers the servos while it is not;
+    # triangle toggles between the two every `toggle` seconds. Returns the time set() took per
+    # call and the last target.
+    calls, last = [], [None]
+    lock = threading.Lock()
+    start = time.monotonic()
+
+    def active(now):
+        return int((now - start) / toggle) % 2 == 0
+
+    def send(targets):
+        began = time.perf_counter()
+        with lock:
+            servos.set(targets)
+            last[0] = targets
+        calls.append(time.perf_counter() - began)
+
+    def frames():
+        for n in range(int(seconds * framerate)):
+            time.sleep(max(start + n / framerate - time.monotonic(), 0))
+            if not active(time.monotonic()):
+                send({0: 90, 1: 90})
+
+    def sticks():
+        for n in range(int(seconds * stick_rate)):
+            time.sleep(max(start + n / stick_rate - time.monotonic(), 0))
+            if active(time.monotonic()):
+                phase = 2 * math.pi * n / stick_rate
+                send({0: int(90 + 80 * math.cos(phase)), 1: int(90 + 80 * math.sin(phase))})
+
+    threads = [threading.Thread(target=frames), threading.Thread(target=sticks)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(calls), last[0]
+
+
+def bench_scheduler(seconds, stick_rate=50, bus_speed=100000):
+    # stick_rate 50 is servoGampad's max_rate; 250 is a controller without coalescing.
+    for label in ("direct", "scheduled"):
+        device = FakePCA9685(bus_speed)
+        scheduler = ServoScheduler(device)
+        servos = scheduler if label == "scheduled" else DirectServos(device, scheduler.registers)
+        if label == "scheduled":
+            scheduler.start()
+        calls, last = gamepad_workload(servos, seconds, stick_rate=stick_rate)
+        if label == "scheduled":
+            scheduler.stop()
+        writes = np.array([t for t, _ in device.history.get(0, [])])
+        gaps = np.diff(writes) * 1e3 if len(writes) > 1 else np.zeros(1)
+        final = all(device.registers[6 + 4 * channel:10 + 4 * channel]
+                    == bytes(b for value in scheduler.registers(angle) for b in (value & 0xFF, value >> 8))
+                    for channel, angle in last.items())
+        print(f"servo  sticks {stick_rate:3d}/s {label:9s} {len(calls) / seconds:6.1f} set()/s  I2C writes {device.transactions / seconds:6.1f}/s  "
+              f"{device.bytes / seconds:6.0f} bytes/s  bus busy {device.busy / seconds * 100:4.1f}%  "
+              f"set() p50 {np.percentile(calls, 50) * 1e3:6.3f} ms max {calls.max() * 1e3:6.3f} ms  "
+              f"channel 0 write gap min {gaps.min():5.1f} ms  final registers match {final}")
+        assert final, f"{label}: PCA9685 registers differ from the last target {last}"
+        if label == "scheduled":
+            print(scheduler.summary())
+            stats = scheduler.stats()
+            # One period of slack for the flush in stop().
+            assert gaps.min() >= scheduler.period * 1e3 * 0.95, f"channel 0 written {gaps.min():.1f} ms apart"
+            assert device.transactions <= seconds / scheduler.period + 2, f"{device.transactions} I2C writes in {seconds} s"
+            assert stats['redundant'] > 0 and stats['channel_writes'] < stats['requested'], f"nothing deduplicated: {stats}"
+            assert stats['errors'] == 0
+
+
+def bench_errors():
+    # A failed write is retried with the next one, unless a newer target replaced it.
+    device = FakePCA9685()
+    scheduler = ServoScheduler(device)
+    scheduler.start()
+    device.fail = 1
+    scheduler.set({0: 30, 1: 150})
+    time.sleep(0.1)
+    scheduler.stop()
+    print(f"servo  after a failed write: pulses {device.pulse(0):.0f} us / {device.pulse(1):.0f} us  "
+          f"errors {scheduler.errors}  I2C writes {device.transactions}")
+    assert scheduler.errors == 1 and device.transactions == 1, "failed write was not retried once"
+    assert (device.on(0), device.off(0)) == scheduler.registers(30) and (device.on(1), device.off(1)) == scheduler.registers(150)
+
+
+def bench_dedup():
+    # Targets equal to what the chip has are never written; a target set back before its write goes
+    # out cancels it; consecutive channels share one block write.
+    device = FakePCA9685()
+    scheduler = ServoScheduler(device)
+    scheduler.start()
+    scheduler.set({0: 90, 1: 90})
+    time.sleep(0.05)
+    writes = device.transactions
+    for _ in range(100):
+        scheduler.set({0: 90, 1: 90})
+    time.sleep(0.05)
+    unchanged = device.transactions - writes
+    scheduler.set({0: 45})
+    scheduler.set({0: 90})
+    time.sleep(0.05)
+    cancelled = device.transactions - writes
+    scheduler.set({2: 10, 3: 20, 5: 30})
+    scheduler.stop()
+    blocks = device.transactions - writes
+    stats = scheduler.stats()
+    print(f"servo  dedup: first write {writes} I2C write(s) for 2 channels, 100 unchanged -> {unchanged}, "
+          f"set and set back -> {cancelled}, channels 2, 3, 5 -> {blocks} writes  {stats['redundant']} unchanged")
+    assert writes == 1 and unchanged == 0 and cancelled == 0 and blocks == 2, (writes, unchanged, cancelled, blocks)
+    assert [device.off(channel) for channel in (0, 1, 2, 3, 5)] == \
+        [scheduler.registers(angle)[1] for angle in (90, 90, 10, 20, 30)]
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+    bench_scheduler(seconds)
+    bench_scheduler(seconds, stick_rate=250)
+    bench_errors()
+    bench_dedup()
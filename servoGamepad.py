@@ -5,7 +5,8 @@ from panTilt import PanTilt
 from camera import CSICamera
 from lidar import TFMiniPlus
 
-pan_tilt = PanTilt(channel_x=0, channel_y=1)
+# Scheduled: centering on every frame only reaches I2C when the angles change.
+pan_tilt = PanTilt(channel_x=0, channel_y=1, scheduled=True)
 pan_tilt.center()
 
 # Utils
@@ -57,7 +58,8 @@ camera = CSICamera(
     display_width=1280, display_height=720, framerate=60, 
     flip_method=6, middleware=frame_middleware
     )
-controller = DualShockController('/dev/input/event9')
+# Stick snapshots at most at the servos' 50 Hz PWM rate.
+controller = DualShockController('/dev/input/event9', max_rate=50)
 
 
 
@@ -83,9 +85,9 @@ def trigger_callback(event_type, trigger_event_type, value):
         print(f'trigger {trigger_event_type} {value}')
         if trigger_event_type == 'R2':
             if value == "down":
-                camera.start()
+                camera.resume()
             elif value == "up":
-                camera.stop()
+                camera.pause()
 
 
 
@@ -95,6 +97,8 @@ if __name__ == '__main__':
     controller.register_callback(trigger_callback)
     controller.register_callback(joystick_activate_callback)
     
+    # Opened once and kept warm; R2 only switches the view on and off.
+    camera.open()
     controller.start()
 
     try:
@@ -102,6 +106,8 @@ if __name__ == '__main__':
             time.sleep(0)
     except KeyboardInterrupt:
         controller.stop()
+        camera.stop()
+        pan_tilt.close()
         if tfm.pStream:
             tfm.pStream.close()
         print("Controller stopped.")
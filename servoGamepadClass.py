@@ -3,7 +3,9 @@ import cv2
 from dualSense import DualShockController
 from panTilt import PanTilt
 from camera import CSICamera
+from cameraSinks import MjpegSink
 from lidar import TFMiniPlus
+from lidarFilter import defaultFilter
 
 
 def center_dot_with_number(frame, number_value):
@@ -24,73 +26,132 @@ def center_dot_with_number(frame, number_value):
     return frame
 
 class servoGampad:
-    def __init__(self, pan_channel_x=0, pan_channel_y=1, camera_device="/dev/input/event9", lidar_port="/dev/ttyUSB0", baudrate=115200):
-        self.pan_tilt = PanTilt(channel_x=pan_channel_x, channel_y=pan_channel_y)
+    def __init__(self, pan_channel_x=0, pan_channel_y=1, camera_device="/dev/input/event9", lidar_port="/dev/ttyUSB0", baudrate=115200, lidar_rate=None, lidar_triggered=False, stream_port=None,
+                 record=None, replay=None, replay_speed=1.0):
+        # Scheduled: the per-frame centering and 50 Hz stick updates only reach I2C when the angles change.
+        self.pan_tilt = PanTilt(channel_x=pan_channel_x, channel_y=pan_channel_y, scheduled=True)
         self.pan_tilt.center()
 
         self.tfm = TFMiniPlus()
         self.tfm.begin(lidar_port, baudrate)
+        if lidar_rate:
+            self.tfm.configure(lidar_rate)
         self.tfm.printStatus()
+        # lidar_triggered: one measurement per captured frame instead of the free-running stream. It
+        # stops the sensor's own output (FRAME_0) until stopTriggered() on exit.
+        self.lidar_triggered = lidar_triggered and self.tfm.startTriggered()
+        if self.lidar_triggered:
+            capture_callback = self.tfm.trigger
+        else:
+            self.tfm.startAcquisition()
+            capture_callback = None
+        self.lidar_filter = defaultFilter()
+        self.lidar_seen = 0.0
+        self.lidar_value = None
 
         self.camera = CSICamera(
             capture_width=1280, capture_height=720,
             display_width=1280, display_height=720, framerate=60,
-            flip_method=6, middleware=self.frame_middleware
+            flip_method=6, capture_callback=capture_callback,
+            # Headless: serve MJPEG on stream_port instead of opening a window.
+            sinks=[MjpegSink(port=stream_port)] if stream_port else None
         )
-
-        self.controller = DualShockController(camera_device)
+        self.camera.add_middleware("center", self.center_middleware, mutates=False)
+        self.camera.add_middleware("lidar", self.lidar_middleware, mutates=False)
+        self.camera.add_middleware("overlay", self.overlay_middleware)
+        # Opened once and kept warm; R2 only switches the view on and off.
+        self.camera.open()
+
+        # record: log the pad's raw events to this file. replay: play such a log in place of the pad,
+        # through the controller's own read loop, and print per-callback latency on exit.
+        self.recorder = self.replayer = self.profiler = None
+        if replay:
+            # Imported here: the replay tooling and its stand-in pad are not needed to drive hardware.
+            from controllerLog import ControllerLog, ControllerReplayer
+            from fakeController import FakeInputDevice
+            camera_device = FakeInputDevice(name="Replayed DualSense")
+            self.replayer = ControllerReplayer(ControllerLog(replay), camera_device, speed=replay_speed)
+
+        # Stick snapshots at most at the servos' 50 Hz PWM rate.
+        self.controller = DualShockController(camera_device, max_rate=50)
         self.joystick_active = True
 
-        self.controller.register_callback(self.joystick_callback)
-        self.controller.register_callback(self.trigger_callback)
-        self.controller.register_callback(self.joystick_activate_callback)
+        self.controller.subscribe('joystick', self.joystick_callback)
+        self.controller.subscribe('button', self.trigger_callback)
+        self.controller.subscribe('button', self.joystick_activate_callback, 'triangle')
+        if record:
+            from controllerLog import ControllerRecorder
+            self.recorder = ControllerRecorder(record)
+            self.controller.taps.append(self.recorder)
+        if replay:
+            from controllerLog import CallbackProfiler
+            self.profiler = CallbackProfiler()
+            self.profiler.instrument(self.controller)
         
         self.controller.start()
+        if self.replayer:
+            self.replayer.start()
 
-    def frame_middleware(self, frame):
-
-
+    def center_middleware(self, frame):
         if not self.joystick_active:
             self.pan_tilt.set_pan_tilt(90, 90)
 
-        dataSuccess = self.tfm.getData()
+    def lidar_middleware(self, frame):
+        for sample in self.tfm.since(self.lidar_seen):
+            self.lidar_seen = sample['timestamp']
+            value = self.lidar_filter.update(self.lidar_seen, int(sample['dist']), int(sample['flux']), int(sample['status']))
+            if value is not None:
+                self.lidar_value = (self.lidar_seen, value)
+
+    def overlay_middleware(self, frame):
         number_value = None
-        if dataSuccess:
-            number_value = self.tfm.dist
-        else:
-            number_value = self.tfm.printStatus()
+        if self.lidar_value is not None and time.monotonic() - self.lidar_value[0] < 1:
+            number_value = int(round(self.lidar_value[1]))
         return center_dot_with_number(frame, number_value)
 
     def map_value(self, x, in_min, in_max, out_min, out_max):
         return (x - in_min) * (out_max - out_min) // (in_max - in_min) + out_min
 
-    def joystick_activate_callback(self, event_type, trigger_event_type, value):
-        if event_type == 'button' and trigger_event_type == 'triangle' and value == "down":
+    def joystick_activate_callback(self, button, direction):
+        if direction == 'down':
             self.joystick_active = not self.joystick_active
             print('joystick_active', self.joystick_active)
 
-    def joystick_callback(self, event_type, left_joystick, right_joystick):
-        if event_type == 'joystick' and self.joystick_active:
+    def joystick_callback(self, left_joystick, right_joystick):
+        if self.joystick_active:
             x_value = self.map_value(left_joystick[1], 0, 255, 0, 180)
             y_value = self.map_value(right_joystick[0], 0, 255, 0, 180)
             self.pan_tilt.set_pan_tilt(x_value, y_value)
             print(f'Pan (X): {x_value}, Tilt (Y): {y_value}, joystick_active: {self.joystick_active}')
 
-    def trigger_callback(self, event_type, trigger_event_type, value):
-        if event_type == 'button':
-            print(f'trigger {trigger_event_type} {value}')
-            if trigger_event_type == 'R2':
-                if value == "down":
-                    self.camera.start()
-                elif value == "up":
-                    self.camera.stop()
+    def trigger_callback(self, button, direction):
+        print(f'trigger {button} {direction}')
+        if button == 'R2':
+            if direction == 'down':
+                self.camera.resume()
+            else:
+                self.camera.pause()
 
     def run(self):
         try:
             while True:
                 time.sleep(0)
         except KeyboardInterrupt:
+            if self.replayer:
+                self.replayer.stop()
             self.controller.stop()
+            if self.recorder:
+                self.recorder.close()
+            if self.profiler:
+                print(self.profiler.report())
+            if self.lidar_triggered:
+                self.tfm.stopTriggered()
+                print(self.tfm.triggerStats())
+            else:
+                self.tfm.stopAcquisition()
+            self.camera.stop()
+            print(self.camera.metrics.summary())
+            self.pan_tilt.close()
             if self.tfm.pStream:
                 self.tfm.pStream.close()
             print("Controller stopped.")
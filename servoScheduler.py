@@ -0,0 +1,162 @@
+import time
+import threading
+
+# PCA9685 registers: each channel has ON_L, ON_H, OFF_L, OFF_H from LED0_ON_L on, and with MODE1's
+# auto-increment bit set (adafruit_pca9685 sets it with the frequency) one I2C write can fill
+# several consecutive channels.
+LED0_ON_L = 0x06
+FULL_SCALE = 4096
+
+
+class ServoScheduler:
+    # Sends servo targets to a PCA9685 from its own thread. set() only stores the latest target per
+    # channel and returns; the thread writes what changed at most `rate` times a second (the servo
+    # PWM frequency by default: a new pulse width takes effect at the next period anyway), with
+    # consecutive channels in one register block write. A target equal to what the chip already
+    # has is never written. `device` is an adafruit_bus_device I2CDevice (PCA9685.i2c_device) or
+    # anything else with `with device: device.write(buffer)`, such as fakeServo.FakePCA9685.
+    # Pulse widths are converted as adafruit_motor.servo does, so the registers hold what a direct
+    # servo.angle write would have put there.
+    def __init__(self, device, frequency=50, min_pulse=500, max_pulse=2600, actuation_range=180, rate=None):
+        self.device = device
+        self.frequency = frequency
+        self.actuation_range = actuation_range
+        self.min_duty = int((min_pulse * frequency) / 1000000 * 0xFFFF)
+        self.duty_range = int((max_pulse * frequency) / 1000000 * 0xFFFF - self.min_duty)
+        self.period = 1.0 / (rate or frequency)
+        self.condition = threading.Condition()
+        self.pending = {}
+        self.written = {}
+        self.running = False
+        self.thread = None
+        self.last_write = float('-inf')
+        self.started = time.monotonic()
+        self.requested = 0
+        self.redundant = 0
+        self.superseded = 0
+        self.channel_writes = 0
+        self.transactions = 0
+        self.errors = 0
+
+    def registers(self, angle):
+        # (ON, OFF) counts for `angle`, as PCA9685.channels[n].duty_cycle writes them; None switches
+        # the output off.
+        duty = 0
+        if angle is not None:
+            if not 0 <= angle <= self.actuation_range:
+                raise ValueError("Angle out of range")
+            duty = self.min_duty + int(angle / self.actuation_range * self.duty_range)
+        if duty == 0xFFFF:
+            return (FULL_SCALE, 0)
+        if duty < 0x0010:
+            return (0, FULL_SCALE)
+        return (0, duty >> 4)
+
+    def start(self):
+        self.running = True
+        self.started = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name="servo-scheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        # Writes what is still pending, then joins the thread.
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        if self.pending:
+            self._wait_period()
+            self._write(self._take())
+
+    def set(self, targets):
+        # targets: {channel: angle}. Returns at once; the latest target per channel wins.
+        registers = {channel: self.registers(angle) for channel, angle in targets.items()}
+        with self.condition:
+            self.requested += len(registers)
+            wake = False
+            for channel, value in registers.items():
+                if channel in self.pending:
+                    self.superseded += 1
+                    if value == self.written.get(channel):
+                        del self.pending[channel]
+                        continue
+                elif value == self.written.get(channel):
+                    self.redundant += 1
+                    continue
+                self.pending[channel] = value
+                wake = True
+            if wake:
+                self.condition.notify()
+
+    def _take(self):
+        with self.condition:
+            pending, self.pending = self.pending, {}
+        return pending
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.running:
+                    return
+            # Targets arriving meanwhile replace the pending ones.
+            self._wait_period()
+            self._write(self._take())
+
+    def _wait_period(self):
+        delay = self.last_write + self.period - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.last_write = time.monotonic()
+
+    def _write(self, pending):
+        if not pending:
+            return
+        channels = sorted(pending)
+        runs, run = [], [channels[0]]
+        for channel in channels[1:]:
+            if channel == run[-1] + 1:
+                run.append(channel)
+            else:
+                runs.append(run)
+                run = [channel]
+        runs.append(run)
+        for run in runs:
+            buffer = bytearray([LED0_ON_L + 4 * run[0]])
+            for channel in run:
+                on, off = pending[channel]
+                buffer += bytes((on & 0xFF, on >> 8, off & 0xFF, off >> 8))
+            try:
+                with self.device:
+                    self.device.write(buffer)
+            except OSError as error:
+                # Retried with the next write unless a newer target replaces it.
+                print(f"servo write to channels {run} failed: {error}")
+                self.errors += 1
+                with self.condition:
+                    for channel in run:
+                        self.pending.setdefault(channel, pending[channel])
+                continue
+            with self.condition:
+                for channel in run:
+                    self.written[channel] = pending[channel]
+            self.transactions += 1
+            self.channel_writes += len(run)
+
+    def stats(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        avoided = self.requested - self.channel_writes
+        return {'requested': self.requested, 'redundant': self.redundant, 'superseded': self.superseded,
+                'channel_writes': self.channel_writes, 'transactions': self.transactions, 'errors': self.errors,
+                'avoided': avoided, 'avoided_per_second': avoided / elapsed,
+                'transactions_per_second': self.transactions / elapsed}
+
+    def summary(self):
+        stats = self.stats()
+        return (f"servo  {stats['requested']} channel targets, {stats['channel_writes']} written in "
+                f"{stats['transactions']} I2C writes ({stats['transactions_per_second']:.1f}/s); avoided "
+                f"{stats['avoided']} ({stats['avoided_per_second']:.1f}/s): {stats['redundant']} unchanged, "
+                f"{stats['superseded']} superseded; {stats['errors']} errors")